@@ -1,17 +1,23 @@
 import os
-import json
 from pathlib import Path
-from datetime import datetime
+from datetime import date, datetime
 
 from airflow import DAG
-from airflow.models.baseoperator import chain
-from airflow.operators.dummy import DummyOperator
-from airflow.providers.snowflake.operators.snowflake import SnowflakeOperator
-from airflow.utils.task_group import TaskGroup
+from airflow.decorators import task, task_group
+from airflow.exceptions import AirflowFailException
 
+from include.hooks.google.analytics.analytics_data import GoogleAnalyticsDataHook
+from include.libs.date_ranges.watermarks import VariableWatermarkStore
 from include.libs.schema_reg.base_schema_transforms import snowflake_load_column_string
+from include.libs.schema_reg.schema_registry import schema_registry
 from include.operators.google.analytics.gatogcsoperator import GAToGCSOperator
-
+from include.operators.google.analytics.gatosnowflakeoperator import (
+    GAToSnowflakeOperator,
+)
+from include.operators.snowflake.snowflakeloadoperator import (
+    SnowflakeStagingLoadOperator,
+)
+from include.operators.snowflake.snowflaketableoperator import SnowflakeTableOperator
 
 base_path = Path(__file__).parents[1]
 table_schema_path = os.path.join(
@@ -30,6 +36,44 @@ TRANSFORM_DB = "transforming"
 TRANSFORM_ROLE = "transformer"
 TRANSFORM_WAREHOUSE = "transforming"
 
+# Rows fetched per GA request, every page of a report is fetched and written
+# as it arrives. A single request is capped at 10,000 rows by the API
+PAGE_SIZE = 100000
+
+# csv, or parquet to load staging tables by column name
+OUTPUT_FORMAT = "csv"
+COPY_INTO_STAGING_FILES = {
+    "csv": "copy_into_staging_tables.sql",
+    "parquet": "copy_into_staging_tables_parquet.sql",
+}
+
+# Set INCREMENTAL to only extract the dates missing since the last successful load,
+# from FIRST_DS on, re-extracting LOOKBACK_DAYS days that GA may still be settling
+INCREMENTAL = False
+FIRST_DS = "2022-01-01"
+LOOKBACK_DAYS = 3
+
+# Compute hash_diff during extraction and load it, instead of hashing the
+# staging table inside the MERGE
+PRECOMPUTE_HASH_DIFF = False
+
+# Restrict the MERGE to the staged DATE range and join on the cluster keys,
+# so Snowflake prunes the destination table instead of scanning its history
+DATE_BOUNDED_MERGE = False
+
+# Load GA data straight into Snowflake in one task per table, without GCS.
+# LOADING_ROLE then also needs to merge into the TRANSFORM_DB tables
+DIRECT_LOAD = False
+
+# Extract from the triggerer, freeing worker slots while GA and GCS answer.
+# Needs a running triggerer and CSV output, which is then split by page
+DEFERRABLE_EXTRACT = False
+
+# Check the dimensions and metrics of every table against the GA property
+# before any table is extracted. Calls the Metadata API, cached for a day, and
+# CheckCompatibility once per table on every run
+VALIDATE_REPORTS = False
+
 # These are folders under include/templates/
 TRANSFORM_DB_FILE_FOLDER_NAME = "transform"
 LOADING_DB_FILE_FOLDER_NAME = "staging"
@@ -39,6 +83,72 @@ transform_schema = "ga_schemas"
 stage_gcs_root = "google_analytics"
 property_id = "123456789"
 
+gcs_file_keypath = (
+    f"{stage_gcs_root}/"
+    "{{ params.table }}/"
+    "{{execution_date.year}}/"
+    "{{execution_date.month}}/"
+    "{{execution_date.day}}/"
+    "{{ params.table }}_"
+    "{{ts_nodash}}"
+    f".{OUTPUT_FORMAT}"
+)
+staging_table = "{{ params.table }}_{{ ts_nodash }}"
+start_ds = FIRST_DS if INCREMENTAL else "{{ yesterday_ds }}"
+watermark_store = VariableWatermarkStore() if INCREMENTAL else None
+end_ds = "{{ ds }}"
+
+
+def get_table_params(table_def):
+    """
+    Params of the SQL templates of one table of the schema
+    """
+    table = table_def["table"]
+    table_props = table_def["properties"]
+    return {
+        "table": table,
+        "table_schema": table_props,
+        "cluster_keys": table_def.get("cluster_keys", {}).get("columns", []),
+        "merge_date_column": (
+            "DATE" if DATE_BOUNDED_MERGE and "DATE" in table_props else None
+        ),
+        "col_string": snowflake_load_column_string(
+            table_props, include_hash_diff=PRECOMPUTE_HASH_DIFF
+        ),
+    }
+
+
+def validate_tables(tables):
+    """
+    Fail the run if a table asks for fields the property does not know,
+    or cannot combine, listing every invalid table at once
+    """
+    ga_data_hook = GoogleAnalyticsDataHook(gcp_conn_id=GCS_CONN_ID)
+    errors = []
+    for table_def in tables:
+        try:
+            ga_data_hook.validate_report(
+                property_id, table_def["dimensions"], table_def["metrics"]
+            )
+        except ValueError as error:
+            errors.append(f"{table_def['table']}: {error}")
+    if errors:
+        raise AirflowFailException("Invalid reports:\n" + "\n".join(errors))
+
+
+def get_table_group_kwargs(table_def):
+    """
+    Mapped arguments of the task group of one table of the schema
+    """
+    return {
+        "table": table_def["table"],
+        "dimensions": table_def["dimensions"],
+        "metrics": table_def["metrics"],
+        "table_schema": table_def["properties"],
+        "table_params": get_table_params(table_def),
+    }
+
+
 with DAG(
     dag_id="google_analytics_to_snowflake",
     schedule_interval=None,
@@ -51,185 +161,157 @@ with DAG(
     The google_analytics_to_snowflake DAG transfers data from Google Analytics
     (GA) to Google Cloud Storage (GCS), and then loads the data to Snowflake
     staging tables. From staging, data is loaded to Snowflake transform tables.
+
+    A task group is mapped over the tables of the schema file, which is only read
+    when the DAG runs, so parsing and the number of tasks don't grow with the
+    schema. Each table is created, extracted and loaded by its own chain, so a
+    slow or failed table does not hold up the load of the others.
+    The reports of the tables are checked against the GA property metadata at
+    the same time, not at parse time, which must not call the API.
     """
-    with open(
-        f"{table_schema_path}/{transform_schema}.json",
-        "r",
-    ) as f:
-        table_schema = json.load(f)
-        table_def = table_schema.get("definitions")
-        tables = list(table_def.keys())
-
-    start = DummyOperator(task_id="start")
-    finish = DummyOperator(task_id="extract_finish")
-
-    for table in tables:
-
-        gcs_file_keypath = (
-            f"{stage_gcs_root}/"
-            f"{table}/"
-            "{{execution_date.year}}/"
-            "{{execution_date.month}}/"
-            "{{execution_date.day}}/"
-            f"{table}_"
-            "{{ts_nodash}}.csv"
-        )
-        gcs_load_keypath = (
-            f"{table}/"
-            "{{execution_date.year}}/"
-            "{{execution_date.month}}/"
-            "{{execution_date.day}}/"
+
+    @task
+    def get_tables():
+        """
+        List the tables of the schema file, validated against the GA property
+        if VALIDATE_REPORTS is set
+        """
+        table_def = schema_registry.get_definitions(
+            f"{table_schema_path}/{transform_schema}.json"
         )
-        start_ds = "{{ yesterday_ds }}"
-        end_ds = "{{ ds }}"
-        table_props = table_def.get(f"{table}").get("properties")
+        tables = [{"table": table, **props} for table, props in table_def.items()]
+        if VALIDATE_REPORTS:
+            validate_tables(tables)
+        return tables
 
-        table_dimensions = table_def.get(f"{table}").get("dimensions")
-        table_metrics = table_def.get(f"{table}").get("metrics")
+    @task
+    def advance_watermark(table, extraction):
+        """
+        Move the watermark of the table to the last date extracted, once loaded
+        """
+        watermark_store.set(
+            property_id, table, date.fromisoformat(extraction["end_ds"])
+        )
 
-        col_string = snowflake_load_column_string(table_props)
+    merge_params = {
+        "loading_db": LOADING_DB,
+        "loading_schema": loading_schema,
+        "transform_schema": transform_schema,
+        "transform_db": TRANSFORM_DB,
+        "precomputed_hash_diff": PRECOMPUTE_HASH_DIFF,
+        "temporary": True,
+    }
 
+    @task_group
+    def load_table(table, dimensions, metrics, table_schema, table_params):
         """
-        Create the Snowflake tables for GA data if they don't already exist
+        Create, extract and load one table. Every table has its own chain, so it
+        is loaded as soon as its own extraction is done
         """
-        with TaskGroup(group_id=f"snowflake_{table}_create"):
 
-            create_start = DummyOperator(
-                task_id=f"snowflake_{table}_create_start"
-            )
+        """
+        Create the Snowflake table for GA data if it doesn't already exist
+        """
+        create_table = SnowflakeTableOperator(
+            task_id="snowflake_create_table",
+            snowflake_conn_id=SNOWFLAKE_CONN_ID,
+            autocommit=True,
+            warehouse=TRANSFORM_WAREHOUSE,
+            database=TRANSFORM_DB,
+            role=TRANSFORM_ROLE,
+            schema=transform_schema,
+            params={
+                "transform_schema": transform_schema,
+                "transform_db": TRANSFORM_DB,
+            },
+            table_params=table_params,
+            sql=f"{TRANSFORM_DB_FILE_FOLDER_NAME}/create_tables.sql",
+        )
 
-            create_tables = SnowflakeOperator(
-                task_id=f"snowflake_create_{table}",
+        if DIRECT_LOAD:
+            """
+            Load GA data straight into Snowflake, staging, merging and
+            cleaning up in one session
+            """
+            load_direct = GAToSnowflakeOperator(
+                task_id="load_direct_to_snowflake",
+                property_id=property_id,
+                dimensions=dimensions,
+                metrics=metrics,
+                table_schema=table_schema,
+                staging_table=staging_table,
+                create_staging_sql=f"{LOADING_DB_FILE_FOLDER_NAME}/create_staging_tables.sql",
+                merge_sql=f"{TRANSFORM_DB_FILE_FOLDER_NAME}/upsert_tables.sql",
+                cleanup_sql=f"{LOADING_DB_FILE_FOLDER_NAME}/cleanup_staging_tables.sql",
+                loading_db=LOADING_DB,
+                loading_schema=loading_schema,
+                start_ds=start_ds,
+                end_ds=end_ds,
+                page_size=PAGE_SIZE,
+                ga_conn_id=GCS_CONN_ID,
                 snowflake_conn_id=SNOWFLAKE_CONN_ID,
-                autocommit=True,
-                warehouse=TRANSFORM_WAREHOUSE,
-                database=TRANSFORM_DB,
-                role=TRANSFORM_ROLE,
-                schema=transform_schema,
-                params={
-                    "transform_schema": transform_schema,
-                    "transform_db": TRANSFORM_DB,
-                    "table": table,
-                    "table_schema": table_props,
-                },
-                sql=f"{TRANSFORM_DB_FILE_FOLDER_NAME}/create_tables.sql",
+                warehouse=LOADING_WAREHOUSE,
+                role=LOADING_ROLE,
+                compute_hash_diff=PRECOMPUTE_HASH_DIFF,
+                watermark_store=watermark_store,
+                watermark_table=table,
+                lookback_days=LOOKBACK_DAYS,
+                params=merge_params,
+                table_params=table_params,
             )
 
-            create_finish = DummyOperator(
-                task_id=f"snowflake_{table}_create_finish"
-            )
-
-        """
-        Extract GA data to GCS
-        """
-        with TaskGroup(group_id=f"{table}_extract"):
-
-            extract_start = DummyOperator(task_id=f"{table}_extract_start")
+            create_table >> load_direct
 
+        else:
+            """
+            Extract GA data to GCS
+            """
             extract_to_gcs = GAToGCSOperator(
-                task_id=f"upload_{table}_to_gcs",
+                task_id="upload_to_gcs",
                 start_ds=start_ds,
                 end_ds=end_ds,
                 property_id=property_id,
-                dimensions=table_dimensions,
-                metrics=table_metrics,
+                dimensions=dimensions,
+                metrics=metrics,
+                table_schema=table_schema,
                 gcs_dest_path=gcs_file_keypath,
+                page_size=PAGE_SIZE,
                 ga_conn_id=GCS_CONN_ID,
                 gcs_conn_id=GCS_CONN_ID,
                 gcs_bucket_name=GCS_BUCKET,
+                output_format=OUTPUT_FORMAT,
+                watermark_store=watermark_store,
+                watermark_table=table,
+                advance_watermark=False,
+                lookback_days=LOOKBACK_DAYS,
+                compute_hash_diff=PRECOMPUTE_HASH_DIFF,
+                deferrable=DEFERRABLE_EXTRACT,
+                table_params=table_params,
             )
 
-            extract_finish = DummyOperator(task_id=f"{table}_finish")
-
             """
-            Load data from GCS to Snowflake and manage Snowflake environment
+            Load data from GCS to Snowflake: create a temporary staging table,
+            COPY and MERGE in one transaction, and clean up, all in one session.
+            LOADING_ROLE then also needs to merge into the TRANSFORM_DB tables
             """
-            with TaskGroup(group_id="loading_from_gcs_to_snowflake"):
-                loading_db_params = {
-                    "loading_schema": loading_schema,
-                    "loading_db": LOADING_DB,
-                    "table": table,
-                    "table_schema": table_props,
-                }
-
-                prepare_staging = SnowflakeOperator(
-                    task_id=f"create_staging_{table}",
-                    snowflake_conn_id=SNOWFLAKE_CONN_ID,
-                    autocommit=True,
-                    warehouse=LOADING_WAREHOUSE,
-                    database=LOADING_DB,
-                    role=LOADING_ROLE,
-                    schema=loading_schema,
-                    params=loading_db_params,
-                    sql=f"{LOADING_DB_FILE_FOLDER_NAME}/create_staging_tables.sql",
-                )
-
-                load_staging = SnowflakeOperator(
-                    task_id=f"load_{table}_to_snowflake",
-                    snowflake_conn_id=SNOWFLAKE_CONN_ID,
-                    autocommit=True,
-                    warehouse=LOADING_WAREHOUSE,
-                    database=LOADING_DB,
-                    role=LOADING_ROLE,
-                    schema=loading_schema,
-                    params={
-                        "loading_schema": loading_schema,
-                        "loading_db": LOADING_DB,
-                        "table": table,
-                        "table_schema": table_props,
-                        "col_string": col_string,
-                        "stage_name": "STAGE_GOOGLE_ANALYTICS",
-                    },
-                    sql=f"{LOADING_DB_FILE_FOLDER_NAME}/copy_into_staging_tables.sql",
-                )
-
-                cluster_keys = (
-                    table_def.get(f"{table}").get(
-                        "cluster_keys", {}).get("columns", [])
-                )
-                merge_tables = SnowflakeOperator(
-                    task_id=f"merge_{table}",
-                    snowflake_conn_id=SNOWFLAKE_CONN_ID,
-                    autocommit=True,
-                    warehouse=TRANSFORM_WAREHOUSE,
-                    database=TRANSFORM_DB,
-                    role=TRANSFORM_ROLE,
-                    schema=transform_schema,
-                    params={
-                        "loading_db": LOADING_DB,
-                        "loading_schema": loading_schema,
-                        "transform_schema": transform_schema,
-                        "transform_db": TRANSFORM_DB,
-                        "table": table,
-                        "table_schema": table_props,
-                        "cluster_keys": cluster_keys,
-                    },
-                    sql=f"{TRANSFORM_DB_FILE_FOLDER_NAME}/upsert_tables.sql",
-                )
-
-                cleanup_staging = SnowflakeOperator(
-                    task_id=f"cleanup_staging_{table}",
-                    snowflake_conn_id=SNOWFLAKE_CONN_ID,
-                    autocommit=True,
-                    warehouse=LOADING_WAREHOUSE,
-                    database=LOADING_DB,
-                    role=LOADING_ROLE,
-                    schema=loading_schema,
-                    params=loading_db_params,
-                    sql=f"{LOADING_DB_FILE_FOLDER_NAME}/cleanup_staging_tables.sql",
-                )
-
-                chain(
-                    start,
-                    create_start,
-                    create_tables,
-                    create_finish,
-                    extract_start,
-                    extract_to_gcs,
-                    extract_finish,
-                    prepare_staging,
-                    load_staging,
-                    merge_tables,
-                    cleanup_staging,
-                    finish,
-                )
+            load_to_snowflake = SnowflakeStagingLoadOperator(
+                task_id="load_to_snowflake",
+                snowflake_conn_id=SNOWFLAKE_CONN_ID,
+                warehouse=LOADING_WAREHOUSE,
+                database=LOADING_DB,
+                role=LOADING_ROLE,
+                schema=loading_schema,
+                params={**merge_params, "stage_name": "STAGE_GOOGLE_ANALYTICS"},
+                table_params=table_params,
+                create_staging_sql=f"{LOADING_DB_FILE_FOLDER_NAME}/create_staging_tables.sql",
+                copy_sql=f"{LOADING_DB_FILE_FOLDER_NAME}/{COPY_INTO_STAGING_FILES[OUTPUT_FORMAT]}",
+                merge_sql=f"{TRANSFORM_DB_FILE_FOLDER_NAME}/upsert_tables.sql",
+                cleanup_sql=f"{LOADING_DB_FILE_FOLDER_NAME}/cleanup_staging_tables.sql",
+            )
+
+            create_table >> extract_to_gcs >> load_to_snowflake
+
+            if INCREMENTAL:
+                load_to_snowflake >> advance_watermark(table, extract_to_gcs.output)
+
+    load_table.expand_kwargs(get_tables().map(get_table_group_kwargs))
@@ -15,23 +15,74 @@
 # KIND, either express or implied.  See the License for the
 # specific language governing permissions and limitations
 # under the License.
+import asyncio
 from typing import Optional, Sequence, Union
 
 from airflow.providers.google.common.hooks.base_google import GoogleBaseHook
-from google.analytics.data_v1beta import BetaAnalyticsDataClient
+from google.analytics.data_v1beta import (
+    BetaAnalyticsDataAsyncClient,
+    BetaAnalyticsDataClient,
+)
+from google.api_core.exceptions import ServiceUnavailable
 from google.analytics.data_v1beta.types import (
+    BatchRunReportsRequest,
+    CheckCompatibilityRequest,
+    CheckCompatibilityResponse,
+    Compatibility,
     DateRange,
     Dimension,
+    GetMetadataRequest,
+    Metadata,
     Metric,
     RunReportRequest,
 )
 
 import pandas as pd
 
+from include.hooks.google.analytics.client_pool import (
+    ClientPool,
+    PooledGrpcClient,
+    default_client_pool,
+)
+from include.hooks.google.analytics.metadata_cache import (
+    MetadataCache,
+    default_metadata_cache,
+    find_unknown_fields,
+)
+from include.hooks.google.analytics.quota import (
+    call_with_quota,
+    call_with_quota_async,
+    get_property_limiter,
+    get_property_quota,
+)
+from include.hooks.google.analytics.report_cache import ReportCache
+from include.hooks.google.analytics.report_decoder import report_to_df
+from include.libs.metrics.stage_metrics import StageMetrics, incr, timer
+
+# The Data API caps a single RunReportRequest at 250,000 rows, and returns
+# 10,000 rows when no limit is set.
+MAX_PAGE_SIZE = 250000
+DEFAULT_PAGE_SIZE = 100000
+# BatchRunReportsRequest accepts at most five reports.
+MAX_BATCH_REPORTS = 5
+
 
 class GoogleAnalyticsDataHook(GoogleBaseHook):
     """
     Hook for Google Analytics Data.
+
+    Requests of a property go through a quota limiter shared by every hook of the process,
+    and are retried with jittered backoff when the API answers RESOURCE_EXHAUSTED.
+
+    :param max_retries: Number of retries of a request rejected for quota reasons.
+    :param cache: If set, RunReport responses are looked up in and stored to this cache,
+        see report_cache. BatchRunReports requests are never cached.
+    :param client_pool: Pool of the clients and credentials, shared by every hook of the process
+        by default, so hooks of the same connection reuse one client and one token.
+    :param stage_metrics: If set, API calls and DataFrame building are timed, and pages, rows,
+        cache hits and consumed quota tokens are counted, see stage_metrics.
+    :param metadata_cache: Cache of the property metadata, shared by every hook of the process
+        and kept in a local directory by default, see metadata_cache.
     """
 
     def __init__(
@@ -40,6 +91,11 @@ class GoogleAnalyticsDataHook(GoogleBaseHook):
         api_version: str = "data_v1beta",
         delegate_to: Optional[str] = None,
         impersonation_chain: Optional[Union[str, Sequence[str]]] = None,
+        max_retries: int = 5,
+        cache: Optional[ReportCache] = None,
+        client_pool: Optional[ClientPool] = None,
+        stage_metrics: Optional[StageMetrics] = None,
+        metadata_cache: Optional[MetadataCache] = None,
     ):
         super().__init__(
             gcp_conn_id=gcp_conn_id,
@@ -47,19 +103,115 @@ class GoogleAnalyticsDataHook(GoogleBaseHook):
             impersonation_chain=impersonation_chain,
         )
         self.api_version = api_version
+        self.max_retries = max_retries
+        self.cache = cache
+        self.client_pool = default_client_pool if client_pool is None else client_pool
+        self.stage_metrics = stage_metrics
+        self.metadata_cache = metadata_cache or default_metadata_cache
         self._client = None
+        self._async_client = None
+
+    def _get_pool_key(self):
+        """
+        Key of the pooled clients and credentials of this hook's connection.
+        """
+        impersonation_chain = self.impersonation_chain
+        if isinstance(impersonation_chain, list):
+            impersonation_chain = tuple(impersonation_chain)
+        return (
+            self.__class__.__name__,
+            self.gcp_conn_id,
+            self.delegate_to,
+            impersonation_chain,
+        )
+
+    def _get_credentials(self):
+        """
+        Credentials of the connection, from the client pool.
+        """
+        return self.client_pool.get(
+            self._get_pool_key() + ("credentials",), super()._get_credentials
+        )
+
+    def get_credentials(self):
+        """
+        Credentials of the connection, pooled like the clients. Looking them up may read the
+        connection and fetch a token, call it from a thread before get_async_conn in an event loop.
+        """
+        return self._get_credentials()
 
     def get_conn(self):
         """
-        Retrieves BetaAnalyticsDataClient if not yet created
+        Retrieves BetaAnalyticsDataClient if not yet created, from the client pool
         """
         if not self._client:
-            self._client = BetaAnalyticsDataClient(
-                credentials=self._get_credentials(), client_info=self.client_info
-            )
+            self._client = self.client_pool.get(
+                self._get_pool_key() + ("client",),
+                lambda: PooledGrpcClient(
+                    BetaAnalyticsDataClient(
+                        credentials=self._get_credentials(),
+                        client_info=self.client_info,
+                    )
+                ),
+                check=PooledGrpcClient.is_healthy,
+                release=PooledGrpcClient.release,
+            ).client
         return self._client
 
-    def run_report(self, property_id, dimensions, metrics, start_ds, end_ds):
+    def get_async_conn(self, credentials=None):
+        """
+        Retrieves BetaAnalyticsDataAsyncClient if not yet created, from the client pool.
+        The client's channel is bound to the running event loop, so it must be
+        created and used from the same loop, and is only pooled for that loop.
+        :param credentials: Credentials of the client, looked up from the connection by default.
+            Pass them when the lookup must not block the event loop.
+        """
+        if not self._async_client:
+            loop = asyncio.get_running_loop()
+            # Clients of the loops that already finished can never be used again.
+            self.client_pool.discard_if(
+                lambda key: key[-2:-1] == ("async_client",) and key[-1].is_closed()
+            )
+            self._async_client = self.client_pool.get(
+                self._get_pool_key() + ("async_client", loop),
+                lambda: PooledGrpcClient(
+                    BetaAnalyticsDataAsyncClient(
+                        credentials=credentials or self._get_credentials(),
+                        client_info=self.client_info,
+                    ),
+                    loop=loop,
+                ),
+                check=PooledGrpcClient.is_healthy,
+                release=PooledGrpcClient.release,
+            ).client
+        return self._async_client
+
+    def _discard_clients(self):
+        """
+        Drop the pooled clients after the API was unavailable, so the next request
+        opens a new channel instead of reusing a broken one.
+        """
+        key = self._get_pool_key()
+        self.client_pool.discard(key + ("client",))
+        self._client = None
+        if self._async_client is not None:
+            try:
+                loop = asyncio.get_running_loop()
+            except RuntimeError:
+                loop = None
+            self.client_pool.discard(key + ("async_client", loop))
+            self._async_client = None
+
+    def run_report(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        limit=None,
+        offset=None,
+    ):
         """
         Fetch report from the analytics data API.
         :param property_id: ID of the given property.
@@ -69,19 +221,123 @@ class GoogleAnalyticsDataHook(GoogleBaseHook):
         ref https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
         :param start_ds: Start Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
         :param end_ds: End Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+        :param limit: Maximum number of rows to return, up to 250,000. The API default is 10,000.
+        :param offset: Row count of the start row, used to page through the report.
         :return: Report
         """
-        request = RunReportRequest(
-            property=f"properties/{property_id}",
-            dimensions=self._get_dimensions_headers(dimensions),
-            metrics=self._get_metrics_headers(metrics),
-            date_ranges=[DateRange(start_date=start_ds, end_date=end_ds)],
+        request = self._get_run_report_request(
+            property_id, dimensions, metrics, start_ds, end_ds, limit, offset
         )
+        cached = self._get_cached_response(request)
+        if cached is not None:
+            incr(self.stage_metrics, "cache_hits")
+            self._count_response(cached, cached=True)
+            return cached
         client = self.get_conn()
-        result = client.run_report(request)
+        with timer(self.stage_metrics, "run_report"):
+            try:
+                result = call_with_quota(
+                    lambda: client.run_report(request),
+                    get_property_limiter(property_id),
+                    max_retries=self.max_retries,
+                )
+            except ServiceUnavailable:
+                self._discard_clients()
+                raise
+        self._count_response(result)
+        self._cache_response(request, result)
         return result
 
-    def get_report_df(self, property_id, dimensions, metrics, start_ds, end_ds):
+    def iter_report_pages(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        offset=0,
+    ):
+        """
+        Fetch report page by page, increasing the offset until the reported row_count is reached.
+        Only one page is held in memory at a time.
+        :param property_id: ID of the given property.
+        :param dimensions: A list of the Dimensions.
+        :param metrics: A list of the Metrics.
+        :param start_ds: Start Date of the data range.
+        :param end_ds: End Date of the data range.
+        :param page_size: Number of rows requested per page, up to 250,000.
+        :param offset: Row count of the first row to fetch.
+        :return: Generator of RunReportResponse pages
+        """
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError(
+                f"page_size must be between 1 and {MAX_PAGE_SIZE}, got {page_size}"
+            )
+        while True:
+            response = self.run_report(
+                property_id,
+                dimensions,
+                metrics,
+                start_ds,
+                end_ds,
+                limit=page_size,
+                offset=offset,
+            )
+            yield response
+            offset += len(response.rows)
+            if not response.rows or offset >= response.row_count:
+                break
+
+    def iter_report_rows(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+    ):
+        """
+        Fetch report rows as they arrive, see iter_report_pages.
+        :return: Generator of report Rows
+        """
+        for response in self.iter_report_pages(
+            property_id, dimensions, metrics, start_ds, end_ds, page_size
+        ):
+            yield from response.rows
+
+    def iter_report_df(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        schema_types=None,
+    ):
+        """
+        Fetch report as page-sized DataFrames, see iter_report_pages.
+        :param schema_types: Mapping of column name to schema type, used to cast metrics
+            whose MetricHeader has no type.
+        :return: Generator of report DataFrames
+        """
+        for response in self.iter_report_pages(
+            property_id, dimensions, metrics, start_ds, end_ds, page_size
+        ):
+            yield self.get_response_df(response, schema_types)
+
+    def get_report_df(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        schema_types=None,
+    ):
         """
         Return report as DataFrame
         :param property_id: ID of the given property.
@@ -91,24 +347,389 @@ class GoogleAnalyticsDataHook(GoogleBaseHook):
         ref https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
         :param start_ds: Start Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
         :param end_ds: End Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+        :param page_size: Number of rows fetched per request, every page of the report is fetched.
+            None sends a single request, which the API caps at 10,000 rows.
+        :param schema_types: Mapping of column name to schema type, used to cast metrics
+            whose MetricHeader has no type.
         :return: Report DataFrame
         """
+        with timer(self.stage_metrics, "get_report_df"):
+            return self._get_report_df(
+                property_id,
+                dimensions,
+                metrics,
+                start_ds,
+                end_ds,
+                page_size,
+                schema_types,
+            )
+
+    def _get_report_df(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        schema_types=None,
+    ):
+        if page_size:
+            return pd.concat(
+                self.iter_report_df(
+                    property_id,
+                    dimensions,
+                    metrics,
+                    start_ds,
+                    end_ds,
+                    page_size,
+                    schema_types,
+                ),
+                ignore_index=True,
+            )
         response = self.run_report(property_id, dimensions, metrics, start_ds, end_ds)
-        columns = []
-        for dimension in response.dimension_headers:
-            columns.append(dimension.name)
-        for metric in response.metric_headers:
-            columns.append(metric.name)
-
-        rows = []
-        for row in response.rows:
-            row_values = []
-            for value in row.dimension_values:
-                row_values.append(value.value)
-            for value in row.metric_values:
-                row_values.append(value.value)
-            rows.append(row_values)
-        df = pd.DataFrame(rows, columns=columns)
+        self._check_truncated(response)
+        return self.get_response_df(response, schema_types)
+
+    def batch_run_reports(self, property_id, reports, start_ds, end_ds, limit=None):
+        """
+        Fetch several reports of the same property in as few round trips as possible,
+        grouping up to five reports per BatchRunReportsRequest.
+        :param property_id: ID of the given property.
+        :param reports: A list of report definitions, dicts with ``dimensions`` and ``metrics``.
+        :param start_ds: Start Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+        :param end_ds: End Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+        :param limit: Maximum number of rows to return per report, up to 250,000.
+        :return: Generator of RunReportResponse, in the order of ``reports``
+        """
+        client = self.get_conn()
+        for i in range(0, len(reports), MAX_BATCH_REPORTS):
+            request = BatchRunReportsRequest(
+                property=f"properties/{property_id}",
+                requests=[
+                    self._get_run_report_request(
+                        property_id,
+                        report["dimensions"],
+                        report["metrics"],
+                        start_ds,
+                        end_ds,
+                        limit,
+                    )
+                    for report in reports[i : i + MAX_BATCH_REPORTS]
+                ],
+            )
+            with timer(self.stage_metrics, "batch_run_reports"):
+                try:
+                    response = call_with_quota(
+                        lambda: client.batch_run_reports(request),
+                        get_property_limiter(property_id),
+                        max_retries=self.max_retries,
+                        weight=len(request.requests),
+                    )
+                except ServiceUnavailable:
+                    self._discard_clients()
+                    raise
+            for report in response.reports:
+                self._count_response(report)
+            yield from response.reports
+
+    def iter_batch_report_df(
+        self, property_id, reports, start_ds, end_ds, page_size=DEFAULT_PAGE_SIZE
+    ):
+        """
+        Return each report of batch_run_reports as a DataFrame.
+        Reports with more rows than a single page are completed with run_report.
+        :param property_id: ID of the given property.
+        :param reports: A list of report definitions, dicts with ``dimensions``, ``metrics``
+            and optionally ``schema_types``.
+        :param start_ds: Start Date of the data range.
+        :param end_ds: End Date of the data range.
+        :param page_size: Number of rows requested per report and per follow-up page.
+        :return: Generator of report DataFrames, in the order of ``reports``
+        """
+        responses = self.batch_run_reports(
+            property_id, reports, start_ds, end_ds, limit=page_size
+        )
+        for report, response in zip(reports, responses):
+            schema_types = report.get("schema_types")
+            df = self.get_response_df(response, schema_types)
+            if response.rows and len(response.rows) < response.row_count:
+                df = pd.concat(
+                    [df]
+                    + [
+                        self.get_response_df(page, schema_types)
+                        for page in self.iter_report_pages(
+                            property_id,
+                            report["dimensions"],
+                            report["metrics"],
+                            start_ds,
+                            end_ds,
+                            page_size,
+                            offset=len(response.rows),
+                        )
+                    ],
+                    ignore_index=True,
+                )
+            yield df
+
+    async def run_report_async(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        limit=None,
+        offset=None,
+    ):
+        """
+        Fetch report from the analytics data API with the asyncio client, see run_report.
+        :return: Report
+        """
+        request = self._get_run_report_request(
+            property_id, dimensions, metrics, start_ds, end_ds, limit, offset
+        )
+        # Cache lookups and writes block on disk or GCS, so they run off the event loop
+        # and the other coroutines keep fetching meanwhile.
+        cached = None
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self._get_cached_response, request)
+        if cached is not None:
+            incr(self.stage_metrics, "cache_hits")
+            self._count_response(cached, cached=True)
+            return cached
+        client = self.get_async_conn()
+        with timer(self.stage_metrics, "run_report"):
+            try:
+                result = await call_with_quota_async(
+                    lambda: client.run_report(request),
+                    get_property_limiter(property_id),
+                    max_retries=self.max_retries,
+                )
+            except ServiceUnavailable:
+                self._discard_clients()
+                raise
+        self._count_response(result)
+        if self.cache is not None:
+            await asyncio.to_thread(self._cache_response, request, result)
+        return result
+
+    async def iter_report_pages_async(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        offset=0,
+    ):
+        """
+        Fetch report page by page with the asyncio client, see iter_report_pages.
+        :return: Async generator of RunReportResponse pages
+        """
+        if not 0 < page_size <= MAX_PAGE_SIZE:
+            raise ValueError(
+                f"page_size must be between 1 and {MAX_PAGE_SIZE}, got {page_size}"
+            )
+        while True:
+            response = await self.run_report_async(
+                property_id,
+                dimensions,
+                metrics,
+                start_ds,
+                end_ds,
+                limit=page_size,
+                offset=offset,
+            )
+            yield response
+            offset += len(response.rows)
+            if not response.rows or offset >= response.row_count:
+                break
+
+    async def get_report_df_async(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        page_size=DEFAULT_PAGE_SIZE,
+        schema_types=None,
+    ):
+        """
+        Return report as DataFrame with the asyncio client, see get_report_df.
+        :return: Report DataFrame
+        """
+        if page_size:
+            return pd.concat(
+                [
+                    self.get_response_df(response, schema_types)
+                    async for response in self.iter_report_pages_async(
+                        property_id, dimensions, metrics, start_ds, end_ds, page_size
+                    )
+                ],
+                ignore_index=True,
+            )
+        response = await self.run_report_async(
+            property_id, dimensions, metrics, start_ds, end_ds
+        )
+        self._check_truncated(response)
+        return self.get_response_df(response, schema_types)
+
+    def get_metadata(self, property_id) -> Metadata:
+        """
+        Return the dimensions and metrics the property can report, custom definitions included.
+        The metadata is cached for a day, cache errors are logged and treated as a miss.
+        :param property_id: ID of the given property.
+        :return: Metadata
+        """
+        try:
+            metadata = self.metadata_cache.get(property_id)
+        except Exception as error:
+            self.log.warning("Metadata cache lookup failed: %s", error)
+            metadata = None
+        if metadata is not None:
+            return metadata
+        client = self.get_conn()
+        with timer(self.stage_metrics, "get_metadata"):
+            metadata = client.get_metadata(
+                GetMetadataRequest(name=f"properties/{property_id}/metadata")
+            )
+        try:
+            self.metadata_cache.set(property_id, metadata)
+        except Exception as error:
+            self.log.warning("Metadata cache write failed: %s", error)
+        return metadata
+
+    def check_compatibility(
+        self, property_id, dimensions, metrics
+    ) -> CheckCompatibilityResponse:
+        """
+        Return the dimensions and metrics that cannot be requested together in a report.
+        :param property_id: ID of the given property.
+        :param dimensions: A list of the Dimensions.
+        :param metrics: A list of the Metrics.
+        :return: CheckCompatibilityResponse listing the incompatible dimensions and metrics
+        """
+        request = CheckCompatibilityRequest(
+            property=f"properties/{property_id}",
+            dimensions=self._get_dimensions_headers(dimensions),
+            metrics=self._get_metrics_headers(metrics),
+            compatibility_filter=Compatibility.INCOMPATIBLE,
+        )
+        client = self.get_conn()
+        with timer(self.stage_metrics, "check_compatibility"):
+            return client.check_compatibility(request)
+
+    def validate_report(
+        self, property_id, dimensions, metrics, check_compatibility=True
+    ):
+        """
+        Check a report definition before requesting it, so a misspelled or removed field
+        fails the task at once instead of after the quota of the reports before it is spent.
+        :param property_id: ID of the given property.
+        :param dimensions: A list of the Dimensions.
+        :param metrics: A list of the Metrics.
+        :param check_compatibility: Also ask the API whether the fields can be combined.
+        :raises ValueError: A field is unknown to the property, or the fields are incompatible.
+        """
+        unknown_dimensions, unknown_metrics = find_unknown_fields(
+            self.get_metadata(property_id), dimensions, metrics
+        )
+        if unknown_dimensions or unknown_metrics:
+            raise ValueError(
+                f"Property {property_id} has no dimensions {unknown_dimensions} "
+                f"and no metrics {unknown_metrics}"
+            )
+        if not check_compatibility:
+            return
+        response = self.check_compatibility(property_id, dimensions, metrics)
+        incompatible_dimensions = [
+            compatibility.dimension_metadata.api_name
+            for compatibility in response.dimension_compatibilities
+            if compatibility.compatibility == Compatibility.INCOMPATIBLE
+        ]
+        incompatible_metrics = [
+            compatibility.metric_metadata.api_name
+            for compatibility in response.metric_compatibilities
+            if compatibility.compatibility == Compatibility.INCOMPATIBLE
+        ]
+        if incompatible_dimensions or incompatible_metrics:
+            raise ValueError(
+                f"Dimensions {incompatible_dimensions} and metrics {incompatible_metrics} "
+                f"cannot be requested with {dimensions} and {metrics} "
+                f"for property {property_id}"
+            )
+
+    def _check_truncated(self, response):
+        """
+        Warn when a single request did not return every row of the report.
+        """
+        if len(response.rows) < response.row_count:
+            self.log.warning(
+                "Only %s of the %s rows of the report were returned, "
+                "set page_size to fetch every page",
+                len(response.rows),
+                response.row_count,
+            )
+
+    def _get_cached_response(self, request):
+        """
+        Return the cached response of a RunReportRequest, if any.
+        Cache errors are logged and treated as a miss.
+        """
+        if self.cache is None:
+            return None
+        try:
+            response = self.cache.get(request)
+        except Exception as error:
+            self.log.warning("Report cache lookup failed: %s", error)
+            return None
+        if response is not None:
+            self.log.info("Report served from cache")
+        return response
+
+    def _count_response(self, response, cached=False):
+        """
+        Count a report page, its rows and the quota tokens it consumed.
+        Cached responses consumed their tokens when they were first fetched.
+        """
+        if self.stage_metrics is None:
+            return
+        self.stage_metrics.incr("pages")
+        self.stage_metrics.incr("rows", len(response.rows))
+        property_quota = None if cached else get_property_quota(response)
+        if property_quota is not None:
+            self.stage_metrics.incr(
+                "quota_tokens", property_quota.tokens_per_hour.consumed
+            )
+
+    def _cache_response(self, request, response):
+        """
+        Store the response of a RunReportRequest, logging cache errors.
+        """
+        if self.cache is None:
+            return
+        try:
+            self.cache.set(request, response)
+        except Exception as error:
+            self.log.warning("Report cache write failed: %s", error)
+
+    def get_response_df(self, response, schema_types=None):
+        """
+        Convert a RunReportResponse to a DataFrame.
+        Metric columns are cast to int64/float64 from the MetricHeader type,
+        or from schema_types when the type is unspecified.
+        :param response: RunReportResponse
+        :param schema_types: Mapping of column name to schema type
+        :return: Report DataFrame
+        """
+        with timer(self.stage_metrics, "build_df"):
+            return self._build_response_df(response, schema_types)
+
+    def _build_response_df(self, response, schema_types=None):
+        df = report_to_df(response, schema_types)
         # The date we get from GA Data api are with the YYYYMMDD format.
         # https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
         # Format the date column if there is a date column.
@@ -122,6 +743,33 @@ class GoogleAnalyticsDataHook(GoogleBaseHook):
             ).dt.strftime("%Y-%m-%d")
         return df
 
+    def _get_run_report_request(
+        self,
+        property_id,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+        limit=None,
+        offset=None,
+    ):
+        """
+        Generate a RunReportRequest
+        :return: RunReportRequest
+        """
+        request = RunReportRequest(
+            property=f"properties/{property_id}",
+            dimensions=self._get_dimensions_headers(dimensions),
+            metrics=self._get_metrics_headers(metrics),
+            date_ranges=[DateRange(start_date=start_ds, end_date=end_ds)],
+            return_property_quota=True,
+        )
+        if limit:
+            request.limit = limit
+        if offset:
+            request.offset = offset
+        return request
+
     def _get_dimensions_headers(self, dimensions):
         """
         Generate a list of Dimension objects
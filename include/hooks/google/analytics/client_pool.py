@@ -0,0 +1,240 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Process-wide pool of Google API clients and credentials.
+
+Creating a client loads the connection, fetches an access token and opens a
+gRPC channel. Hooks of the same connection share one pooled client instead,
+so tasks, shards and reports running in a worker process pay for it once.
+Credentials refresh their token themselves when it expires, the pool only
+shares them.
+
+Entries unused for idle_timeout seconds, older than max_age seconds, or whose
+gRPC channel is shut down or failing, are dropped and created again on the
+next request. Dropped clients are released, the pool stops watching their
+channel, but not closed: hooks still holding one keep using it, and gRPC closes
+the channel once the last of them lets it go. gRPC channels do not survive a
+fork, so the shared pool starts empty in forked task processes.
+"""
+import logging
+import os
+import threading
+import time
+from typing import Any, Callable, Dict, Hashable, List, Optional
+
+import grpc
+
+# Unused clients are dropped after ten minutes.
+DEFAULT_IDLE_TIMEOUT = 600.0
+# Clients and credentials are created again after an hour, picking up rotated keys.
+DEFAULT_MAX_AGE = 3600.0
+UNHEALTHY_STATES = (
+    grpc.ChannelConnectivity.TRANSIENT_FAILURE,
+    grpc.ChannelConnectivity.SHUTDOWN,
+)
+
+log = logging.getLogger(__name__)
+
+
+class PooledGrpcClient:
+    """
+    A client and the connectivity of its gRPC channel.
+
+    Synchronous channels are watched with a connectivity subscription, asyncio
+    channels are asked for their state. Clients without a gRPC channel are
+    always healthy.
+
+    :param client: Google API client with a gRPC transport.
+    :param loop: Event loop the channel of an asyncio client is bound to,
+        the client is unusable once it is closed.
+    """
+
+    def __init__(self, client, loop=None):
+        self.client = client
+        self.loop = loop
+        self.state: Optional[grpc.ChannelConnectivity] = None
+        self._channel = self._get_channel(client)
+        self._subscribed = False
+        if self._channel is not None and hasattr(self._channel, "subscribe"):
+            self._channel.subscribe(self._set_state, try_to_connect=False)
+            self._subscribed = True
+
+    @staticmethod
+    def _get_channel(client):
+        try:
+            return client.transport.grpc_channel
+        except AttributeError:
+            return None
+
+    def _set_state(self, state):
+        self.state = state
+
+    def is_closed(self) -> bool:
+        return self.loop is not None and self.loop.is_closed()
+
+    def is_healthy(self) -> bool:
+        if self.is_closed():
+            return False
+        if self._channel is not None and hasattr(self._channel, "get_state"):
+            return self._channel.get_state(try_to_connect=False) not in UNHEALTHY_STATES
+        return self.state not in UNHEALTHY_STATES
+
+    def release(self) -> None:
+        """
+        Stop watching the channel once the client is dropped from the pool. The
+        subscription's polling thread holds the channel, which could otherwise
+        never be collected.
+        """
+        if self._subscribed:
+            self._channel.unsubscribe(self._set_state)
+            self._subscribed = False
+
+
+class _PoolEntry:
+    __slots__ = ("value", "created_at", "last_used", "release")
+
+    def __init__(self, value, now, release=None):
+        self.value = value
+        self.created_at = now
+        self.last_used = now
+        self.release = release
+
+
+class ClientPool:
+    """
+    Keyed, thread-safe pool of clients and credentials.
+
+    :param idle_timeout: Seconds an entry may stay unused before it is dropped.
+    :param max_age: Seconds after which an entry is created again.
+    :param clock: Monotonic clock, in seconds.
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = DEFAULT_IDLE_TIMEOUT,
+        max_age: float = DEFAULT_MAX_AGE,
+        clock=time.monotonic,
+    ):
+        self.idle_timeout = idle_timeout
+        self.max_age = max_age
+        self._clock = clock
+        self._entries: Dict[Hashable, _PoolEntry] = {}
+        self._key_locks: Dict[Hashable, threading.Lock] = {}
+        self._lock = threading.Lock()
+
+    def get(
+        self,
+        key: Hashable,
+        create: Callable[[], Any],
+        check: Optional[Callable[[Any], bool]] = None,
+        release: Optional[Callable[[Any], None]] = None,
+    ):
+        """
+        Return the pooled value of ``key``, created with ``create`` when missing,
+        too old, or rejected by ``check``. Concurrent callers of a missing key
+        wait for a single creation.
+        :param check: Health check of the pooled value, returns False to create it again.
+        :param release: Called with the value once it is dropped from the pool.
+        """
+        with self._lock:
+            dropped = self._evict_idle(self._clock())
+            key_lock = self._key_locks.setdefault(key, threading.Lock())
+        self._release(dropped)
+        with key_lock:
+            now = self._clock()
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is not None and (
+                now - entry.created_at >= self.max_age
+                or (check is not None and not check(entry.value))
+            ):
+                self._release([entry])
+                entry = None
+            if entry is None:
+                entry = _PoolEntry(create(), now, release)
+            entry.last_used = now
+            with self._lock:
+                self._entries[key] = entry
+            return entry.value
+
+    def discard(self, key: Hashable) -> None:
+        """
+        Drop the entry of ``key``, e.g. after its client failed.
+        """
+        with self._lock:
+            entry = self._entries.pop(key, None)
+        if entry is not None:
+            self._release([entry])
+
+    def discard_if(self, predicate: Callable[[Hashable], bool]) -> None:
+        """
+        Drop the entries whose key matches ``predicate``, e.g. the clients of closed event loops.
+        """
+        with self._lock:
+            keys = [key for key in self._entries if predicate(key)]
+            dropped = [self._entries.pop(key) for key in keys]
+            for key in keys:
+                self._key_locks.pop(key, None)
+        self._release(dropped)
+
+    def evict_idle(self) -> None:
+        with self._lock:
+            dropped = self._evict_idle(self._clock())
+        self._release(dropped)
+
+    def _evict_idle(self, now) -> List[_PoolEntry]:
+        dropped = []
+        for key in [
+            key
+            for key, entry in self._entries.items()
+            if now - entry.last_used >= self.idle_timeout
+        ]:
+            dropped.append(self._entries.pop(key))
+            self._key_locks.pop(key, None)
+        return dropped
+
+    @staticmethod
+    def _release(entries):
+        for entry in entries:
+            if entry.release is None:
+                continue
+            try:
+                entry.release(entry.value)
+            except Exception as error:
+                log.warning("Releasing a pooled value failed: %s", error)
+
+    def clear(self) -> None:
+        with self._lock:
+            dropped = list(self._entries.values())
+            self._entries.clear()
+            self._key_locks.clear()
+        self._release(dropped)
+
+    def _reset_after_fork(self):
+        # Another thread may have held a lock when the process forked.
+        self._entries = {}
+        self._key_locks = {}
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._entries)
+
+
+# Shared by every hook of the process
+default_client_pool = ClientPool()
+os.register_at_fork(after_in_child=default_client_pool._reset_after_fork)
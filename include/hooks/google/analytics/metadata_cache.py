@@ -0,0 +1,129 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Cache of the Analytics Data API metadata of each property.
+
+The metadata lists the dimensions and metrics a property can report, custom
+definitions included, and changes rarely. It is kept in memory and in a local
+directory for a day, so report definitions are checked before any report is
+requested without fetching it for every task.
+"""
+import os
+import struct
+import tempfile
+import threading
+import time
+from typing import Iterable, List, Optional, Tuple
+
+from google.analytics.data_v1beta.types import Metadata
+
+DEFAULT_METADATA_TTL = 24 * 3600
+DEFAULT_METADATA_DIRECTORY = os.path.join(tempfile.gettempdir(), "ga_metadata_cache")
+# Entries start with their expiry time, in seconds since the epoch.
+_HEADER = struct.Struct(">d")
+
+
+class MetadataCache:
+    """
+    Metadata of each property, kept for ttl seconds.
+
+    :param directory: Directory of the cache files, created on the first write,
+        None to only keep the metadata in memory.
+    :param ttl: Seconds the metadata of a property is kept.
+    :param clock: Wall clock, in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        directory: Optional[str] = DEFAULT_METADATA_DIRECTORY,
+        ttl: float = DEFAULT_METADATA_TTL,
+        clock=time.time,
+    ):
+        self.directory = directory
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def _get_path(self, property_id):
+        return os.path.join(self.directory, f"{property_id}.pb")
+
+    def get(self, property_id) -> Optional[Metadata]:
+        """
+        :return: Cached metadata of the property, or None
+        """
+        now = self._clock()
+        with self._lock:
+            entry = self._entries.get(str(property_id))
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        if self.directory is None:
+            return None
+        try:
+            with open(self._get_path(property_id), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return None
+        (expires_at,) = _HEADER.unpack_from(data)
+        if expires_at <= now:
+            return None
+        metadata = Metadata.deserialize(data[_HEADER.size :])
+        with self._lock:
+            self._entries[str(property_id)] = (expires_at, metadata)
+        return metadata
+
+    def set(self, property_id, metadata: Metadata) -> None:
+        expires_at = self._clock() + self.ttl
+        with self._lock:
+            self._entries[str(property_id)] = (expires_at, metadata)
+        if self.directory is None:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, delete=False, suffix=".tmp"
+        ) as f:
+            f.write(_HEADER.pack(expires_at) + Metadata.serialize(metadata))
+        os.replace(f.name, self._get_path(property_id))
+
+
+def find_unknown_fields(
+    metadata: Metadata, dimensions: Iterable[str], metrics: Iterable[str]
+) -> Tuple[List[str], List[str]]:
+    """
+    Dimensions and metrics the property does not know, deprecated names being known.
+    :param metadata: Metadata of the property
+    :param dimensions: A list of the Dimensions.
+    :param metrics: A list of the Metrics.
+    :return: Unknown dimensions and unknown metrics
+    """
+    known_dimensions = set()
+    for dimension in metadata.dimensions:
+        known_dimensions.add(dimension.api_name)
+        known_dimensions.update(dimension.deprecated_api_names)
+    known_metrics = set()
+    for metric in metadata.metrics:
+        known_metrics.add(metric.api_name)
+        known_metrics.update(metric.deprecated_api_names)
+    return (
+        [dimension for dimension in dimensions if dimension not in known_dimensions],
+        [metric for metric in metrics if metric not in known_metrics],
+    )
+
+
+# Shared by every hook of the process
+default_metadata_cache = MetadataCache()
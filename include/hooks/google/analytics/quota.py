@@ -0,0 +1,244 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Quota-aware throttling of Analytics Data API requests.
+
+Each property gets a token bucket shared by every hook in the process. The
+bucket starts from the documented standard property quotas and is corrected
+with the PropertyQuota returned by the API, so requests slow down before
+the quota runs out instead of failing with RESOURCE_EXHAUSTED.
+
+.. seealso::
+    https://developers.google.com/analytics/devguides/reporting/data/v1/quotas
+"""
+import asyncio
+import random
+import threading
+import time
+
+from google.analytics.data_v1beta.types import BatchRunReportsResponse
+from google.api_core.exceptions import ResourceExhausted
+
+# Quotas of a standard (non 360) property.
+DEFAULT_TOKENS_PER_HOUR = 40000
+DEFAULT_CONCURRENT_REQUESTS = 10
+# Most reports cost around ten tokens, until responses tell otherwise.
+DEFAULT_REQUEST_COST = 10.0
+# Longest single wait while polling for a free slot.
+MAX_POLL_INTERVAL = 1.0
+
+
+class PropertyQuotaLimiter:
+    """
+    Token bucket and concurrency limit for the requests of one property.
+
+    :param tokens_per_hour: Size of the bucket, refilled evenly over an hour.
+    :param concurrent_requests: Maximum number of requests in flight.
+    :param clock: Monotonic clock, in seconds.
+    """
+
+    def __init__(
+        self,
+        tokens_per_hour: int = DEFAULT_TOKENS_PER_HOUR,
+        concurrent_requests: int = DEFAULT_CONCURRENT_REQUESTS,
+        clock=time.monotonic,
+    ):
+        self.capacity = float(tokens_per_hour)
+        self.tokens = float(tokens_per_hour)
+        self.refill_rate = tokens_per_hour / 3600.0
+        self.max_concurrency = concurrent_requests
+        self.concurrency = concurrent_requests
+        self.in_flight = 0
+        self.request_cost = DEFAULT_REQUEST_COST
+        self._clock = clock
+        self._updated_at = clock()
+        self._condition = threading.Condition()
+
+    def _refill(self):
+        now = self._clock()
+        self.tokens = min(
+            self.capacity, self.tokens + (now - self._updated_at) * self.refill_rate
+        )
+        self._updated_at = now
+
+    def _try_acquire(self, weight=1):
+        """
+        Take a slot and the estimated tokens of ``weight`` requests if available.
+        :return: 0 when acquired, otherwise the number of seconds to wait before retrying
+        """
+        self._refill()
+        cost = min(self.capacity, self.request_cost * weight)
+        if self.in_flight >= self.concurrency:
+            return MAX_POLL_INTERVAL
+        if self.tokens < cost:
+            return min((cost - self.tokens) / self.refill_rate, 60.0)
+        self.tokens -= cost
+        self.in_flight += 1
+        return 0
+
+    def acquire(self, weight=1):
+        """
+        Block until a request of ``weight`` reports may be sent.
+        """
+        with self._condition:
+            while True:
+                wait = self._try_acquire(weight)
+                if not wait:
+                    return
+                self._condition.wait(timeout=wait)
+
+    async def acquire_async(self, weight=1):
+        """
+        Wait without blocking the event loop until a request of ``weight`` reports may be sent.
+        """
+        while True:
+            with self._condition:
+                wait = self._try_acquire(weight)
+            if not wait:
+                return
+            await asyncio.sleep(min(wait, MAX_POLL_INTERVAL))
+
+    def release(self, property_quota=None):
+        """
+        Free the slot of a finished request, learning from its PropertyQuota if given.
+        """
+        with self._condition:
+            if property_quota is not None:
+                self.update(property_quota)
+            self.in_flight = max(0, self.in_flight - 1)
+            self._condition.notify_all()
+
+    def update(self, property_quota):
+        """
+        Correct the bucket with the quota state reported by the API.
+        Remaining tokens are shared with every other client of the property,
+        so the server figure always wins over the local estimate.
+        :param property_quota: PropertyQuota of a response
+        """
+        with self._condition:
+            self._refill()
+            tokens_per_hour = property_quota.tokens_per_hour
+            if tokens_per_hour.consumed:
+                # Exponential moving average, so one expensive report does not
+                # dominate the estimate.
+                self.request_cost = (
+                    0.8 * self.request_cost + 0.2 * tokens_per_hour.consumed
+                )
+            remaining = tokens_per_hour.remaining
+            tokens_per_day = property_quota.tokens_per_day
+            if tokens_per_day.consumed or tokens_per_day.remaining:
+                remaining = min(remaining, tokens_per_day.remaining)
+            if tokens_per_hour.consumed or tokens_per_hour.remaining:
+                self.tokens = float(remaining)
+            concurrent = property_quota.concurrent_requests
+            if concurrent.consumed or concurrent.remaining:
+                self.concurrency = max(
+                    1, min(self.max_concurrency, self.in_flight + concurrent.remaining)
+                )
+
+    def penalize(self):
+        """
+        Empty the bucket after the API rejected a request for quota reasons.
+        """
+        with self._condition:
+            self._refill()
+            self.tokens = 0.0
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_property_limiter(property_id, **kwargs) -> PropertyQuotaLimiter:
+    """
+    Return the limiter shared by every request of the property in this process.
+    :param property_id: ID of the given property.
+    :param kwargs: PropertyQuotaLimiter arguments, only used when the limiter is created.
+    """
+    with _limiters_lock:
+        if property_id not in _limiters:
+            _limiters[property_id] = PropertyQuotaLimiter(**kwargs)
+        return _limiters[property_id]
+
+
+def get_retry_delay(attempt, base_delay=1.0, max_delay=60.0):
+    """
+    Exponential backoff with full jitter.
+    :param attempt: Number of the retry, starting at 0.
+    :return: Seconds to sleep
+    """
+    return random.uniform(0, min(max_delay, base_delay * 2**attempt))
+
+
+def get_property_quota(response):
+    """
+    Return the PropertyQuota of a RunReportResponse, or of the last report of a
+    BatchRunReportsResponse, if the API returned one.
+    """
+    if response is None:
+        return None
+    if isinstance(response, BatchRunReportsResponse):
+        reports = response.reports
+        return get_property_quota(reports[-1]) if reports else None
+    if "property_quota" in response:
+        return response.property_quota
+    return None
+
+
+def call_with_quota(func, limiter, max_retries=5, weight=1, sleep=time.sleep):
+    """
+    Call ``func`` once the limiter allows it, retrying with jittered backoff on RESOURCE_EXHAUSTED.
+    :param func: Callable sending the request and returning its response.
+    :param limiter: PropertyQuotaLimiter of the property.
+    :param max_retries: Number of retries before the error is raised.
+    :param weight: Number of reports in the request.
+    :param sleep: Function used to wait between retries.
+    :return: Response of ``func``
+    """
+    for attempt in range(max_retries + 1):
+        limiter.acquire(weight)
+        response = None
+        try:
+            response = func()
+            return response
+        except ResourceExhausted:
+            limiter.penalize()
+            if attempt == max_retries:
+                raise
+        finally:
+            limiter.release(get_property_quota(response))
+        sleep(get_retry_delay(attempt))
+
+
+async def call_with_quota_async(func, limiter, max_retries=5, weight=1):
+    """
+    Await ``func()`` once the limiter allows it, see call_with_quota.
+    """
+    for attempt in range(max_retries + 1):
+        await limiter.acquire_async(weight)
+        response = None
+        try:
+            response = await func()
+            return response
+        except ResourceExhausted:
+            limiter.penalize()
+            if attempt == max_retries:
+                raise
+        finally:
+            limiter.release(get_property_quota(response))
+        await asyncio.sleep(get_retry_delay(attempt))
@@ -0,0 +1,243 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Content-addressed cache of Analytics Data API report responses.
+
+Responses are stored under a hash of the request, with relative dates
+resolved, so retries, reruns and overlapping backfills asking for the same
+report are answered without spending quota. Reports ending on a day GA may
+still be updating are not cached, or only for a short time.
+"""
+import hashlib
+import json
+import os
+import struct
+import tempfile
+import threading
+import time
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from typing import Optional
+
+from google.analytics.data_v1beta.types import RunReportRequest, RunReportResponse
+from google.api_core.exceptions import NotFound
+
+from include.hooks.google.analytics.report_decoder import decode_report_bytes
+from include.libs.date_ranges.date_shards import resolve_ga_date
+
+DEFAULT_TTL = 7 * 24 * 3600
+# GA keeps processing the data of the last days for up to 48 hours.
+DEFAULT_SETTLE_DAYS = 2
+DEFAULT_MAX_BYTES = 1024**3
+# Entries start with their expiry time, in seconds since the epoch.
+_HEADER = struct.Struct(">d")
+
+
+def get_request_key(request: RunReportRequest, today: Optional[date] = None) -> str:
+    """
+    Hash the fields of a RunReportRequest that define its result.
+    Relative dates are resolved, so "yesterday" is a different key every day.
+    :param request: RunReportRequest
+    :param today: Reference date for relative dates
+    :return: Hex digest
+    """
+    canonical = {
+        "property": request.property,
+        "dimensions": [dimension.name for dimension in request.dimensions],
+        "metrics": [metric.name for metric in request.metrics],
+        "date_ranges": [
+            [
+                resolve_ga_date(date_range.start_date, today).isoformat(),
+                resolve_ga_date(date_range.end_date, today).isoformat(),
+            ]
+            for date_range in request.date_ranges
+        ],
+        "limit": request.limit,
+        "offset": request.offset,
+    }
+    return hashlib.sha256(
+        json.dumps(canonical, sort_keys=True).encode("utf-8")
+    ).hexdigest()
+
+
+class ReportCache(ABC):
+    """
+    Base class of report caches.
+
+    :param ttl: Seconds a settled report is kept.
+    :param settling_ttl: Seconds a report ending in the last ``settle_days`` days is kept,
+        0 to never cache them.
+    :param settle_days: Number of days before today whose data may still change.
+    :param clock: Wall clock, in seconds since the epoch.
+    """
+
+    def __init__(
+        self,
+        ttl: float = DEFAULT_TTL,
+        settling_ttl: float = 0,
+        settle_days: int = DEFAULT_SETTLE_DAYS,
+        clock=time.time,
+    ):
+        self.ttl = ttl
+        self.settling_ttl = settling_ttl
+        self.settle_days = settle_days
+        self._clock = clock
+
+    def get_ttl(self, request: RunReportRequest, today: Optional[date] = None) -> float:
+        """
+        Seconds the response of ``request`` may be kept, 0 when it must not be cached.
+        """
+        today = today or date.fromtimestamp(self._clock())
+        settled_until = today - timedelta(days=self.settle_days + 1)
+        for date_range in request.date_ranges:
+            if resolve_ga_date(date_range.end_date, today) > settled_until:
+                return self.settling_ttl
+        return self.ttl
+
+    def get(self, request: RunReportRequest) -> Optional[RunReportResponse]:
+        """
+        :return: Cached response of ``request``, or None
+        """
+        entry = self._read(get_request_key(request))
+        if entry is None:
+            return None
+        (expires_at,) = _HEADER.unpack_from(entry)
+        if expires_at <= self._clock():
+            return None
+        return decode_report_bytes(entry[_HEADER.size :])
+
+    def set(self, request: RunReportRequest, response: RunReportResponse) -> None:
+        """
+        Store the response of ``request``, unless its report is still settling without settling_ttl.
+        """
+        ttl = self.get_ttl(request)
+        if ttl <= 0:
+            return
+        self._write(
+            get_request_key(request),
+            _HEADER.pack(self._clock() + ttl) + RunReportResponse.serialize(response),
+        )
+
+    @abstractmethod
+    def _read(self, key: str) -> Optional[bytes]:
+        """
+        :return: Entry stored under key, or None
+        """
+
+    @abstractmethod
+    def _write(self, key: str, entry: bytes) -> None:
+        """
+        Store the entry under key, replacing any previous one.
+        """
+
+
+class LocalReportCache(ReportCache):
+    """
+    Report cache in a local directory, bounded in size by evicting the least recently used entries.
+
+    :param directory: Directory of the cache files, created if missing.
+    :param max_bytes: Total size of the cache files.
+    :param kwargs: See ReportCache.
+    """
+
+    def __init__(self, directory, max_bytes: int = DEFAULT_MAX_BYTES, **kwargs):
+        super().__init__(**kwargs)
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _get_path(self, key):
+        return os.path.join(self.directory, f"{key}.pb")
+
+    def _read(self, key):
+        path = self._get_path(key)
+        try:
+            with open(path, "rb") as f:
+                entry = f.read()
+            # The modification time orders the entries for eviction.
+            os.utime(path)
+        except FileNotFoundError:
+            return None
+        return entry
+
+    def _write(self, key, entry):
+        with tempfile.NamedTemporaryFile(
+            dir=self.directory, delete=False, suffix=".tmp"
+        ) as f:
+            f.write(entry)
+        os.replace(f.name, self._get_path(key))
+        self._evict()
+
+    def _evict(self):
+        """
+        Delete the least recently used entries until the cache fits in max_bytes.
+        """
+        with self._lock:
+            entries = []
+            for entry in os.scandir(self.directory):
+                if entry.name.endswith(".pb"):
+                    stat = entry.stat()
+                    entries.append((stat.st_mtime, stat.st_size, entry.path))
+            total = sum(size for _, size, _ in entries)
+            for _, size, path in sorted(entries):
+                if total <= self.max_bytes:
+                    break
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+
+
+class GCSReportCache(ReportCache):
+    """
+    Report cache in a GCS bucket, shared by every worker.
+    Expired entries are ignored but not deleted, bound the size of the cache
+    with a lifecycle rule of the bucket, e.g. deleting objects older than ``ttl``.
+
+    :param gcs_hook: GCSHook of the bucket.
+    :param bucket_name: Bucket Name of GCS.
+    :param prefix: Prefix of the cache objects.
+    :param kwargs: See ReportCache.
+    """
+
+    def __init__(self, gcs_hook, bucket_name, prefix="ga_report_cache", **kwargs):
+        super().__init__(**kwargs)
+        self.gcs_hook = gcs_hook
+        self.bucket_name = bucket_name
+        self.prefix = prefix
+
+    def _get_object_name(self, key):
+        return f"{self.prefix}/{key}.pb"
+
+    def _read(self, key):
+        try:
+            return self.gcs_hook.download(
+                bucket_name=self.bucket_name, object_name=self._get_object_name(key)
+            )
+        except NotFound:
+            return None
+
+    def _write(self, key, entry):
+        self.gcs_hook.upload(
+            bucket_name=self.bucket_name,
+            object_name=self._get_object_name(key),
+            data=entry,
+            mime_type="application/octet-stream",
+        )
@@ -0,0 +1,189 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Columnar decoding of Analytics Data API report responses.
+
+Values are read column by column straight from the underlying protobuf
+message, skipping the proto-plus wrappers and the per-row lists that a
+row-major loop has to build. Metric columns are cast in bulk to numpy
+dtypes using the MetricHeader type, so they are never held as strings
+once decoded.
+"""
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from google.analytics.data_v1beta.types import MetricType, RunReportResponse
+
+try:
+    import pyarrow as pa
+except ImportError:
+    pa = None
+
+
+# Every metric type other than TYPE_INTEGER is a decimal value; durations,
+# currencies and distances are all returned as floats by the API.
+METRIC_TYPE_DTYPES = {
+    MetricType.TYPE_INTEGER: np.int64,
+    MetricType.TYPE_FLOAT: np.float64,
+    MetricType.TYPE_SECONDS: np.float64,
+    MetricType.TYPE_MILLISECONDS: np.float64,
+    MetricType.TYPE_MINUTES: np.float64,
+    MetricType.TYPE_HOURS: np.float64,
+    MetricType.TYPE_STANDARD: np.float64,
+    MetricType.TYPE_CURRENCY: np.float64,
+    MetricType.TYPE_FEET: np.float64,
+    MetricType.TYPE_MILES: np.float64,
+    MetricType.TYPE_METERS: np.float64,
+    MetricType.TYPE_KILOMETERS: np.float64,
+}
+
+
+def get_schema_type_dtype(schema_type: Optional[str]):
+    """
+    Map a table schema type, e.g. "int" or "float", to a numpy dtype.
+    :param schema_type: Column type from the schema definition file
+    :return: numpy dtype, or None for non numeric types
+    """
+    if not schema_type:
+        return None
+    schema_type = schema_type.lower()
+    if "int" in schema_type:
+        return np.int64
+    if any(
+        numeric in schema_type
+        for numeric in ("float", "double", "real", "number", "numeric", "decimal")
+    ):
+        return np.float64
+    return None
+
+
+def get_metric_dtype(header, schema_types: Optional[Dict[str, str]] = None):
+    """
+    Resolve the dtype of a metric column from its MetricHeader type,
+    falling back to the schema type when the API leaves it unspecified.
+    :param header: MetricHeader
+    :param schema_types: Mapping of column name to schema type, matched case-insensitively
+    :return: numpy dtype, or None to keep the values as strings
+    """
+    dtype = METRIC_TYPE_DTYPES.get(getattr(header, "type_", None))
+    if dtype is None and schema_types:
+        schema_types = {name.lower(): value for name, value in schema_types.items()}
+        dtype = get_schema_type_dtype(schema_types.get(header.name.lower()))
+    return dtype
+
+
+def cast_metric_values(values: list, dtype) -> np.ndarray:
+    """
+    Cast a column of metric strings to a numpy array in one call.
+    Columns with blank or malformed values are coerced to float64 with NaN.
+    :param values: Metric values as returned by the API
+    :param dtype: Target numpy dtype
+    :return: numpy array
+    """
+    try:
+        return np.array(values, dtype=dtype)
+    except ValueError:
+        return pd.to_numeric(pd.Series(values), errors="coerce").to_numpy(
+            dtype=np.float64
+        )
+
+
+def _get_raw_response(response):
+    """
+    Return the protobuf message behind a proto-plus RunReportResponse.
+    Anything else exposing the same fields is returned unchanged.
+    """
+    if isinstance(response, RunReportResponse):
+        return RunReportResponse.pb(response)
+    return response
+
+
+def decode_report_bytes(data: bytes) -> RunReportResponse:
+    """
+    Parse a serialized RunReportResponse without an intermediate proto-plus copy.
+    :param data: Serialized RunReportResponse
+    :return: RunReportResponse
+    """
+    return RunReportResponse.wrap(RunReportResponse.pb().FromString(data))
+
+
+def get_report_columns(
+    response, schema_types: Optional[Dict[str, str]] = None
+) -> Tuple[List[str], Dict[str, list]]:
+    """
+    Decode a report into one buffer per column.
+    Metric columns with a known type are returned as numpy arrays.
+    :param response: RunReportResponse
+    :param schema_types: Mapping of column name to schema type, used for metrics without a MetricHeader type
+    :return: Column names in report order, and a mapping of column name to values
+    """
+    raw = _get_raw_response(response)
+    rows = raw.rows
+    dimension_values = [row.dimension_values for row in rows]
+    metric_values = [row.metric_values for row in rows]
+
+    columns = []
+    buffers = {}
+    for i, header in enumerate(raw.dimension_headers):
+        columns.append(header.name)
+        buffers[header.name] = [values[i].value for values in dimension_values]
+    for i, header in enumerate(raw.metric_headers):
+        columns.append(header.name)
+        buffer = [values[i].value for values in metric_values]
+        dtype = get_metric_dtype(header, schema_types)
+        buffers[header.name] = (
+            buffer if dtype is None else cast_metric_values(buffer, dtype)
+        )
+    return columns, buffers
+
+
+def report_to_df(
+    response, schema_types: Optional[Dict[str, str]] = None
+) -> pd.DataFrame:
+    """
+    Build a DataFrame from a report, column by column.
+    :param response: RunReportResponse
+    :param schema_types: Mapping of column name to schema type, see get_report_columns
+    :return: Report DataFrame
+    """
+    columns, buffers = get_report_columns(response, schema_types)
+    return pd.DataFrame(buffers, columns=columns)
+
+
+def report_to_arrow(response, schema_types: Optional[Dict[str, str]] = None):
+    """
+    Build a pyarrow Table from a report, column by column.
+    :param response: RunReportResponse
+    :param schema_types: Mapping of column name to schema type, see get_report_columns
+    :return: pyarrow.Table
+    """
+    if pa is None:
+        raise ImportError("pyarrow is required to decode reports to Arrow tables")
+    columns, buffers = get_report_columns(response, schema_types)
+    return pa.table(
+        [
+            (
+                pa.array(buffers[column])
+                if isinstance(buffers[column], np.ndarray)
+                else pa.array(buffers[column], type=pa.string())
+            )
+            for column in columns
+        ],
+        names=columns,
+    )
@@ -0,0 +1,197 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+Coalescing of the reports of a property into fewer API requests.
+
+A report whose dimensions are a subset of another report's dimensions, for the
+same property and date range, can be derived from it by grouping on its own
+dimensions and summing, as long as every one of its metrics is additive or a
+ratio of additive metrics. The planner requests the finer report once, with
+the metrics of both, and derives the coarser one locally.
+
+Only metrics that count events are additive across dimensions. User metrics
+(activeUsers, newUsers, active28DayUsers, ...) are distinct counts, a user
+seen with two browsers is one user of the country but two rows of the browser
+report, so they are never summed, nor are the ratios built on them such as
+sessionsPerUser. Session metrics are only additive over dimensions that do not
+change within a session, pass them in additive_metrics when that holds.
+"""
+from typing import Dict, FrozenSet, Iterable, List, Optional, Sequence
+
+import pandas as pd
+
+# Event counts and values, each event has exactly one value of every dimension.
+ADDITIVE_METRICS = frozenset(
+    {
+        "eventCount",
+        "eventValue",
+        "screenPageViews",
+        "conversions",
+        "keyEvents",
+        "userEngagementDuration",
+        "ecommercePurchases",
+        "purchaseRevenue",
+        "totalRevenue",
+    }
+)
+# Ratio metrics and their numerator and denominator, derivable when both are additive.
+RATIO_METRICS = {
+    "sessionsPerUser": ("sessions", "activeUsers"),
+    "eventCountPerUser": ("eventCount", "activeUsers"),
+    "eventsPerSession": ("eventCount", "sessions"),
+    "screenPageViewsPerSession": ("screenPageViews", "sessions"),
+    "screenPageViewsPerUser": ("screenPageViews", "activeUsers"),
+    "engagementRate": ("engagedSessions", "sessions"),
+}
+# Most metrics of a single RunReportRequest.
+MAX_METRICS = 10
+
+
+def is_derivable(metric: str, additive_metrics: FrozenSet[str] = ADDITIVE_METRICS):
+    """
+    Whether a metric can be computed from a report with more dimensions.
+    """
+    if metric in RATIO_METRICS:
+        return all(part in additive_metrics for part in RATIO_METRICS[metric])
+    return metric in additive_metrics
+
+
+def get_source_metrics(metrics: Iterable[str]) -> List[str]:
+    """
+    Metrics to request to derive ``metrics``, ratios replaced by their parts.
+    """
+    source_metrics = []
+    for metric in metrics:
+        for part in RATIO_METRICS.get(metric, (metric,)):
+            if part not in source_metrics:
+                source_metrics.append(part)
+    return source_metrics
+
+
+class ReportPlan:
+    """
+    One report to request, and the reports read from it.
+
+    :param dimensions: Dimensions of the request, those of its finest report.
+    :param metrics: Metrics of the request, covering every report of the plan.
+    :param reports: Names of the reports read from the request, the first one is
+        the finest and is not aggregated.
+    """
+
+    __slots__ = ("dimensions", "metrics", "reports")
+
+    def __init__(self, dimensions: Sequence[str], metrics: Sequence[str], name: str):
+        self.dimensions = list(dimensions)
+        self.metrics = list(metrics)
+        self.reports = [name]
+
+    def try_add(
+        self,
+        name: str,
+        dimensions: Sequence[str],
+        metrics: Sequence[str],
+        additive_metrics: FrozenSet[str],
+    ) -> bool:
+        """
+        Add a report derivable from this plan's request, if the request stays within
+        the API limits.
+        :return: Whether the report was added
+        """
+        if not set(dimensions) <= set(self.dimensions):
+            return False
+        if not all(is_derivable(metric, additive_metrics) for metric in metrics):
+            return False
+        merged = self.metrics + [
+            metric
+            for metric in get_source_metrics(metrics)
+            if metric not in self.metrics
+        ]
+        if len(merged) > MAX_METRICS:
+            return False
+        self.metrics = merged
+        self.reports.append(name)
+        return True
+
+    def __repr__(self):
+        return f"ReportPlan({self.reports!r}, {len(self.metrics)} metrics)"
+
+
+def plan_reports(
+    reports: Dict[str, Dict], additive_metrics: Optional[Iterable[str]] = None
+) -> List[ReportPlan]:
+    """
+    Group reports of the same property and date range into as few requests as possible.
+    Reports are taken from the most to the least dimensions, and each one is read from
+    the first planned request it can be derived from, or gets its own request.
+    :param reports: Mapping of report name to a dict with ``dimensions`` and ``metrics``.
+    :param additive_metrics: Metrics that may be summed, ADDITIVE_METRICS by default.
+    :return: Plans, in order of their first report
+    """
+    additive_metrics = frozenset(
+        ADDITIVE_METRICS if additive_metrics is None else additive_metrics
+    )
+    plans = []
+    for name, report in sorted(
+        reports.items(), key=lambda item: -len(item[1]["dimensions"])
+    ):
+        if not any(
+            plan.try_add(
+                name, report["dimensions"], report["metrics"], additive_metrics
+            )
+            for plan in plans
+        ):
+            plans.append(ReportPlan(report["dimensions"], report["metrics"], name))
+    return plans
+
+
+def derive_report(
+    df: pd.DataFrame,
+    plan: ReportPlan,
+    dimensions: Sequence[str],
+    metrics: Sequence[str],
+) -> pd.DataFrame:
+    """
+    Read a report from the DataFrame of its plan's request.
+    Reports with fewer dimensions are grouped and summed, and their ratio metrics
+    computed from the summed parts. Rows whose metrics are all zero are dropped,
+    the API leaves them out of a report requested on its own.
+    :param df: Report DataFrame of the plan's request
+    :param plan: ReportPlan of the request
+    :param dimensions: Dimensions of the report
+    :param metrics: Metrics of the report
+    :return: Report DataFrame, with the dimensions then the metrics of the report
+    """
+    dimensions = list(dimensions)
+    metrics = list(metrics)
+    if set(dimensions) != set(plan.dimensions):
+        df = df.groupby(dimensions, sort=False, as_index=False)[
+            get_source_metrics(metrics)
+        ].sum()
+        ratios = {}
+        for metric in metrics:
+            if metric in RATIO_METRICS:
+                numerator, denominator = RATIO_METRICS[metric]
+                ratios[metric] = (df[numerator] / df[denominator]).where(
+                    df[denominator] != 0, 0.0
+                )
+        if ratios:
+            df = df.assign(**ratios)
+    df = df[dimensions + metrics]
+    if len(metrics) < len(plan.metrics):
+        df = df[(df[metrics] != 0).any(axis=1)]
+    return df.reset_index(drop=True)
@@ -0,0 +1,46 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains a hook of Google Cloud Storage for the gcloud-aio clients.
+"""
+import io
+import json
+from typing import IO, Optional, Union
+
+from airflow.providers.google.common.hooks.base_google import GoogleBaseHook
+
+
+class GCSAioHook(GoogleBaseHook):
+    """
+    Hook of a Google Cloud connection for gcloud-aio-storage, whose clients take the
+    service account key itself instead of google-auth credentials.
+    """
+
+    def get_service_file(self) -> Optional[Union[str, IO[str]]]:
+        """
+        Service account key of the connection, for the ``service_file`` of the asyncio
+        storage client. Reads the connection, call it from a thread in an event loop.
+        :return: The key as a file object, the path of the key file, or None for the
+            application default credentials
+        """
+        keyfile_dict = self._get_field("keyfile_dict", None)
+        if keyfile_dict:
+            if not isinstance(keyfile_dict, str):
+                keyfile_dict = json.dumps(keyfile_dict)
+            return io.StringIO(keyfile_dict)
+        return self._get_field("key_path", None)
@@ -0,0 +1,71 @@
+"""
+Resolves Google Analytics date strings and splits date ranges into shards
+"""
+import re
+from datetime import date, datetime, timedelta
+from typing import List, Optional, Tuple
+
+SHARD_PERIODS = ("day", "week", "month")
+
+# GA relative dates, e.g. "7daysAgo"
+N_DAYS_AGO = re.compile(r"^(\d+)daysAgo$")
+
+
+def resolve_ga_date(value, today: Optional[date] = None) -> date:
+    """
+    Turn a GA date string into a date.
+    Relative dates are resolved against ``today``, which defaults to the
+    local date; GA itself resolves them in the property's time zone.
+    :param value: YYYY-MM-DD, today, yesterday, or NdaysAgo where N is a positive integer
+    :param today: Reference date for relative dates
+    :return: date
+    """
+    if isinstance(value, date):
+        return value
+    today = today or date.today()
+    if value == "today":
+        return today
+    if value == "yesterday":
+        return today - timedelta(days=1)
+    match = N_DAYS_AGO.match(value)
+    if match:
+        return today - timedelta(days=int(match.group(1)))
+    return datetime.strptime(value, "%Y-%m-%d").date()
+
+
+def _next_shard_start(day: date, shard_by: str) -> date:
+    if shard_by == "day":
+        return day + timedelta(days=1)
+    if shard_by == "week":
+        # Weeks start on Monday
+        return day + timedelta(days=7 - day.weekday())
+    if day.month == 12:
+        return date(day.year + 1, 1, 1)
+    return date(day.year, day.month + 1, 1)
+
+
+def split_date_range(
+    start_ds, end_ds, shard_by: str, today: Optional[date] = None
+) -> List[Tuple[date, date]]:
+    """
+    Split an inclusive date range into calendar aligned windows.
+    The first and last windows are cut to the range.
+    :param start_ds: Start Date of the data range, see resolve_ga_date
+    :param end_ds: End Date of the data range, see resolve_ga_date
+    :param shard_by: day, week (Monday to Sunday) or month
+    :param today: Reference date for relative dates
+    :return: List of inclusive (start, end) dates
+    """
+    if shard_by not in SHARD_PERIODS:
+        raise ValueError(f"shard_by must be one of {SHARD_PERIODS}, got {shard_by}")
+    start = resolve_ga_date(start_ds, today)
+    end = resolve_ga_date(end_ds, today)
+    if start > end:
+        raise ValueError(f"Start date {start} is after end date {end}")
+
+    shards = []
+    while start <= end:
+        next_start = _next_shard_start(start, shard_by)
+        shards.append((start, min(end, next_start - timedelta(days=1))))
+        start = next_start
+    return shards
@@ -0,0 +1,126 @@
+"""
+Persists the last extracted date of each property and table, so runs only
+extract the dates that have not landed yet
+"""
+import json
+import os
+import tempfile
+import threading
+from abc import ABC, abstractmethod
+from datetime import date, timedelta
+from typing import Optional, Tuple
+
+from airflow.models import Variable
+from include.libs.date_ranges.date_shards import resolve_ga_date
+
+
+class WatermarkStore(ABC):
+    """
+    Base class of watermark stores, keyed by property and table.
+    """
+
+    @abstractmethod
+    def get(self, property_id, table) -> Optional[date]:
+        """
+        :return: Last date extracted for the property and table, or None if never extracted
+        """
+
+    @abstractmethod
+    def set(self, property_id, table, value: date) -> None:
+        """
+        Record ``value`` as the last date extracted for the property and table.
+        """
+
+    @staticmethod
+    def _get_key(property_id, table) -> str:
+        return f"{property_id}__{table}"
+
+
+class JsonWatermarkStore(WatermarkStore):
+    """
+    Watermarks kept in a local JSON file, for local runs and tests.
+    Writes replace the file atomically, but concurrent processes may still
+    overwrite each other, use VariableWatermarkStore on a shared deployment.
+
+    :param path: Path of the JSON file, created on the first write.
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    def _read(self) -> dict:
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+    def get(self, property_id, table) -> Optional[date]:
+        value = self._read().get(self._get_key(property_id, table))
+        return date.fromisoformat(value) if value else None
+
+    def set(self, property_id, table, value: date) -> None:
+        with self._lock:
+            watermarks = self._read()
+            watermarks[self._get_key(property_id, table)] = value.isoformat()
+            dirname = os.path.dirname(os.path.abspath(self.path))
+            with tempfile.NamedTemporaryFile(
+                "w", dir=dirname, delete=False, suffix=".tmp"
+            ) as f:
+                json.dump(watermarks, f, indent=2, sort_keys=True)
+            os.replace(f.name, self.path)
+
+
+class VariableWatermarkStore(WatermarkStore):
+    """
+    Watermarks kept in Airflow Variables, one per property and table, so tasks
+    of different tables never overwrite each other.
+
+    :param prefix: Prefix of the Variable keys, ``<prefix>__<property_id>__<table>``.
+    """
+
+    def __init__(self, prefix="ga_watermark"):
+        self.prefix = prefix
+
+    def _get_variable_key(self, property_id, table) -> str:
+        return f"{self.prefix}__{self._get_key(property_id, table)}"
+
+    def get(self, property_id, table) -> Optional[date]:
+        value = Variable.get(
+            self._get_variable_key(property_id, table), default_var=None
+        )
+        return date.fromisoformat(value) if value else None
+
+    def set(self, property_id, table, value: date) -> None:
+        Variable.set(self._get_variable_key(property_id, table), value.isoformat())
+
+
+def get_incremental_range(
+    watermark: Optional[date],
+    start_ds,
+    end_ds,
+    lookback_days: int = 0,
+    today: Optional[date] = None,
+) -> Optional[Tuple[date, date]]:
+    """
+    Compute the smallest date range still to extract.
+    Without a watermark, the whole range is due. Otherwise the range starts the
+    day after the watermark, moved back by ``lookback_days`` to pick up GA data
+    that settled since it was extracted, and never before ``start_ds``.
+    :param watermark: Last date extracted, or None
+    :param start_ds: Earliest date to extract, see resolve_ga_date
+    :param end_ds: Latest date to extract, see resolve_ga_date
+    :param lookback_days: Number of already extracted days to extract again
+    :param today: Reference date for relative dates
+    :return: Inclusive (start, end) dates, or None when nothing new is due
+    """
+    start = resolve_ga_date(start_ds, today)
+    end = resolve_ga_date(end_ds, today)
+    if watermark is not None:
+        if watermark >= end:
+            return None
+        start = max(start, watermark + timedelta(days=1 - lookback_days))
+    if start > end:
+        return None
+    return start, end
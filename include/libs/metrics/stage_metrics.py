@@ -0,0 +1,127 @@
+"""
+Times and counts the stages of an extraction or a load, emits them through
+Airflow's stats interface (StatsD or OpenTelemetry) and summarizes them for XCom
+"""
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import timedelta
+from typing import Dict, Iterable, Iterator, Optional
+
+from airflow.stats import Stats
+
+METRIC_PREFIX = "google_analytics"
+
+
+class StageMetrics:
+    """
+    Timers and counters of one task, safe to share between threads.
+
+    Every timing and count is emitted as ``google_analytics.<prefix>.<name>``
+    with the given tags, e.g. property_id and table, and added to the summary.
+
+    :param prefix: Prefix of the metric names, e.g. extract or load.
+    :param tags: Tags of every metric, values are converted to strings and None values dropped.
+    """
+
+    def __init__(self, prefix: str, tags: Optional[Dict] = None):
+        self.prefix = prefix
+        self.tags = {
+            key: str(value) for key, value in (tags or {}).items() if value is not None
+        }
+        self.seconds: Dict[str, float] = {}
+        self.counts: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        # Seconds by stage of the current thread, for timers excluding a nested stage
+        self._local = threading.local()
+
+    def _get_stat(self, name: str) -> str:
+        return f"{METRIC_PREFIX}.{self.prefix}.{name}"
+
+    def _get_thread_seconds(self) -> Dict[str, float]:
+        if not hasattr(self._local, "seconds"):
+            self._local.seconds = {}
+        return self._local.seconds
+
+    def add_timing(self, stage: str, seconds: float) -> None:
+        thread_seconds = self._get_thread_seconds()
+        thread_seconds[stage] = thread_seconds.get(stage, 0.0) + seconds
+        with self._lock:
+            self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+        Stats.timing(self._get_stat(stage), timedelta(seconds=seconds), tags=self.tags)
+
+    def incr(self, counter: str, count: int = 1) -> None:
+        with self._lock:
+            self.counts[counter] = self.counts.get(counter, 0) + count
+        Stats.incr(self._get_stat(counter), count, tags=self.tags)
+
+    @contextmanager
+    def timer(self, stage: str, exclude: Optional[str] = None):
+        """
+        Time the block as ``stage``, also when it raises.
+        :param exclude: Stage timed inside the block by the same thread, e.g. pages
+            consumed while writing, whose time is subtracted so stages do not overlap.
+        """
+        thread_seconds = self._get_thread_seconds()
+        excluded = thread_seconds.get(exclude, 0.0) if exclude else 0.0
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            elapsed = time.perf_counter() - start
+            if exclude:
+                elapsed -= thread_seconds.get(exclude, 0.0) - excluded
+            self.add_timing(stage, max(elapsed, 0.0))
+
+    def timed_iter(self, stage: str, iterable: Iterable) -> Iterator:
+        """
+        Time how long every item of ``iterable`` takes to be produced, as ``stage``.
+        """
+        iterator = iter(iterable)
+        while True:
+            with self.timer(stage):
+                try:
+                    item = next(iterator)
+                except StopIteration:
+                    return
+            yield item
+
+    def merge(self, summary: Dict) -> None:
+        """
+        Add the timings and counts of a summary, e.g. of a trigger, without emitting them again.
+        """
+        with self._lock:
+            for stage, seconds in summary.get("seconds", {}).items():
+                self.seconds[stage] = self.seconds.get(stage, 0.0) + seconds
+            for counter, count in summary.get("counts", {}).items():
+                self.counts[counter] = self.counts.get(counter, 0) + count
+
+    def summary(self) -> Dict:
+        """
+        :return: Tags, seconds by stage and counts by counter, JSON serializable for XCom
+        """
+        with self._lock:
+            return {
+                "tags": dict(self.tags),
+                "seconds": {
+                    stage: round(seconds, 6) for stage, seconds in self.seconds.items()
+                },
+                "counts": dict(self.counts),
+            }
+
+
+def timer(metrics: Optional[StageMetrics], stage: str, exclude: Optional[str] = None):
+    """
+    StageMetrics.timer, or a no-op without metrics.
+    """
+    if metrics is None:
+        return nullcontext()
+    return metrics.timer(stage, exclude)
+
+
+def incr(metrics: Optional[StageMetrics], counter: str, count: int = 1) -> None:
+    """
+    StageMetrics.incr, or a no-op without metrics.
+    """
+    if metrics is not None:
+        metrics.incr(counter, count)
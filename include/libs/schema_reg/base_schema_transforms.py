@@ -1,11 +1,14 @@
 """
 Parses schema definitions in include/libs/table_schemas/snowflake/<db_name>/<schema_name>.json
 """
-import json
+import functools
+import hashlib
 import logging
 import pandas as pd
 import numpy as np
 
+from include.libs.schema_reg.schema_registry import get_table_schema, schema_registry
+
 ### RELIES ON TEMPORARY SCHEMA DESIGN FOR ORDERING #####
 # "id": {
 #     "type": "varchar(25)",
@@ -53,88 +56,154 @@ def get_schema_raw_columns(table_props: dict) -> list:
 def get_table_def_schema(TABLE_SCHEMA_DIR, transform_db, transform_schema):
     """
     Fow now, we'll access local json files. This is meant to evolve
+    Files are parsed once per process and again only when they change,
+    the definitions returned are shared and must not be modified
     """
-    with open(f'{TABLE_SCHEMA_DIR}/{transform_db}/{transform_schema}.json', 'r') as f:
-        table_schema = json.load(f)
-        table_def = table_schema.get('definitions')
-        return table_def
+    return schema_registry.get_definitions(
+        f'{TABLE_SCHEMA_DIR}/{transform_db}/{transform_schema}.json')
 
 
-def snowflake_load_column_string(table_props: dict) -> str:
+def snowflake_load_column_string(table_props: dict, include_hash_diff: bool = False) -> str:
     """
     Use the json table definition to build string necessary for
     selecting fields of interest for loading (i.e. omit passwords)
     Scrub it
     :param table_props: python dictionary of table properties dictionary
-        from houston.json schema def
+        from houston.json schema def, or its TableSchema
     :type table_props: dict
+    :param include_hash_diff: select the hash_diff column the extraction
+        appended after the last source column, see get_hash_diff
     :return col_string: string encoded for select on COPY ($1,$3,$6,et...)
     """
-    # This should work with if discription is not None
     try:
-        vals = [f"${val.get('description','').split('=')[1]}"
-                for key, val in table_props.items()
-                    if key not in ['insert_timestamp','hash_diff']
-        ]
+        col_string = get_table_schema(table_props).load_column_string(
+            include_hash_diff=include_hash_diff)
     except Exception as e:
         logging.error('Bad Table Def Schema %s' % e)
         raise
-    col_string = ','.join(vals)
     return col_string
 
 
-def resolve_schemas(df:pd.DataFrame, table_props: dict) -> pd.DataFrame:
+# Snowflake hash functions usable as hash_diff algorithm
+HASH_DIFF_ALGORITHMS = {
+    'md5': hashlib.md5,
+    'sha1': hashlib.sha1,
+    'sha2': hashlib.sha256,
+}
+
+
+def get_hash_diff(df: pd.DataFrame, table_props: dict) -> pd.Series:
     """
-    Take dataframe with raw data and remove or rename columns to match
-    table schema, and if any remain from schema that aren't in dataframe,
-    set null types for those colums
+    Compute the hash_diff of every row on the client, the same way the
+    MERGE templates do in Snowflake:
+    ALGORITHM(CONCAT(COALESCE(col, default), ...)) over the hash_diff columns.
+    Columns are matched on their source name, case-insensitively, and
+    missing columns count as NULL. Values are joined column by column
+    and only the digest itself runs per row.
+    :param df: Report DataFrame, with dates already formatted as YYYY-MM-DD
+    :param table_props: Table properties, with a hash_diff property, or their TableSchema
+    :return: Hex digests, indexed like df
     """
-    df.columns = map(str.lower, df.columns)
-    # get returned columns, the nmap returned column names to
-    # new names old: new
-    col_mapping = {get_schema_source_col(k, v): k.lower()
-                        for k,v in table_props.items()}
+    table_schema = get_table_schema(table_props)
+    algorithm = table_schema.hash_algorithm.lower()
+    if algorithm not in HASH_DIFF_ALGORITHMS:
+        raise ValueError(f"Unsupported hash_diff algorithm {algorithm}")
+    hash_func = HASH_DIFF_ALGORITHMS[algorithm]
+
+    df_cols = {col.lower(): col for col in df.columns}
+    parts = []
+    for name in table_schema.hash_columns:
+        col = table_schema.get_column(name)
+        default = 'missing_value' if col.default is None else col.default
+        source_col = df_cols.get(col.source.lower())
+        if source_col is None:
+            parts.append(pd.Series(default, index=df.index, dtype=object))
+            continue
+        values = df[source_col].astype(object)
+        parts.append(values.where(values.notna(), default).astype(str))
+    concatenated = parts[0].str.cat(parts[1:]) if len(parts) > 1 else parts[0]
+    return pd.Series(
+        [hash_func(value.encode('utf-8')).hexdigest() for value in concatenated],
+        index=df.index,
+        dtype=object,
+    )
+
+
+def get_schema_fill_value(col):
+    """
+    Value of a schema column missing from the source data: its default,
+    or the null value of its type
+    """
+    if col.default:
+        return col.default
+    dtype = (col.type or '').lower()
+    if (('varchar' in dtype) or ('text' in dtype) or
+        ('string' in dtype)):
+        return None
+    elif (('number' in dtype) or ('timestamp' in dtype) or
+          ('float' in dtype) or ('int' in dtype)):
+        return np.nan
+    elif 'bool' in dtype:
+        return False
+    else:
+        return ''
 
-    df.rename(columns=col_mapping, inplace=True)
-    current_cols = df.columns.tolist()
 
-    schema_orders = {k.lower(): get_schema_order(v)
-                        for k,v in table_props.items()
-                            if get_schema_order(v) != -1}
+class ResolvePlan:
+    """
+    Column plan of resolve_schemas, computed once per table schema
 
-    schema_cols = list(schema_orders.keys())
+    :param columns: Output columns, lower case, in source order
+    :param renames: Lower case source column names to output columns
+    :param fill_values: Value of each output column missing from the source data
+    """
+    __slots__ = ('columns', 'renames', 'fill_values')
 
-    # Take the values we have defined in the schema and set the order
-    schema_inters_cols = list(set(current_cols).intersection(schema_cols))
-    schema_inters_cols.sort(key=schema_orders.__getitem__)
+    def __init__(self, table_schema):
+        self.columns = [col.name.lower() for col in table_schema.source_columns]
+        self.renames = {col.source.lower(): col.name.lower()
+                        for col in table_schema.columns}
+        self.fill_values = {col.name.lower(): get_schema_fill_value(col)
+                            for col in table_schema.source_columns}
 
-    if schema_inters_cols:
-        df = df.loc[:,schema_inters_cols]
-    else:
-        raise ValueError(f"Bad Schema Design in Sorting Columns {df.columns.tolist()}")
-
-    # Check if any columns exist in full schema cols
-    # that aren't in schema intersection cols
-    # If so, add them with null values
-    remaining = list(set(schema_cols) - set(schema_inters_cols))
-    if remaining:
-        for col in remaining:
-            prop = table_props.get(col)
-            if prop.get('default', None):
-                df.loc[:,col] =  prop.get('default')
-            else:
-                dtype = get_schema_type(prop).lower()
-                if (('varchar' in dtype) or ('text' in dtype) or
-                    ('string' in dtype)):
-                    df.loc[:,col] = None
-                elif (('number' in dtype) or ('timestamp' in dtype) or
-                      ('float' in dtype) or ('int' in dtype)):
-                    df.loc[:,col] = np.nan
-                elif 'bool' in dtype:
-                    df.loc[:,col] = False
-                else:
-                    df.loc[:,col] = ''
-
-    #make sure we rearrange
-    schema_cols.sort(key=schema_orders.__getitem__)
-    return df.loc[:,schema_cols]
+
+@functools.lru_cache(maxsize=128)
+def _get_resolve_plan(table_schema) -> ResolvePlan:
+    return ResolvePlan(table_schema)
+
+
+def get_resolve_plan(table_props) -> ResolvePlan:
+    """
+    Column plan of resolve_schemas, cached for TableSchema objects
+    """
+    table_schema = get_table_schema(table_props)
+    if table_schema is table_props:
+        return _get_resolve_plan(table_schema)
+    return ResolvePlan(table_schema)
+
+
+def resolve_schemas(df:pd.DataFrame, table_props: dict) -> pd.DataFrame:
+    """
+    Take dataframe with raw data and remove or rename columns to match
+    table schema, and if any remain from schema that aren't in dataframe,
+    set null types for those colums
+    Columns are matched on their source name, case-insensitively, and selected
+    and ordered with a single reindex, df itself is left unchanged
+    :param table_props: Table properties, or their TableSchema
+    """
+    plan = get_resolve_plan(table_props)
+    renamed = df.set_axis(
+        [plan.renames.get(col.lower(), col.lower()) for col in df.columns], axis=1)
+    present = set(renamed.columns)
+    if not present.intersection(plan.columns):
+        raise ValueError(f"Bad Schema Design in Sorting Columns {renamed.columns.tolist()}")
+
+    # Missing columns come out of the reindex as NaN, those whose schema
+    # type has another null value are inserted in place afterwards
+    typed = [(i, col) for i, col in enumerate(plan.columns)
+             if col not in present and plan.fill_values[col] is not np.nan]
+    typed_cols = {col for _, col in typed}
+    df = renamed.reindex(columns=[col for col in plan.columns if col not in typed_cols])
+    for i, col in typed:
+        df.insert(i, col, plan.fill_values[col])
+    return df
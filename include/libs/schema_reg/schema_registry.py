@@ -0,0 +1,207 @@
+"""
+Parses schema definition files once into compact table schemas, cached by file mtime
+"""
+import json
+import os
+import threading
+from typing import Dict, List, Optional, Union
+
+# Columns added on load, without a source column
+LOAD_COLUMNS = ('insert_timestamp', 'hash_diff')
+
+
+def _split_value(value: str) -> str:
+    """
+    Value of a 'key=value' schema field, e.g. 'source_order=1'
+    """
+    return value.split('=')[1]
+
+
+class ColumnSchema:
+    """
+    One column of a table schema.
+
+    :param name: Column name in the destination table
+    :param type: Snowflake type
+    :param source: Source column name, see get_schema_source_col
+    :param order: Source order from the description, -1 if not a source column
+    :param default: Default value, or None
+    """
+    __slots__ = ('name', 'type', 'source', 'order', 'default')
+
+    def __init__(self, name: str, type: Optional[str], source: str, order: int,
+                 default=None):
+        self.name = name
+        self.type = type
+        self.source = source
+        self.order = order
+        self.default = default
+
+    @classmethod
+    def from_prop(cls, name: str, prop: dict) -> 'ColumnSchema':
+        default_source = prop.get('default_source', None)
+        description = prop.get('description', None)
+        return cls(
+            name=name,
+            type=prop.get('type', None),
+            source=_split_value(default_source) if default_source else name,
+            order=int(_split_value(description)) if description else -1,
+            default=prop.get('default', None),
+        )
+
+    def __repr__(self):
+        return f'ColumnSchema({self.name!r}, {self.type!r}, order={self.order})'
+
+
+class TableSchema:
+    """
+    Table properties of a schema definition, parsed once.
+
+    :param name: Table name
+    :param props: Table properties, kept for the SQL templates
+    :param dimensions: Report dimensions
+    :param metrics: Report metrics
+    :param cluster_keys: Cluster key columns
+    """
+    __slots__ = ('name', 'props', 'columns', 'source_columns', 'hash_columns',
+                 'hash_algorithm', 'dimensions', 'metrics', 'cluster_keys')
+
+    def __init__(self, name: Optional[str], props: dict,
+                 dimensions: Optional[List[str]] = None,
+                 metrics: Optional[List[str]] = None,
+                 cluster_keys: Optional[List[str]] = None):
+        self.name = name
+        self.props = props
+        # Columns in definition order
+        self.columns = tuple(
+            ColumnSchema.from_prop(key, prop) for key, prop in props.items()
+        )
+        # Columns with a source order, sorted by it
+        self.source_columns = tuple(sorted(
+            (col for col in self.columns if col.order != -1),
+            key=lambda col: col.order,
+        ))
+        hash_diff = props.get('hash_diff') or {}
+        self.hash_columns = tuple(hash_diff.get('columns', ()))
+        self.hash_algorithm = hash_diff.get('algorithm', 'MD5')
+        self.dimensions = tuple(dimensions or ())
+        self.metrics = tuple(metrics or ())
+        self.cluster_keys = tuple(cluster_keys or ())
+
+    @classmethod
+    def from_def(cls, name: str, table_def: dict) -> 'TableSchema':
+        """
+        Parse a table definition of a schema file
+        """
+        return cls(
+            name=name,
+            props=table_def.get('properties'),
+            dimensions=table_def.get('dimensions'),
+            metrics=table_def.get('metrics'),
+            cluster_keys=table_def.get('cluster_keys', {}).get('columns'),
+        )
+
+    def get_column(self, name: str) -> Optional[ColumnSchema]:
+        for col in self.columns:
+            if col.name == name:
+                return col
+        return None
+
+    @property
+    def schema_types(self) -> Dict[str, Optional[str]]:
+        """
+        Map source column names to their schema types
+        """
+        return {col.source: col.type for col in self.columns}
+
+    def load_column_string(self, include_hash_diff: bool = False) -> str:
+        """
+        See snowflake_load_column_string
+        """
+        cols = [col for col in self.columns if col.name not in LOAD_COLUMNS]
+        unordered = [col.name for col in cols if col.order == -1]
+        if unordered:
+            raise ValueError(f'Bad Table Def Schema, no source order for {unordered}')
+        vals = [f'${col.order}' for col in cols]
+        if include_hash_diff:
+            vals.append(f'${len(vals) + 1}')
+        return ','.join(vals)
+
+    def __repr__(self):
+        return f'TableSchema({self.name!r}, {len(self.columns)} columns)'
+
+
+def get_table_schema(table_props: Union[dict, TableSchema]) -> TableSchema:
+    """
+    Parse table properties, passing through already parsed schemas
+    """
+    if isinstance(table_props, TableSchema):
+        return table_props
+    return TableSchema(None, table_props)
+
+
+class SchemaFile:
+    """
+    A parsed schema definition file.
+
+    :param definitions: Raw table definitions, shared by every caller, do not modify
+    :param tables: Parsed table schemas by table name
+    """
+    __slots__ = ('mtime_ns', 'size', 'definitions', 'tables')
+
+    def __init__(self, mtime_ns: int, size: int, definitions: dict):
+        self.mtime_ns = mtime_ns
+        self.size = size
+        self.definitions = definitions
+        self.tables = {
+            name: TableSchema.from_def(name, table_def)
+            for name, table_def in definitions.items()
+        }
+
+
+class SchemaRegistry:
+    """
+    Cache of parsed schema definition files. A file is parsed again only
+    once its mtime or size changes, so DAG parsing, operators and
+    resolve_schemas share one parse per process.
+    """
+
+    def __init__(self):
+        self._files: Dict[str, SchemaFile] = {}
+        self._lock = threading.Lock()
+
+    def get_file(self, path: str) -> SchemaFile:
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        schema_file = self._files.get(path)
+        if (schema_file is None or schema_file.mtime_ns != stat.st_mtime_ns
+                or schema_file.size != stat.st_size):
+            with self._lock:
+                with open(path, 'r') as f:
+                    definitions = json.load(f).get('definitions')
+                schema_file = SchemaFile(stat.st_mtime_ns, stat.st_size, definitions)
+                self._files[path] = schema_file
+        return schema_file
+
+    def get_definitions(self, path: str) -> dict:
+        """
+        :return: Raw table definitions of the schema file
+        """
+        return self.get_file(path).definitions
+
+    def get_tables(self, path: str) -> Dict[str, TableSchema]:
+        """
+        :return: Parsed table schemas of the schema file by table name
+        """
+        return self.get_file(path).tables
+
+    def get_table(self, path: str, table: str) -> TableSchema:
+        return self.get_file(path).tables[table]
+
+    def clear(self) -> None:
+        with self._lock:
+            self._files.clear()
+
+
+# Shared by everything running in the process
+schema_registry = SchemaRegistry()
@@ -18,16 +18,80 @@
 """
 This module contains Google Analytics Data to GCS operators.
 """
+import asyncio
+import gzip
+import io
+import json
 import logging
+import posixpath
 import tempfile
-from typing import Dict, Iterable
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from contextlib import contextmanager
+from typing import Dict, Iterable, List, Optional, Tuple
 
-from airflow.models import BaseOperator
+from airflow.exceptions import (
+    AirflowException,
+    AirflowFailException,
+    AirflowSkipException,
+)
 from airflow.providers.google.cloud.hooks.gcs import GCSHook
-from include.hooks.google.analytics.analytics_data import GoogleAnalyticsDataHook
+from include.hooks.google.analytics.analytics_data import (
+    DEFAULT_PAGE_SIZE,
+    GoogleAnalyticsDataHook,
+)
+from include.hooks.google.analytics.client_pool import default_client_pool
+from include.hooks.google.analytics.metadata_cache import MetadataCache
+from include.hooks.google.analytics.report_cache import ReportCache
+from include.hooks.google.analytics.report_planner import (
+    ReportPlan,
+    derive_report,
+    plan_reports,
+)
+from include.libs.date_ranges.date_shards import (
+    SHARD_PERIODS,
+    resolve_ga_date,
+    split_date_range,
+)
+from include.libs.date_ranges.watermarks import WatermarkStore, get_incremental_range
+from include.libs.metrics.stage_metrics import StageMetrics, incr, timer
+from include.libs.schema_reg.base_schema_transforms import get_hash_diff
+from include.libs.schema_reg.schema_registry import TableSchema, get_table_schema
+from include.operators.table_params import TableParamsMixin
+from include.triggers.google.analytics.gatogcstrigger import GAToGCSTrigger
 
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:
+    pa = pq = None
 
-class GAToGCSOperator(BaseOperator):
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+try:
+    import gcloud.aio.storage as gcs_aio
+except ImportError:
+    gcs_aio = None
+
+# Compression codecs supported by each output format, None is the default.
+OUTPUT_COMPRESSIONS = {
+    "csv": (None, "gzip", "zstd"),
+    "parquet": (None, "snappy", "zstd", "gzip"),
+}
+CSV_CONTENT_TYPES = {
+    None: "text/csv",
+    "gzip": "application/gzip",
+    "zstd": "application/zstd",
+}
+# Size of each request of a streamed upload, a multiple of 256 KiB.
+DEFAULT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+# Rows written between two checks of max_bytes_per_file.
+PART_SLICE_ROWS = 10000
+
+
+class GAToGCSOperator(TableParamsMixin):
     """
     Get Google analytics data report and save reports to GCS.
 
@@ -43,8 +107,57 @@ class GAToGCSOperator(BaseOperator):
     :param metrics: A list of the Metrics, for detail, see also https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
     :param start_ds: Start Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
     :param end_ds: End Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
-    :param kwargs:
+    :param page_size: Number of rows per request. Every page of the report is fetched and written
+        to the output as it arrives, so memory is bounded by the page size. None fetches the whole
+        report into memory before writing it.
+    :param table_schema: Table properties from the schema definition file. Column types are
+        used to cast metrics the API returns without a type.
+    :param shard_by: If set to day, week or month, split the date range into windows of that period,
+        fetched in parallel and written to one GCS object per window, suffixed with ``_<start>_<end>``.
+        Both dates must then be YYYY-MM-DD, yesterday, today or NdaysAgo.
+    :param max_workers: Number of shards fetched at the same time.
+    :param skip_existing_shards: Skip shards whose object already exists, so a retried task
+        only fetches the shards that failed.
+    :param output_format: csv, or parquet for typed columns loaded by column name.
+    :param compression: Parquet compression codec, snappy (default), zstd or gzip.
+        CSV output is uncompressed by default, or compressed with gzip or zstd.
+    :param stream_upload: Stream each page to a resumable GCS upload as it arrives, instead of
+        writing the whole report to a temporary file first. Memory is then bounded by the page size
+        and the upload chunk size, and no local disk is used.
+    :param upload_chunk_size: Bytes sent per request of a streamed upload, a multiple of 256 KiB.
+    :param max_rows_per_file: If set, split the output into numbered parts of at most this many rows,
+        suffixed with ``_part<n>``, so the warehouse can load them in parallel. Parts are uploaded by
+        max_workers threads while the next part is written, and listed in a ``_manifest.json`` object
+        uploaded once every part succeeded.
+    :param max_bytes_per_file: If set, also start a new part once about this many bytes were written.
+        The size is checked every few thousand rows, so parts can be slightly larger.
+    :param watermark_store: If set, only extract the dates after the last date extracted for the
+        property and table, start_ds being the first date ever extracted and end_ds the last date due.
+        The task is skipped when nothing new is due. Needs page_size or shard_by, as the first run
+        extracts every date since start_ds.
+    :param advance_watermark: Move the watermark to end_ds once uploaded. Set it to False when the
+        files are loaded by a later task, and move the watermark from a task after the load, with the
+        ``end_ds`` returned in the XCom of this task, so a failed load extracts its dates again.
+    :param watermark_table: Table name of the watermark, the task ID by default.
+    :param lookback_days: Number of already extracted days to extract again, for GA data still settling.
+    :param report_cache: If set, report responses are served from and stored to this cache,
+        so retries and overlapping backfills do not spend quota on the same requests again.
+    :param compute_hash_diff: Append a ``hash_diff`` column computed from the ``hash_diff`` property
+        of table_schema, so the MERGE joins on the loaded column instead of hashing the staging table.
+    :param deferrable: Hand the fetch and upload to GAToGCSTrigger, so the task frees its worker slot
+        while it waits on the network and only resumes to report the result. Every page of page_size
+        rows is then uploaded as a part listed in a manifest, see max_rows_per_file. Only CSV output
+        without shard_by, report_cache or stream_upload is supported, and gcloud-aio-storage is required.
+    :param validate_report: Check the dimensions and metrics against the property metadata, and their
+        compatibility with the API, before requesting the report. An invalid report fails the task
+        without retries.
+    :param metadata_cache: Cache of the property metadata, shared by the process by default, see metadata_cache.
+    :param kwargs: Also ``table_params``, merged over ``params`` when the task runs, see TableParamsMixin.
 
+    The API calls, DataFrame building, serialization and uploads are timed, and pages, rows, bytes,
+    files and quota tokens counted, through Airflow's stats under ``google_analytics.extract``
+    tagged with property_id, table and task_id. Their summary is returned as the XCom of the task,
+    with the ``end_ds`` of the dates extracted.
     """
 
     template_fields: Iterable[str] = (
@@ -53,6 +166,8 @@ class GAToGCSOperator(BaseOperator):
         "start_ds",
         "end_ds",
         "gcs_dest_path",
+        "table_schema",
+        "watermark_table",
     )
 
     def __init__(
@@ -66,9 +181,74 @@ class GAToGCSOperator(BaseOperator):
         metrics=[],
         start_ds="1970-01-01",
         end_ds="yesterday",
+        page_size: Optional[int] = DEFAULT_PAGE_SIZE,
+        table_schema: Optional[Dict] = None,
+        shard_by: Optional[str] = None,
+        max_workers: int = 4,
+        skip_existing_shards: bool = True,
+        output_format: str = "csv",
+        compression: Optional[str] = None,
+        stream_upload: bool = False,
+        upload_chunk_size: int = DEFAULT_UPLOAD_CHUNK_SIZE,
+        max_rows_per_file: Optional[int] = None,
+        max_bytes_per_file: Optional[int] = None,
+        watermark_store: Optional[WatermarkStore] = None,
+        watermark_table: Optional[str] = None,
+        advance_watermark: bool = True,
+        lookback_days: int = 0,
+        report_cache: Optional[ReportCache] = None,
+        compute_hash_diff: bool = False,
+        deferrable: bool = False,
+        validate_report: bool = False,
+        metadata_cache: Optional[MetadataCache] = None,
         **kwargs
     ) -> None:
         super().__init__(**kwargs)
+        if shard_by is not None and shard_by not in SHARD_PERIODS:
+            raise ValueError(f"shard_by must be one of {SHARD_PERIODS}, got {shard_by}")
+        if output_format not in OUTPUT_COMPRESSIONS:
+            raise ValueError(
+                f"output_format must be one of {tuple(OUTPUT_COMPRESSIONS)}, got {output_format}"
+            )
+        if compression not in OUTPUT_COMPRESSIONS[output_format]:
+            raise ValueError(
+                f"compression of {output_format} must be one of "
+                f"{OUTPUT_COMPRESSIONS[output_format]}, got {compression}"
+            )
+        if output_format == "parquet" and pa is None:
+            raise ValueError("pyarrow is required to write parquet output")
+        if output_format == "csv" and compression == "zstd" and zstandard is None:
+            raise ValueError(
+                "zstandard is required to write zstd compressed csv output"
+            )
+        for name, value in (
+            ("max_rows_per_file", max_rows_per_file),
+            ("max_bytes_per_file", max_bytes_per_file),
+        ):
+            if value is not None and value < 1:
+                raise ValueError(f"{name} must be at least 1, got {value}")
+        if watermark_store is not None and not (page_size or shard_by):
+            raise ValueError(
+                "watermark_store needs page_size or shard_by, "
+                "the first run extracts every date since start_ds"
+            )
+        if deferrable:
+            if gcs_aio is None:
+                raise ValueError(
+                    "gcloud-aio-storage is required to defer the extraction"
+                )
+            if output_format != "csv" or shard_by is not None:
+                raise ValueError("deferrable only supports csv output without shard_by")
+            if report_cache is not None or stream_upload:
+                raise ValueError(
+                    "deferrable does not support report_cache or stream_upload, "
+                    "pages are fetched by the triggerer and uploaded from memory"
+                )
+            if max_rows_per_file or max_bytes_per_file:
+                raise ValueError(
+                    "deferrable output is split by page, set page_size instead of "
+                    "max_rows_per_file and max_bytes_per_file"
+                )
         self.start_ds = start_ds
         self.end_ds = end_ds
         self.property_id = property_id
@@ -78,6 +258,28 @@ class GAToGCSOperator(BaseOperator):
         self.gcs_conn_id = gcs_conn_id
         self.gcs_bucket_name = gcs_bucket_name
         self.ga_conn_id = ga_conn_id
+        self.page_size = page_size
+        self.table_schema = table_schema
+        self._table_schemas: Dict[int, Tuple[Dict, TableSchema]] = {}
+        self.shard_by = shard_by
+        self.max_workers = max_workers
+        self.skip_existing_shards = skip_existing_shards
+        self.output_format = output_format
+        self.compression = compression
+        self.stream_upload = stream_upload
+        self.upload_chunk_size = upload_chunk_size
+        self.max_rows_per_file = max_rows_per_file
+        self.max_bytes_per_file = max_bytes_per_file
+        self.watermark_store = watermark_store
+        self.watermark_table = watermark_table or self.task_id
+        self.advance_watermark = advance_watermark
+        self.lookback_days = lookback_days
+        self.report_cache = report_cache
+        self.compute_hash_diff = compute_hash_diff
+        self.deferrable = deferrable
+        self.validate_report = validate_report
+        self.metadata_cache = metadata_cache
+        self.stage_metrics: Optional[StageMetrics] = None
         self.logger = logging.getLogger("airflow.task")
 
     def _upload_to_gcs(
@@ -92,6 +294,20 @@ class GAToGCSOperator(BaseOperator):
         end_ds,
     ):
         self.logger.info(property_id)
+        if self.page_size:
+            dfs = ga_data_hook.iter_report_df(
+                property_id,
+                dimensions,
+                metrics,
+                start_ds,
+                end_ds,
+                self.page_size,
+                **self._get_report_kwargs(),
+            )
+            self._upload_dfs_to_gcs(
+                gcs_hook=gcs_hook, dfs=dfs, gcs_dest_path=gcs_dest_path
+            )
+            return
         df = self._get_report_df(
             ga_data_hook=ga_data_hook,
             property_id=property_id,
@@ -100,37 +316,840 @@ class GAToGCSOperator(BaseOperator):
             start_ds=start_ds,
             end_ds=end_ds,
         )
-        self._upload_df_to_gcs_as_csv(
-            gcs_hook=gcs_hook, df=df, gcs_dest_path=gcs_dest_path
+        self._upload_df_to_gcs(gcs_hook=gcs_hook, df=df, gcs_dest_path=gcs_dest_path)
+
+    def _upload_shards_to_gcs(
+        self,
+        gcs_hook,
+        ga_data_hook,
+        property_id,
+        gcs_dest_path,
+        dimensions,
+        metrics,
+        start_ds,
+        end_ds,
+    ):
+        """
+        Fetch and upload every shard of the date range, with at most max_workers at a time.
+        """
+        shards = split_date_range(start_ds, end_ds, self.shard_by)
+        self.logger.info(
+            "Splitting %s to %s into %s %s shards",
+            start_ds,
+            end_ds,
+            len(shards),
+            self.shard_by,
+        )
+
+        def upload_shard(shard):
+            shard_start, shard_end = shard
+            shard_dest_path = self._get_dest_path_with_suffix(
+                gcs_dest_path,
+                f"{shard_start.strftime('%Y%m%d')}_{shard_end.strftime('%Y%m%d')}",
+            )
+            if self.skip_existing_shards and gcs_hook.exists(
+                self.gcs_bucket_name, self._get_output_marker_path(shard_dest_path)
+            ):
+                self.logger.info("Skipping existing shard %s", shard_dest_path)
+                return
+            self._upload_to_gcs(
+                gcs_hook=gcs_hook,
+                ga_data_hook=ga_data_hook,
+                property_id=property_id,
+                gcs_dest_path=shard_dest_path,
+                dimensions=dimensions,
+                metrics=metrics,
+                start_ds=shard_start.isoformat(),
+                end_ds=shard_end.isoformat(),
+            )
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {shard: executor.submit(upload_shard, shard) for shard in shards}
+        failed = []
+        for (shard_start, shard_end), future in futures.items():
+            error = future.exception()
+            if error:
+                self.logger.error(
+                    "Shard %s to %s failed: %s", shard_start, shard_end, error
+                )
+                failed.append(f"{shard_start}..{shard_end}")
+        if failed:
+            raise AirflowException(
+                f"{len(failed)} of {len(shards)} shards failed: {', '.join(failed)}"
+            )
+
+    def _get_dest_path_with_suffix(self, gcs_dest_path, suffix):
+        """
+        Insert ``_<suffix>`` between the object name and its extensions,
+        e.g. table_20220101T000000.csv becomes table_20220101T000000_<suffix>.csv.
+        """
+        dirname, basename = posixpath.split(gcs_dest_path)
+        stem, dot, extension = basename.partition(".")
+        return posixpath.join(dirname, f"{stem}_{suffix}{dot}{extension}")
+
+    def _get_manifest_path(self, gcs_dest_path):
+        """
+        Path of the manifest listing the parts of a split output,
+        e.g. table_20220101T000000.csv has table_20220101T000000_manifest.json.
+        """
+        dirname, basename = posixpath.split(gcs_dest_path)
+        stem = basename.partition(".")[0]
+        return posixpath.join(dirname, f"{stem}_manifest.json")
+
+    def _get_output_marker_path(self, gcs_dest_path):
+        """
+        Object whose existence means the output of ``gcs_dest_path`` is complete.
+        """
+        if self._is_split_output():
+            return self._get_manifest_path(gcs_dest_path)
+        return gcs_dest_path
+
+    def _is_split_output(self):
+        return bool(
+            self.max_rows_per_file or self.max_bytes_per_file or self.deferrable
         )
 
     def _get_report_df(
         self, ga_data_hook, property_id, dimensions, metrics, start_ds, end_ds
     ):
         df = ga_data_hook.get_report_df(
-            property_id, dimensions, metrics, start_ds, end_ds
+            property_id,
+            dimensions,
+            metrics,
+            start_ds,
+            end_ds,
+            **self._get_report_kwargs(),
         )
         return df
 
+    def _get_report_kwargs(self):
+        """
+        Extra report arguments derived from the table schema, if one was given.
+        """
+        if not self.table_schema:
+            return {}
+        return {"schema_types": self._get_schema_types(self.table_schema)}
+
+    def _get_table_schema(self, table_schema) -> TableSchema:
+        """
+        Parse table properties once per task, every page then shares the parsed schema.
+        The properties are kept with it, so their id is not reused while cached.
+        """
+        parsed = self._table_schemas.get(id(table_schema))
+        if parsed is None or parsed[0] is not table_schema:
+            parsed = (table_schema, get_table_schema(table_schema))
+            self._table_schemas[id(table_schema)] = parsed
+        return parsed[1]
+
+    def _get_schema_types(self, table_schema):
+        """
+        Map source column names to their schema types.
+        """
+        return self._get_table_schema(table_schema).schema_types
+
+    def _has_hash_diff(self, table_schema) -> bool:
+        """
+        Whether compute_hash_diff is set and the table has hash_diff columns.
+        """
+        return bool(
+            self.compute_hash_diff
+            and table_schema
+            and self._get_table_schema(table_schema).hash_columns
+        )
+
+    def _add_hash_diff(self, df, table_schema):
+        """
+        Append the hash_diff column when compute_hash_diff is set and the table has one.
+        """
+        if not self._has_hash_diff(table_schema):
+            return df
+        return df.assign(
+            hash_diff=get_hash_diff(df, self._get_table_schema(table_schema))
+        )
+
+    def _upload_df_to_gcs(self, gcs_hook, df, gcs_dest_path):
+        """
+        Upload a DataFrame in the configured output format.
+        """
+        if (
+            self.stream_upload
+            or self.output_format == "parquet"
+            or self._is_split_output()
+        ):
+            self._upload_dfs_to_gcs(gcs_hook, [df], gcs_dest_path)
+        else:
+            self._upload_df_to_gcs_as_csv(
+                gcs_hook, self._add_hash_diff(df, self.table_schema), gcs_dest_path
+            )
+
+    def _upload_dfs_to_gcs(self, gcs_hook, dfs, gcs_dest_path):
+        """
+        Upload page-sized DataFrames as a single object in the configured output format.
+        """
+        dfs = (self._add_hash_diff(df, self.table_schema) for df in dfs)
+        if self.stage_metrics is not None:
+            # Pages are fetched as they are written, keep their time out of serialize.
+            dfs = self.stage_metrics.timed_iter("read_pages", dfs)
+        if self._is_split_output():
+            self._upload_parts_to_gcs(gcs_hook, dfs, gcs_dest_path)
+        elif self.stream_upload:
+            self._stream_dfs_to_gcs(gcs_hook, dfs, gcs_dest_path)
+        elif self.output_format == "parquet":
+            self._upload_dfs_to_gcs_as_parquet(gcs_hook, dfs, gcs_dest_path)
+        else:
+            self._upload_dfs_to_gcs_as_csv(gcs_hook, dfs, gcs_dest_path)
+
+    def _get_arrow_table(self, df):
+        """
+        Convert a DataFrame to a pyarrow Table, typing date columns as date32.
+        Date columns are ``date`` and any column the table schema declares as date.
+        """
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        date_columns = {"date"}
+        if self.table_schema:
+            date_columns.update(
+                source.lower()
+                for source, schema_type in self._get_schema_types(
+                    self.table_schema
+                ).items()
+                if (schema_type or "").lower() == "date"
+            )
+        for i, name in enumerate(table.column_names):
+            field_type = table.schema.field(i).type
+            if name.lower() in date_columns and (
+                pa.types.is_string(field_type) or pa.types.is_large_string(field_type)
+            ):
+                table = table.set_column(i, name, table.column(i).cast(pa.date32()))
+        return table
+
+    def _write_dfs_as_parquet(self, fileobj, dfs):
+        """
+        Write page-sized DataFrames as row groups of a single Parquet file.
+        """
+        writer = None
+        try:
+            for df in dfs:
+                table = self._get_arrow_table(df)
+                if writer is None:
+                    writer = pq.ParquetWriter(
+                        fileobj,
+                        table.schema,
+                        compression=self.compression or "snappy",
+                    )
+                writer.write_table(table.cast(writer.schema))
+        finally:
+            if writer is not None:
+                writer.close()
+
+    @contextmanager
+    def _open_compressed(self, fileobj):
+        """
+        Wrap a binary file object with the configured CSV compression.
+        Closing the wrapper writes the compression trailer but leaves ``fileobj`` open.
+        """
+        if self.compression == "gzip":
+            with gzip.GzipFile(fileobj=fileobj, mode="wb") as compressed:
+                yield compressed
+        elif self.compression == "zstd":
+            with zstandard.ZstdCompressor().stream_writer(
+                fileobj, closefd=False
+            ) as compressed:
+                yield compressed
+        else:
+            yield fileobj
+
+    def _write_dfs_as_csv(self, fileobj, dfs):
+        """
+        Append page-sized DataFrames to a single CSV, writing the header once.
+        """
+        with self._open_compressed(fileobj) as compressed:
+            text = io.TextIOWrapper(
+                compressed, encoding="utf-8", newline="", write_through=True
+            )
+            header = True
+            for df in dfs:
+                df.to_csv(text, index=False, header=header)
+                header = False
+            text.flush()
+            text.detach()
+
+    def _write_dfs(self, fileobj, dfs):
+        """
+        Write page-sized DataFrames in the configured output format, timed as serialize.
+        """
+        if self.output_format == "parquet":
+            self._serialize(self._write_dfs_as_parquet, fileobj, dfs)
+        else:
+            self._serialize(self._write_dfs_as_csv, fileobj, dfs)
+
+    def _serialize(self, write, fileobj, dfs):
+        with timer(self.stage_metrics, "serialize", exclude="read_pages"):
+            write(fileobj, dfs)
+
+    def _upload_dfs_to_gcs_as_parquet(self, gcs_hook, dfs, gcs_dest_path):
+        self._upload_dfs_to_gcs_as_file(
+            gcs_hook, self._write_dfs_as_parquet, dfs, gcs_dest_path
+        )
+
     def _upload_df_to_gcs_as_csv(self, gcs_hook, df, gcs_dest_path):
+        self._upload_dfs_to_gcs_as_csv(gcs_hook, [df], gcs_dest_path)
+
+    def _upload_dfs_to_gcs_as_csv(self, gcs_hook, dfs, gcs_dest_path):
+        self._upload_dfs_to_gcs_as_file(
+            gcs_hook, self._write_dfs_as_csv, dfs, gcs_dest_path
+        )
+
+    def _upload_dfs_to_gcs_as_file(self, gcs_hook, write, dfs, gcs_dest_path):
+        """
+        Write page-sized DataFrames to a temporary file with ``write``, then upload it.
+        """
         with tempfile.NamedTemporaryFile() as in_mem_file:
-            df.to_csv(in_mem_file, index=False)
+            self._serialize(write, in_mem_file, dfs)
+            in_mem_file.flush()
+            self._upload_file(gcs_hook, in_mem_file, gcs_dest_path)
+
+    def _upload_file(self, gcs_hook, fileobj, gcs_dest_path):
+        """
+        Upload a written temporary file, counting its bytes.
+        """
+        with timer(self.stage_metrics, "upload"):
             gcs_hook.upload(
                 bucket_name=self.gcs_bucket_name,
                 object_name=gcs_dest_path,
-                filename=in_mem_file.name,
+                filename=fileobj.name,
             )
+        incr(self.stage_metrics, "files")
+        incr(self.stage_metrics, "bytes", fileobj.tell())
 
-    def execute(self, context: Dict) -> None:
-        gcs_hook = GCSHook(gcp_conn_id=self.gcs_conn_id)
-        ga_data_hook = GoogleAnalyticsDataHook(gcp_conn_id=self.ga_conn_id)
-        self._upload_to_gcs(
-            gcs_hook=gcs_hook,
-            ga_data_hook=ga_data_hook,
+    def _stream_dfs_to_gcs(self, gcs_hook, dfs, gcs_dest_path):
+        """
+        Write page-sized DataFrames straight into a resumable upload.
+        Only the current page and one upload chunk are held in memory, and nothing is
+        written to local disk. The object is only created once the last chunk is sent.
+        Chunks are sent while writing, so their upload is timed as serialize.
+        """
+        with self._open_blob_writer(gcs_hook, gcs_dest_path) as writer:
+            self._write_dfs(writer, dfs)
+            size = writer.tell()
+        incr(self.stage_metrics, "files")
+        incr(self.stage_metrics, "bytes", size)
+
+    def _open_blob_writer(self, gcs_hook, gcs_dest_path):
+        blob = gcs_hook.get_conn().bucket(self.gcs_bucket_name).blob(gcs_dest_path)
+        return blob.open(
+            "wb",
+            chunk_size=self.upload_chunk_size,
+            ignore_flush=True,
+            content_type=self._get_content_type(),
+        )
+
+    def _iter_part_slices(self, dfs):
+        """
+        Cut page-sized DataFrames into slices of at most PART_SLICE_ROWS rows when
+        max_bytes_per_file is set, so the part size is checked often enough.
+        """
+        for df in dfs:
+            if not self.max_bytes_per_file or len(df) <= PART_SLICE_ROWS:
+                yield df
+                continue
+            for start in range(0, len(df), PART_SLICE_ROWS):
+                yield df.iloc[start : start + PART_SLICE_ROWS]
+
+    def _upload_parts_to_gcs(self, gcs_hook, dfs, gcs_dest_path):
+        """
+        Write page-sized DataFrames to numbered parts, each uploaded by the thread pool
+        while the next one is written, then upload the manifest of the parts.
+        At most max_workers parts wait on local disk at any time. With stream_upload,
+        parts are streamed straight to GCS one after another instead.
+        :return: The manifest
+        """
+        slices = self._iter_part_slices(dfs)
+        pending = [next(slices, None)]
+
+        def take_part(fileobj, stats):
+            # Yield slices until the part is full, pushing back what is left of a
+            # slice that crosses max_rows_per_file.
+            while pending[0] is not None:
+                df = pending[0]
+                room = (self.max_rows_per_file or 0) - stats["rows"]
+                if self.max_rows_per_file and len(df) > room:
+                    pending[0] = df.iloc[room:]
+                    df = df.iloc[:room]
+                else:
+                    pending[0] = next(slices, None)
+                stats["rows"] += len(df)
+                yield df
+                if stats["rows"] == self.max_rows_per_file or (
+                    self.max_bytes_per_file
+                    and fileobj.tell() >= self.max_bytes_per_file
+                ):
+                    return
+
+        parts = []
+        uploads = {}
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            while not parts or pending[0] is not None:
+                part_path = self._get_dest_path_with_suffix(
+                    gcs_dest_path, f"part{len(parts) + 1:05d}"
+                )
+                stats = {"path": part_path, "rows": 0}
+                if self.stream_upload:
+                    with self._open_blob_writer(gcs_hook, part_path) as writer:
+                        self._write_dfs(writer, take_part(writer, stats))
+                        stats["bytes"] = writer.tell()
+                    parts.append(stats)
+                    incr(self.stage_metrics, "files")
+                    incr(self.stage_metrics, "bytes", stats["bytes"])
+                    continue
+                in_progress = [future for future in uploads if not future.done()]
+                if len(in_progress) >= self.max_workers:
+                    wait(in_progress, return_when=FIRST_COMPLETED)
+                part_file = tempfile.NamedTemporaryFile()
+                try:
+                    self._write_dfs(part_file, take_part(part_file, stats))
+                    part_file.flush()
+                    stats["bytes"] = part_file.tell()
+                except BaseException:
+                    part_file.close()
+                    raise
+                parts.append(stats)
+                uploads[
+                    executor.submit(self._upload_part, gcs_hook, part_file, part_path)
+                ] = part_path
+        failed = []
+        for future, path in uploads.items():
+            error = future.exception()
+            if error:
+                self.logger.error("Upload of %s failed: %s", path, error)
+                failed.append(path)
+        if failed:
+            raise AirflowException(
+                f"{len(failed)} of {len(parts)} parts failed: {', '.join(failed)}"
+            )
+        manifest = {
+            "format": self.output_format,
+            "compression": self.compression,
+            "rows": sum(part["rows"] for part in parts),
+            "files": parts,
+        }
+        gcs_hook.upload(
+            bucket_name=self.gcs_bucket_name,
+            object_name=self._get_manifest_path(gcs_dest_path),
+            data=json.dumps(manifest, indent=2),
+            mime_type="application/json",
+        )
+        self.logger.info(
+            "Uploaded %s rows in %s parts to %s",
+            manifest["rows"],
+            len(parts),
+            gcs_dest_path,
+        )
+        return manifest
+
+    def _upload_part(self, gcs_hook, part_file, part_path):
+        """
+        Upload a written part, deleting its temporary file.
+        """
+        with part_file:
+            self._upload_file(gcs_hook, part_file, part_path)
+
+    def _reject_unsupported(self, *names):
+        """
+        Reject the options a subclass does not implement, instead of silently ignoring them.
+        """
+        unsupported = [name for name in names if getattr(self, name)]
+        if unsupported:
+            raise ValueError(
+                f"{type(self).__name__} does not support {', '.join(unsupported)}"
+            )
+
+    def _get_content_type(self):
+        if self.output_format == "parquet":
+            return "application/octet-stream"
+        return CSV_CONTENT_TYPES[self.compression]
+
+    def _get_incremental_range(self):
+        """
+        Dates still due according to the watermark store, or None when nothing new is due.
+        """
+        watermark = self.watermark_store.get(self.property_id, self.watermark_table)
+        date_range = get_incremental_range(
+            watermark, self.start_ds, self.end_ds, self.lookback_days
+        )
+        self.logger.info(
+            "Watermark of %s for property %s is %s, due range is %s",
+            self.watermark_table,
+            self.property_id,
+            watermark,
+            date_range,
+        )
+        return date_range
+
+    def _get_gcs_hook(self):
+        """
+        GCSHook of gcs_conn_id from the client pool, so the tasks, shards and reports of a
+        process share one storage client like they share the Analytics Data client.
+        """
+        return default_client_pool.get(
+            (GCSHook, self.gcs_conn_id), lambda: GCSHook(gcp_conn_id=self.gcs_conn_id)
+        )
+
+    def _get_stage_metrics(self, property_id=None) -> StageMetrics:
+        """
+        Metrics of this run, tagged so dashboards can break them down by property and table.
+        """
+        return StageMetrics(
+            "extract",
+            tags={
+                "property_id": property_id,
+                "table": self.watermark_table,
+                "task_id": self.task_id,
+            },
+        )
+
+    def _get_ga_data_hook(self) -> GoogleAnalyticsDataHook:
+        return GoogleAnalyticsDataHook(
+            gcp_conn_id=self.ga_conn_id,
+            cache=self.report_cache,
+            stage_metrics=self.stage_metrics,
+            metadata_cache=self.metadata_cache,
+        )
+
+    def _validate_reports(self, ga_data_hook, property_id, reports):
+        """
+        Check the report definitions, dicts with ``dimensions`` and ``metrics``, against the
+        property metadata before any quota is spent on them, if validate_report is set.
+        Retrying cannot fix an invalid report, so it fails the task at once.
+        """
+        if not self.validate_report:
+            return
+        for report in reports:
+            try:
+                ga_data_hook.validate_report(
+                    property_id, report["dimensions"], report["metrics"]
+                )
+            except ValueError as error:
+                raise AirflowFailException(str(error)) from error
+
+    def _get_summary(self, end_ds=None) -> Dict:
+        summary = self.stage_metrics.summary()
+        if end_ds is not None:
+            summary["end_ds"] = end_ds
+        self.logger.info("Extraction metrics: %s", summary)
+        return summary
+
+    def execute(self, context: Dict) -> Dict:
+        start_ds, end_ds = self.start_ds, self.end_ds
+        if self.watermark_store:
+            date_range = self._get_incremental_range()
+            if date_range is None:
+                raise AirflowSkipException(
+                    f"{self.watermark_table} is up to date until {end_ds}"
+                )
+            start_ds, end_ds = (day.isoformat() for day in date_range)
+        self.stage_metrics = self._get_stage_metrics(self.property_id)
+        ga_data_hook = self._get_ga_data_hook()
+        self._validate_reports(
+            ga_data_hook,
+            self.property_id,
+            [{"dimensions": self.dimensions, "metrics": self.metrics}],
+        )
+        if self.deferrable:
+            self.defer(
+                trigger=self._get_trigger(start_ds, end_ds),
+                method_name="execute_complete",
+                kwargs={"end_ds": end_ds},
+            )
+        gcs_hook = self._get_gcs_hook()
+        upload = self._upload_shards_to_gcs if self.shard_by else self._upload_to_gcs
+        with self.stage_metrics.timer("execute"):
+            upload(
+                gcs_hook=gcs_hook,
+                ga_data_hook=ga_data_hook,
+                property_id=self.property_id,
+                gcs_dest_path=self.gcs_dest_path,
+                start_ds=start_ds,
+                end_ds=end_ds,
+                dimensions=self.dimensions,
+                metrics=self.metrics,
+            )
+        self._set_watermark(end_ds)
+        return self._get_summary(end_ds)
+
+    def _get_trigger(self, start_ds, end_ds):
+        return GAToGCSTrigger(
             property_id=self.property_id,
-            gcs_dest_path=self.gcs_dest_path,
-            start_ds=self.start_ds,
-            end_ds=self.end_ds,
             dimensions=self.dimensions,
             metrics=self.metrics,
+            start_ds=start_ds,
+            end_ds=end_ds,
+            gcs_bucket_name=self.gcs_bucket_name,
+            part_path_format=self._get_dest_path_with_suffix(
+                self.gcs_dest_path, "part{part:05d}"
+            ),
+            manifest_path=self._get_manifest_path(self.gcs_dest_path),
+            ga_conn_id=self.ga_conn_id,
+            gcs_conn_id=self.gcs_conn_id,
+            page_size=self.page_size or DEFAULT_PAGE_SIZE,
+            schema_types=self._get_report_kwargs().get("schema_types"),
+            table_schema=self.table_schema,
+            compute_hash_diff=self._has_hash_diff(self.table_schema),
+            compression=self.compression,
+            content_type=self._get_content_type(),
+            max_workers=self.max_workers,
+            metric_tags=self._get_stage_metrics(self.property_id).tags,
+        )
+
+    def execute_complete(self, context: Dict, event: Dict, end_ds=None) -> Dict:
+        """
+        Resume from GAToGCSTrigger once the report is uploaded.
+        The trigger already emitted its metrics, they are only added to the summary.
+        """
+        if event["status"] != "success":
+            raise AirflowException(f"Extraction failed: {event['message']}")
+        self.logger.info(
+            "Uploaded %s rows in %s parts, listed in %s",
+            event["rows"],
+            event["files"],
+            event["manifest_path"],
+        )
+        self._set_watermark(end_ds)
+        self.stage_metrics = self._get_stage_metrics(self.property_id)
+        self.stage_metrics.merge(event.get("metrics", {}))
+        return self._get_summary(end_ds)
+
+    def _set_watermark(self, end_ds):
+        """
+        Move the watermark to end_ds once its dates are uploaded, if advance_watermark is set.
+        """
+        if self.watermark_store and self.advance_watermark:
+            self.watermark_store.set(
+                self.property_id, self.watermark_table, resolve_ga_date(end_ds)
+            )
+
+
+class GAToGCSBatchOperator(GAToGCSOperator):
+    """
+    Get several Google analytics data reports of one property and save each report to its own GCS path.
+    Reports are fetched with BatchRunReports, up to five per API call, so one task and one client
+    serve every table of the property instead of one task per table.
+
+    :param property_id: ID of the given property.
+    :param gcs_bucket_name: Bucket Name of GCS.
+    :param reports: Mapping of report name to its definition, a dict with ``dimensions``, ``metrics``,
+        ``gcs_dest_path`` and optionally ``table_schema``.
+    :param coalesce_reports: Request a report whose dimensions are a subset of another report's
+        only once, and derive it locally by summing the finer report, see report_planner.
+        Reports with user metrics or ratios of them are always requested on their own.
+    :param additive_metrics: Metrics that may be summed when coalescing, report_planner.ADDITIVE_METRICS
+        by default. Add session metrics only when the dimensions do not change within a session.
+    :param kwargs: See GAToGCSOperator, ``page_size`` is the row limit of each report request.
+        deferrable, shard_by and watermark_store are not supported.
+    """
+
+    template_fields: Iterable[str] = (
+        "reports",
+        "start_ds",
+        "end_ds",
+    )
+
+    def __init__(
+        self,
+        property_id,
+        gcs_bucket_name,
+        reports: Dict,
+        coalesce_reports: bool = False,
+        additive_metrics: Optional[List[str]] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(
+            property_id=property_id, gcs_bucket_name=gcs_bucket_name, **kwargs
+        )
+        self._reject_unsupported("deferrable", "shard_by", "watermark_store")
+        self.reports = reports
+        self.coalesce_reports = coalesce_reports
+        self.additive_metrics = additive_metrics
+
+    def _get_report_plans(self, reports):
+        """
+        Requests to send for the reports, one per report unless coalesce_reports is set.
+        """
+        if not self.coalesce_reports:
+            return [
+                ReportPlan(report["dimensions"], report["metrics"], name)
+                for name, report in reports.items()
+            ]
+        plans = plan_reports(reports, self.additive_metrics)
+        self.logger.info(
+            "Coalesced %s reports into %s requests: %s", len(reports), len(plans), plans
+        )
+        return plans
+
+    def _upload_reports_to_gcs(
+        self, gcs_hook, ga_data_hook, property_id, reports, start_ds, end_ds
+    ):
+        self.logger.info(property_id)
+        plans = self._get_report_plans(reports)
+        definitions = []
+        for plan in plans:
+            schema_types = {}
+            for name in plan.reports:
+                schema_types.update(
+                    self._get_schema_types(reports[name].get("table_schema", {}))
+                )
+            definitions.append(
+                {
+                    "dimensions": plan.dimensions,
+                    "metrics": plan.metrics,
+                    "schema_types": schema_types,
+                }
+            )
+        # Coalesced reports are validated as requested, their fields combined.
+        self._validate_reports(ga_data_hook, property_id, definitions)
+        dfs = ga_data_hook.iter_batch_report_df(
+            property_id,
+            definitions,
+            start_ds,
+            end_ds,
+            page_size=self.page_size or DEFAULT_PAGE_SIZE,
+        )
+        for plan, plan_df in zip(plans, dfs):
+            for name in plan.reports:
+                report = reports[name]
+                df = derive_report(
+                    plan_df, plan, report["dimensions"], report["metrics"]
+                )
+                self.logger.info("Uploading %s rows of %s", len(df), name)
+                self._upload_df_to_gcs(
+                    gcs_hook=gcs_hook,
+                    df=self._add_hash_diff(df, report.get("table_schema")),
+                    gcs_dest_path=report["gcs_dest_path"],
+                )
+
+    def execute(self, context: Dict) -> Dict:
+        self.stage_metrics = self._get_stage_metrics(self.property_id)
+        gcs_hook = self._get_gcs_hook()
+        ga_data_hook = self._get_ga_data_hook()
+        with self.stage_metrics.timer("execute"):
+            self._upload_reports_to_gcs(
+                gcs_hook=gcs_hook,
+                ga_data_hook=ga_data_hook,
+                property_id=self.property_id,
+                reports=self.reports,
+                start_ds=self.start_ds,
+                end_ds=self.end_ds,
+            )
+        return self._get_summary()
+
+
+class GAToGCSMultiPropertyOperator(GAToGCSOperator):
+    """
+    Get the same Google analytics data report for many properties and save one report per property to GCS.
+    Reports are fetched concurrently with the asyncio Analytics Data client, and uploaded from worker threads,
+    so a single task covers every property.
+
+    :param property_ids: IDs of the given properties.
+    :param gcs_bucket_name: Bucket Name of GCS.
+    :param gcs_dest_path: Path to store each report to, ``{property_id}`` is replaced with the property ID.
+    :param max_concurrency: Maximum number of properties extracted at the same time.
+    :param kwargs: See GAToGCSOperator, deferrable, shard_by and watermark_store are not supported.
+    """
+
+    template_fields: Iterable[str] = (
+        "property_ids",
+        "dimensions",
+        "metrics",
+        "start_ds",
+        "end_ds",
+        "gcs_dest_path",
+    )
+
+    def __init__(
+        self,
+        property_ids: List[str],
+        gcs_bucket_name,
+        gcs_dest_path="{property_id}/out.csv",
+        max_concurrency: int = 10,
+        **kwargs
+    ) -> None:
+        super().__init__(
+            property_id=None,
+            gcs_bucket_name=gcs_bucket_name,
+            gcs_dest_path=gcs_dest_path,
+            **kwargs,
         )
+        if max_concurrency < 1:
+            raise ValueError("max_concurrency must be at least 1")
+        self._reject_unsupported("deferrable", "shard_by", "watermark_store")
+        self.property_ids = property_ids
+        self.max_concurrency = max_concurrency
+
+    async def _upload_property_to_gcs(
+        self, semaphore, gcs_hook, ga_data_hook, property_id
+    ):
+        async with semaphore:
+            self.logger.info(property_id)
+            df = await ga_data_hook.get_report_df_async(
+                property_id,
+                self.dimensions,
+                self.metrics,
+                self.start_ds,
+                self.end_ds,
+                page_size=self.page_size or DEFAULT_PAGE_SIZE,
+                **self._get_report_kwargs(),
+            )
+            await asyncio.to_thread(
+                self._upload_df_to_gcs,
+                gcs_hook=gcs_hook,
+                df=df,
+                gcs_dest_path=self.gcs_dest_path.format(property_id=property_id),
+            )
+
+    async def _upload_properties_to_gcs(self, gcs_hook, ga_data_hook, property_ids):
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+        results = await asyncio.gather(
+            *(
+                self._upload_property_to_gcs(
+                    semaphore, gcs_hook, ga_data_hook, property_id
+                )
+                for property_id in property_ids
+            ),
+            return_exceptions=True,
+        )
+        failed = {
+            property_id: result
+            for property_id, result in zip(property_ids, results)
+            if isinstance(result, BaseException)
+        }
+        for property_id, error in failed.items():
+            self.logger.error(
+                "Extraction of property %s failed: %s", property_id, error
+            )
+        if failed:
+            raise AirflowException(
+                f"Extraction failed for {len(failed)} of {len(property_ids)} properties: "
+                f"{', '.join(failed)}"
+            )
+
+    def execute(self, context: Dict) -> Dict:
+        # Every property shares the hook, so the metrics are only tagged by table.
+        self.stage_metrics = self._get_stage_metrics()
+        gcs_hook = self._get_gcs_hook()
+        ga_data_hook = self._get_ga_data_hook()
+        property_ids = [str(property_id) for property_id in self.property_ids]
+        # Custom dimensions and metrics differ between properties.
+        for property_id in property_ids:
+            self._validate_reports(
+                ga_data_hook,
+                property_id,
+                [{"dimensions": self.dimensions, "metrics": self.metrics}],
+            )
+        with self.stage_metrics.timer("execute"):
+            asyncio.run(
+                self._upload_properties_to_gcs(
+                    gcs_hook=gcs_hook,
+                    ga_data_hook=ga_data_hook,
+                    property_ids=property_ids,
+                )
+            )
+        return self._get_summary()
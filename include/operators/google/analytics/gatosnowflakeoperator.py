@@ -0,0 +1,300 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains the Google Analytics Data to Snowflake operator.
+"""
+import logging
+from typing import Dict, Iterable, Optional, Tuple
+
+from airflow.exceptions import AirflowSkipException
+from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+from include.hooks.google.analytics.analytics_data import (
+    DEFAULT_PAGE_SIZE,
+    GoogleAnalyticsDataHook,
+)
+from include.hooks.google.analytics.report_cache import ReportCache
+from include.libs.date_ranges.date_shards import resolve_ga_date
+from include.libs.date_ranges.watermarks import WatermarkStore, get_incremental_range
+from include.libs.metrics.stage_metrics import StageMetrics, incr, timer
+from include.libs.schema_reg.base_schema_transforms import get_hash_diff
+from include.libs.schema_reg.schema_registry import TableSchema, get_table_schema
+from include.operators.table_params import TableParamsMixin
+from snowflake.connector.pandas_tools import write_pandas
+
+
+class GAToSnowflakeOperator(TableParamsMixin):
+    """
+    Load a Google analytics data report straight into Snowflake, without going through GCS.
+
+    Every page of the report is uploaded with write_pandas, which PUTs compressed Parquet
+    chunks to an internal stage of the session and COPYs them into the staging table.
+    The staging table is created, loaded, merged and cleaned up on one connection, so the
+    whole load is a single task and a single Snowflake session.
+
+    The API calls, DataFrame building and every load step are timed, and pages, rows, chunks and
+    quota tokens counted, through Airflow's stats under ``google_analytics.direct_load`` tagged
+    with property_id, the ``table`` param and task_id. Their summary is returned as the XCom
+    of the task.
+
+    :param property_id: ID of the given property.
+    :param table_schema: Table properties from the schema definition file. Report columns are
+        renamed to the table columns and metric columns typed from it.
+    :param staging_table: Name of the staging table, in loading_db.loading_schema.
+    :param create_staging_sql: SQL, or .sql template, creating the staging table.
+    :param merge_sql: SQL, or .sql template, merging the staging table into the destination table.
+    :param cleanup_sql: SQL, or .sql template, dropping the staging table.
+    :param loading_db: Database of the staging table.
+    :param loading_schema: Schema of the staging table.
+    :param dimensions: A list of the Dimensions, for detail, see also https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
+    :param metrics: A list of the Metrics, for detail, see also https://ga-dev-tools.web.app/ga4/dimensions-metrics-explorer/
+    :param start_ds: Start Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+    :param end_ds: End Date of the data range with either YYYY-MM-DD, yesterday, today, or NdaysAgo where N is a positive integer
+    :param ga_conn_id: The connection ID to use when fetching Google Analytics Data API connection info.
+    :param snowflake_conn_id: The connection ID to use when connecting to Snowflake.
+    :param warehouse: Snowflake warehouse of the session.
+    :param role: Snowflake role of the session.
+    :param page_size: Number of rows fetched per request, each page is uploaded as it arrives.
+    :param chunk_rows: Number of rows of each Parquet chunk PUT to the stage, all rows of the page by default.
+    :param compression: Compression of the Parquet chunks, snappy or gzip.
+    :param compute_hash_diff: Add the hash_diff column before loading, see GAToGCSOperator.
+    :param report_cache: If set, report responses are served from and stored to this cache.
+    :param watermark_store: If set, only load the dates after the last date loaded for the
+        property and table, start_ds being the first date ever loaded and end_ds the last date due.
+        The task is skipped when nothing new is due, and the watermark moves to end_ds once merged.
+    :param watermark_table: Table name of the watermark, the task ID by default.
+    :param lookback_days: Number of already loaded days to load again, for GA data still settling.
+    :param kwargs: Also ``table_params``, merged over ``params`` when the task runs, see TableParamsMixin.
+    """
+
+    template_fields: Iterable[str] = (
+        "dimensions",
+        "metrics",
+        "table_schema",
+        "start_ds",
+        "end_ds",
+        "watermark_table",
+        "staging_table",
+        "create_staging_sql",
+        "merge_sql",
+        "cleanup_sql",
+    )
+    template_ext: Iterable[str] = (".sql",)
+
+    def __init__(
+        self,
+        property_id,
+        table_schema: Dict,
+        staging_table: str,
+        create_staging_sql: str,
+        merge_sql: str,
+        loading_db: str,
+        loading_schema: str,
+        cleanup_sql: Optional[str] = None,
+        dimensions=[],
+        metrics=[],
+        start_ds="1970-01-01",
+        end_ds="yesterday",
+        ga_conn_id: str = "google_analytic_data_default",
+        snowflake_conn_id: str = "snowflake_default",
+        warehouse: Optional[str] = None,
+        role: Optional[str] = None,
+        page_size: int = DEFAULT_PAGE_SIZE,
+        chunk_rows: Optional[int] = None,
+        compression: str = "snappy",
+        compute_hash_diff: bool = False,
+        report_cache: Optional[ReportCache] = None,
+        watermark_store: Optional[WatermarkStore] = None,
+        watermark_table: Optional[str] = None,
+        lookback_days: int = 0,
+        **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        if compression not in ("snappy", "gzip"):
+            raise ValueError(f"compression must be snappy or gzip, got {compression}")
+        self.property_id = property_id
+        self.table_schema = table_schema
+        self._table_schema: Optional[Tuple[Dict, TableSchema]] = None
+        self.staging_table = staging_table
+        self.create_staging_sql = create_staging_sql
+        self.merge_sql = merge_sql
+        self.cleanup_sql = cleanup_sql
+        self.loading_db = loading_db
+        self.loading_schema = loading_schema
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.start_ds = start_ds
+        self.end_ds = end_ds
+        self.ga_conn_id = ga_conn_id
+        self.snowflake_conn_id = snowflake_conn_id
+        self.warehouse = warehouse
+        self.role = role
+        self.page_size = page_size
+        self.chunk_rows = chunk_rows
+        self.compression = compression
+        self.compute_hash_diff = compute_hash_diff
+        self.report_cache = report_cache
+        self.watermark_store = watermark_store
+        self.watermark_table = watermark_table or self.task_id
+        self.lookback_days = lookback_days
+        self.stage_metrics: Optional[StageMetrics] = None
+        self.logger = logging.getLogger("airflow.task")
+
+    def _get_table_schema(self) -> TableSchema:
+        """
+        Parse table_schema once it is rendered, every page then shares the parsed schema.
+        """
+        if self._table_schema is None or self._table_schema[0] is not self.table_schema:
+            self._table_schema = (
+                self.table_schema,
+                get_table_schema(self.table_schema),
+            )
+        return self._table_schema[1]
+
+    def _get_column_mapping(self):
+        """
+        Map lower case source column names to table column names.
+        """
+        return {
+            col.source.lower(): col.name for col in self._get_table_schema().columns
+        }
+
+    def _to_staging_df(self, df):
+        """
+        Rename report columns to the staging table columns, adding hash_diff if computed.
+        """
+        table_schema = self._get_table_schema()
+        if self.compute_hash_diff and table_schema.hash_columns:
+            df = df.assign(hash_diff=get_hash_diff(df, table_schema))
+        mapping = self._get_column_mapping()
+        return df.rename(columns=lambda col: mapping.get(col.lower(), col))
+
+    def _run_sql(self, conn, sql, step=None):
+        """
+        Run every statement of ``sql`` on the session, timed as ``step`` if given.
+        """
+        with timer(self.stage_metrics if step else None, step):
+            for cursor in conn.execute_string(sql):
+                self.logger.info("Query %s: %s", cursor.sfqid, cursor.rowcount)
+
+    def _get_date_range(self):
+        """
+        Dates to load, only those still due according to the watermark store if one is set.
+        :return: start_ds and end_ds, or None when nothing new is due
+        """
+        if not self.watermark_store:
+            return self.start_ds, self.end_ds
+        watermark = self.watermark_store.get(self.property_id, self.watermark_table)
+        date_range = get_incremental_range(
+            watermark, self.start_ds, self.end_ds, self.lookback_days
+        )
+        self.logger.info(
+            "Watermark of %s for property %s is %s, due range is %s",
+            self.watermark_table,
+            self.property_id,
+            watermark,
+            date_range,
+        )
+        if date_range is None:
+            return None
+        return tuple(day.isoformat() for day in date_range)
+
+    def _load_pages(self, conn, ga_data_hook, start_ds, end_ds):
+        """
+        Fetch the report page by page and load each page into the staging table.
+        :return: Number of rows loaded
+        """
+        schema_types = self._get_table_schema().schema_types
+        rows = 0
+        for df in ga_data_hook.iter_report_df(
+            self.property_id,
+            self.dimensions,
+            self.metrics,
+            start_ds,
+            end_ds,
+            self.page_size,
+            schema_types=schema_types,
+        ):
+            if df.empty:
+                continue
+            with timer(self.stage_metrics, "write_pandas"):
+                success, chunks, loaded, _ = write_pandas(
+                    conn,
+                    self._to_staging_df(df),
+                    self.staging_table,
+                    database=self.loading_db,
+                    schema=self.loading_schema,
+                    chunk_size=self.chunk_rows,
+                    compression=self.compression,
+                    quote_identifiers=False,
+                )
+            if not success:
+                raise ValueError(f"Loading a page into {self.staging_table} failed")
+            self.logger.info(
+                "Loaded %s rows in %s chunks into %s",
+                loaded,
+                chunks,
+                self.staging_table,
+            )
+            incr(self.stage_metrics, "chunks", chunks)
+            incr(self.stage_metrics, "rows_loaded", loaded)
+            rows += loaded
+        return rows
+
+    def execute(self, context: Dict) -> Dict:
+        date_range = self._get_date_range()
+        if date_range is None:
+            raise AirflowSkipException(
+                f"{self.watermark_table} is up to date until {self.end_ds}"
+            )
+        start_ds, end_ds = date_range
+        self.stage_metrics = StageMetrics(
+            "direct_load",
+            tags={
+                "property_id": self.property_id,
+                "table": self.params.get("table"),
+                "task_id": self.task_id,
+            },
+        )
+        ga_data_hook = GoogleAnalyticsDataHook(
+            gcp_conn_id=self.ga_conn_id,
+            cache=self.report_cache,
+            stage_metrics=self.stage_metrics,
+        )
+        snowflake_hook = SnowflakeHook(
+            snowflake_conn_id=self.snowflake_conn_id,
+            warehouse=self.warehouse,
+            role=self.role,
+        )
+        with self.stage_metrics.timer("connect"):
+            conn = snowflake_hook.get_conn()
+        try:
+            self._run_sql(conn, self.create_staging_sql, "create_staging")
+            rows = self._load_pages(conn, ga_data_hook, start_ds, end_ds)
+            self._run_sql(conn, self.merge_sql, "merge")
+            if self.cleanup_sql:
+                self._run_sql(conn, self.cleanup_sql, "cleanup")
+        finally:
+            conn.close()
+        if self.watermark_store:
+            self.watermark_store.set(
+                self.property_id, self.watermark_table, resolve_ga_date(end_ds)
+            )
+        self.logger.info("Loaded %s rows into %s", rows, self.staging_table)
+        summary = self.stage_metrics.summary()
+        self.logger.info("Load metrics: %s", summary)
+        return summary
@@ -0,0 +1,145 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains the single-session Snowflake load operator.
+"""
+import logging
+from typing import Dict, Iterable, Optional
+
+from airflow.providers.snowflake.hooks.snowflake import SnowflakeHook
+from include.libs.metrics.stage_metrics import StageMetrics
+from include.operators.table_params import TableParamsMixin
+
+
+class SnowflakeStagingLoadOperator(TableParamsMixin):
+    """
+    Create a staging table, COPY staged files into it, MERGE it into the destination table
+    and clean it up, all on one Snowflake connection.
+
+    The COPY and the MERGE run in one explicit transaction, so the destination table never
+    sees a partial load and a failed load leaves nothing behind. DDL commits implicitly in
+    Snowflake, so the staging table is created before the transaction starts; create it
+    TEMPORARY and it also disappears with the session if the task dies.
+
+    Every step is timed, and the rows copied and merged counted, through Airflow's stats under
+    ``google_analytics.load`` tagged with the ``table`` param and task_id. Their summary is
+    returned as the XCom of the task.
+
+    :param create_staging_sql: SQL, or .sql template, creating the staging table.
+    :param copy_sql: SQL, or .sql template, loading the staged files into the staging table.
+    :param merge_sql: SQL, or .sql template, merging the staging table into the destination table.
+    :param cleanup_sql: SQL, or .sql template, dropping the staging table once merged.
+    :param snowflake_conn_id: The connection ID to use when connecting to Snowflake.
+    :param warehouse: Snowflake warehouse of the session.
+    :param database: Snowflake database of the session.
+    :param role: Snowflake role of the session, it needs the privileges of every statement.
+    :param schema: Snowflake schema of the session.
+    :param kwargs: Also ``table_params``, merged over ``params`` when the task runs, see TableParamsMixin.
+    """
+
+    template_fields: Iterable[str] = (
+        "create_staging_sql",
+        "copy_sql",
+        "merge_sql",
+        "cleanup_sql",
+    )
+    template_ext: Iterable[str] = (".sql",)
+
+    def __init__(
+        self,
+        create_staging_sql: str,
+        copy_sql: str,
+        merge_sql: str,
+        cleanup_sql: Optional[str] = None,
+        snowflake_conn_id: str = "snowflake_default",
+        warehouse: Optional[str] = None,
+        database: Optional[str] = None,
+        role: Optional[str] = None,
+        schema: Optional[str] = None,
+        **kwargs
+    ) -> None:
+        super().__init__(**kwargs)
+        self.create_staging_sql = create_staging_sql
+        self.copy_sql = copy_sql
+        self.merge_sql = merge_sql
+        self.cleanup_sql = cleanup_sql
+        self.snowflake_conn_id = snowflake_conn_id
+        self.warehouse = warehouse
+        self.database = database
+        self.role = role
+        self.schema = schema
+        self.logger = logging.getLogger("airflow.task")
+
+    def _run_sql(self, conn, sql):
+        """
+        Run every statement of ``sql`` on the session.
+        :return: Number of rows affected by the statements
+        """
+        rows = 0
+        for cursor in conn.execute_string(sql):
+            self.logger.info("Query %s: %s", cursor.sfqid, cursor.rowcount)
+            rows += cursor.rowcount or 0
+        return rows
+
+    def _run_step(self, stage_metrics, step, conn, sql):
+        """
+        Run ``sql`` timed as ``step``.
+        :return: Number of rows affected by the statements
+        """
+        with stage_metrics.timer(step):
+            return self._run_sql(conn, sql)
+
+    def execute(self, context: Dict) -> Dict:
+        stage_metrics = StageMetrics(
+            "load", tags={"table": self.params.get("table"), "task_id": self.task_id}
+        )
+        snowflake_hook = SnowflakeHook(
+            snowflake_conn_id=self.snowflake_conn_id,
+            warehouse=self.warehouse,
+            database=self.database,
+            role=self.role,
+            schema=self.schema,
+        )
+        with stage_metrics.timer("connect"):
+            conn = snowflake_hook.get_conn()
+        try:
+            self._run_step(
+                stage_metrics, "create_staging", conn, self.create_staging_sql
+            )
+            self._run_sql(conn, "BEGIN")
+            try:
+                stage_metrics.incr(
+                    "rows_copied",
+                    self._run_step(stage_metrics, "copy", conn, self.copy_sql),
+                )
+                stage_metrics.incr(
+                    "rows_merged",
+                    self._run_step(stage_metrics, "merge", conn, self.merge_sql),
+                )
+            except BaseException:
+                self.logger.error("Rolling back the load")
+                self._run_sql(conn, "ROLLBACK")
+                raise
+            self._run_step(stage_metrics, "commit", conn, "COMMIT")
+            if self.cleanup_sql:
+                self._run_step(stage_metrics, "cleanup", conn, self.cleanup_sql)
+        finally:
+            conn.close()
+        summary = stage_metrics.summary()
+        self.logger.info("Load metrics: %s", summary)
+        return summary
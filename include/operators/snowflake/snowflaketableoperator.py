@@ -0,0 +1,31 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains the Snowflake operator templated with the params of one table.
+"""
+from airflow.providers.snowflake.operators.snowflake import SnowflakeOperator
+from include.operators.table_params import TableParamsMixin
+
+
+class SnowflakeTableOperator(TableParamsMixin, SnowflakeOperator):
+    """
+    Run SQL in Snowflake with the params of one table merged over ``params``, so the same
+    templates run for every table of a task group expanded over tables.
+
+    :param kwargs: See SnowflakeOperator, and ``table_params`` of TableParamsMixin.
+    """
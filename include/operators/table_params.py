@@ -0,0 +1,59 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains the mixin of operators templated with the params of one table.
+"""
+from typing import Any, Dict, Optional
+
+from airflow.models import BaseOperator
+from airflow.models.xcom_arg import XComArg
+
+
+class TableParamsMixin(BaseOperator):
+    """
+    Add the params of one table to the template params of the operator when it runs.
+
+    ``params`` is fixed when the DAG is parsed, so it cannot take an argument of a task
+    group expanded over tables, nor an XCom. ``table_params`` can, and is resolved just
+    before the templates are rendered, then merged over ``params``. List it before the
+    operator class, e.g. ``class SnowflakeTableOperator(TableParamsMixin, SnowflakeOperator)``.
+
+    :param table_params: Params of the table, or an XCom or task group argument resolving to them.
+    :param kwargs:
+    """
+
+    def __init__(self, *, table_params: Optional[Any] = None, **kwargs) -> None:
+        super().__init__(**kwargs)
+        self.table_params = table_params
+        if isinstance(table_params, XComArg):
+            XComArg.apply_upstream_relationship(self, table_params)
+
+    def resolve_table_params(self, context: Dict) -> Dict:
+        """
+        Resolve table_params against the context of the running task.
+        """
+        table_params = self.table_params
+        if hasattr(table_params, "resolve"):
+            table_params = table_params.resolve(context)
+        return dict(table_params or {})
+
+    def render_template_fields(self, context: Dict, jinja_env=None) -> None:
+        table_params = self.resolve_table_params(context)
+        self.params.update(table_params)
+        context["params"].update(table_params)
+        super().render_template_fields(context, jinja_env)
@@ -0,0 +1,6 @@
+COPY INTO {{ params.loading_db }}.{{ params.loading_schema }}.{{ params.table }}_{{ ts_nodash }}
+    FROM @{{ params.stage_name }}/{{ params.table }}/{{execution_date.year}}/{{execution_date.month}}/{{execution_date.day}}/
+pattern = '.*(?i){{ params.table }}\_{{ts_nodash}}(\_[^/]+)?\.parquet'
+file_format = (type = parquet)
+match_by_column_name = case_insensitive
+on_error='abort_statement'
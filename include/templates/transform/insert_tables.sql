@@ -2,6 +2,7 @@
 MERGE INTO {{ params.transform_db }}.{{ params.transform_schema }}.{{ params.table }} as dest
 USING (   
     SELECT * 
+    {%- if not params.precomputed_hash_diff %}
     ,{{ table_schema.get('hash_diff').get('algorithm') }}(
         CONCAT(
         {% for col in table_schema.get('hash_diff').get('columns') -%}
@@ -11,6 +12,7 @@ USING (
                 COALESCE({{col}}, '{{default_val}}')
         {%- endfor %}
     )) as hash_diff
+    {%- endif %}
     FROM 
     {{ params.loading_db }}.{{ params.loading_schema }}.{{params.table}}_{{ ts_nodash }}
 ) as stg
@@ -1,7 +1,15 @@
 {% set table_schema = params.table_schema %}
+{% set date_column = params.merge_date_column|default(none, True) %}
+{%- if date_column %}
+SET (merge_min_date, merge_max_date) = (
+    SELECT MIN({{ date_column }}), MAX({{ date_column }})
+    FROM {{ params.loading_db }}.{{ params.loading_schema }}.{{params.table}}_{{ ts_nodash }}
+);
+{% endif -%}
 MERGE INTO {{ params.transform_db }}.{{ params.transform_schema }}.{{ params.table }} as dest
 USING (   
     SELECT * 
+    {%- if not params.precomputed_hash_diff %}
     ,{{ table_schema.get('hash_diff').get('algorithm') }}(
         CONCAT(
         {% for col in table_schema.get('hash_diff').get('columns') -%}
@@ -11,10 +19,17 @@ USING (
                 COALESCE({{col}}, '{{default_val}}')
         {%- endfor %}
     )) as hash_diff
+    {%- endif %}
     FROM 
     {{ params.loading_db }}.{{ params.loading_schema }}.{{params.table}}_{{ ts_nodash }}
 ) as stg
 ON dest.hash_diff = stg.hash_diff
+{%- if date_column %}
+AND (
+    dest.{{ date_column }} BETWEEN $merge_min_date AND $merge_max_date
+    OR dest.{{ date_column }} IS NULL
+)
+{%- endif %}
 WHEN MATCHED THEN
 UPDATE SET
     {% for name, col_dict in table_schema.items() %}
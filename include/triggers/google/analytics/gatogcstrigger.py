@@ -0,0 +1,279 @@
+#
+# Licensed to the Apache Software Foundation (ASF) under one
+# or more contributor license agreements.  See the NOTICE file
+# distributed with this work for additional information
+# regarding copyright ownership.  The ASF licenses this file
+# to you under the Apache License, Version 2.0 (the
+# "License"); you may not use this file except in compliance
+# with the License.  You may obtain a copy of the License at
+#
+#   http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing,
+# software distributed under the License is distributed on an
+# "AS IS" BASIS, WITHOUT WARRANTIES OR CONDITIONS OF ANY
+# KIND, either express or implied.  See the License for the
+# specific language governing permissions and limitations
+# under the License.
+"""
+This module contains the Google Analytics Data to GCS trigger.
+"""
+import asyncio
+import gzip
+import json
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+
+from airflow.exceptions import AirflowException
+from airflow.triggers.base import BaseTrigger, TriggerEvent
+from include.hooks.google.analytics.analytics_data import (
+    DEFAULT_PAGE_SIZE,
+    GoogleAnalyticsDataHook,
+)
+from include.hooks.google.cloud.gcs_aio import GCSAioHook
+from include.libs.metrics.stage_metrics import StageMetrics
+from include.libs.schema_reg.base_schema_transforms import get_hash_diff
+from include.libs.schema_reg.schema_registry import get_table_schema
+
+try:
+    from gcloud.aio.storage import Storage
+except ImportError:
+    Storage = None
+
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+
+
+class GAToGCSTrigger(BaseTrigger):
+    """
+    Fetch a Google analytics data report page by page with the asyncio client and upload
+    every page to GCS as a numbered CSV part, then upload the manifest of the parts,
+    all from the event loop of the triggerer.
+
+    Pages are decoded and encoded in a thread, so the loop keeps serving other triggers,
+    and up to max_workers parts are uploaded while the next page is fetched.
+
+    :param property_id: ID of the given property.
+    :param dimensions: A list of the Dimensions.
+    :param metrics: A list of the Metrics.
+    :param start_ds: Start Date of the data range.
+    :param end_ds: End Date of the data range.
+    :param gcs_bucket_name: Bucket Name of GCS.
+    :param part_path_format: Path of the parts, formatted with their 1-based ``part`` number.
+    :param manifest_path: Path of the manifest listing the parts.
+    :param ga_conn_id: The connection ID to use when fetching Google Analytics Data API connection info.
+    :param gcs_conn_id: The connection ID to use when fetching GCS connection info.
+    :param page_size: Number of rows of each request, and so of each part.
+    :param schema_types: Map of source column names to schema types, see GoogleAnalyticsDataHook.
+    :param table_schema: Table properties, used to compute hash_diff.
+    :param compute_hash_diff: Append the hash_diff column, see GAToGCSOperator.
+    :param compression: CSV compression, gzip or zstd, None for plain CSV.
+    :param content_type: Content type of the parts.
+    :param max_workers: Number of parts uploaded at the same time.
+    :param metric_tags: Tags of the metrics of the extraction, see stage_metrics. The summary of
+        the metrics is sent with the success event.
+    """
+
+    def __init__(
+        self,
+        property_id,
+        dimensions: List[str],
+        metrics: List[str],
+        start_ds: str,
+        end_ds: str,
+        gcs_bucket_name: str,
+        part_path_format: str,
+        manifest_path: str,
+        ga_conn_id: str = "google_analytic_data_default",
+        gcs_conn_id: str = "google_cloud_default",
+        page_size: int = DEFAULT_PAGE_SIZE,
+        schema_types: Optional[Dict[str, str]] = None,
+        table_schema: Optional[Dict] = None,
+        compute_hash_diff: bool = False,
+        compression: Optional[str] = None,
+        content_type: str = "text/csv",
+        max_workers: int = 4,
+        metric_tags: Optional[Dict[str, str]] = None,
+    ):
+        super().__init__()
+        self.property_id = property_id
+        self.dimensions = dimensions
+        self.metrics = metrics
+        self.start_ds = start_ds
+        self.end_ds = end_ds
+        self.gcs_bucket_name = gcs_bucket_name
+        self.part_path_format = part_path_format
+        self.manifest_path = manifest_path
+        self.ga_conn_id = ga_conn_id
+        self.gcs_conn_id = gcs_conn_id
+        self.page_size = page_size
+        self.schema_types = schema_types
+        self.table_schema = table_schema
+        self.compute_hash_diff = compute_hash_diff
+        # Parsed once, every page shares it.
+        self._table_schema = (
+            get_table_schema(table_schema)
+            if compute_hash_diff and table_schema
+            else None
+        )
+        self.compression = compression
+        self.content_type = content_type
+        self.max_workers = max_workers
+        self.metric_tags = metric_tags
+
+    def serialize(self) -> Tuple[str, Dict[str, Any]]:
+        return (
+            "include.triggers.google.analytics.gatogcstrigger.GAToGCSTrigger",
+            {
+                "property_id": self.property_id,
+                "dimensions": self.dimensions,
+                "metrics": self.metrics,
+                "start_ds": self.start_ds,
+                "end_ds": self.end_ds,
+                "gcs_bucket_name": self.gcs_bucket_name,
+                "part_path_format": self.part_path_format,
+                "manifest_path": self.manifest_path,
+                "ga_conn_id": self.ga_conn_id,
+                "gcs_conn_id": self.gcs_conn_id,
+                "page_size": self.page_size,
+                "schema_types": self.schema_types,
+                "table_schema": self.table_schema,
+                "compute_hash_diff": self.compute_hash_diff,
+                "compression": self.compression,
+                "content_type": self.content_type,
+                "max_workers": self.max_workers,
+                "metric_tags": self.metric_tags,
+            },
+        )
+
+    def _encode_page(self, ga_data_hook, response, stage_metrics):
+        """
+        Convert a report page to a CSV part.
+        :return: Number of rows and bytes of the part
+        """
+        df = ga_data_hook.get_response_df(response, self.schema_types)
+        if self.compute_hash_diff:
+            df = df.assign(hash_diff=get_hash_diff(df, self._table_schema))
+        with stage_metrics.timer("serialize"):
+            data = df.to_csv(index=False).encode("utf-8")
+            if self.compression == "gzip":
+                data = gzip.compress(data)
+            elif self.compression == "zstd":
+                data = zstandard.ZstdCompressor().compress(data)
+        return len(df), data
+
+    def _get_ga_data_hook(self, stage_metrics):
+        """
+        Create the GA hook and load its credentials, both blocking on connection lookups.
+        :return: The hook and its credentials
+        """
+        ga_data_hook = GoogleAnalyticsDataHook(
+            gcp_conn_id=self.ga_conn_id, stage_metrics=stage_metrics
+        )
+        return ga_data_hook, ga_data_hook.get_credentials()
+
+    def _get_service_file(self):
+        """
+        Service account file of the GCS connection, blocking on its lookup.
+        """
+        return GCSAioHook(gcp_conn_id=self.gcs_conn_id).get_service_file()
+
+    async def _upload_report(self, stage_metrics):
+        """
+        Upload every page of the report as a part, then the manifest.
+        :return: The manifest
+        """
+        # Hooks look their connection up when created, so they are created in a
+        # thread along with the credentials, the loop is shared by every trigger.
+        ga_data_hook, credentials = await asyncio.to_thread(
+            self._get_ga_data_hook, stage_metrics
+        )
+        ga_data_hook.get_async_conn(credentials)
+        service_file = await asyncio.to_thread(self._get_service_file)
+
+        slots = asyncio.Semaphore(self.max_workers)
+        parts = []
+        uploads = []
+        async with Storage(service_file=service_file) as storage:
+
+            async def upload_part(path, data):
+                try:
+                    with stage_metrics.timer("upload"):
+                        await storage.upload(
+                            self.gcs_bucket_name,
+                            path,
+                            data,
+                            content_type=self.content_type,
+                        )
+                    stage_metrics.incr("files")
+                    stage_metrics.incr("bytes", len(data))
+                finally:
+                    slots.release()
+
+            try:
+                async for response in ga_data_hook.iter_report_pages_async(
+                    self.property_id,
+                    self.dimensions,
+                    self.metrics,
+                    self.start_ds,
+                    self.end_ds,
+                    self.page_size,
+                ):
+                    rows, data = await asyncio.to_thread(
+                        self._encode_page, ga_data_hook, response, stage_metrics
+                    )
+                    path = self.part_path_format.format(part=len(parts) + 1)
+                    parts.append({"path": path, "rows": rows, "bytes": len(data)})
+                    await slots.acquire()
+                    uploads.append(asyncio.ensure_future(upload_part(path, data)))
+            except BaseException:
+                for upload in uploads:
+                    upload.cancel()
+                await asyncio.gather(*uploads, return_exceptions=True)
+                raise
+
+            results = await asyncio.gather(*uploads, return_exceptions=True)
+            failed = [
+                part["path"]
+                for part, result in zip(parts, results)
+                if isinstance(result, BaseException)
+            ]
+            if failed:
+                raise AirflowException(
+                    f"{len(failed)} of {len(parts)} parts failed: {', '.join(failed)}"
+                )
+            manifest = {
+                "format": "csv",
+                "compression": self.compression,
+                "rows": sum(part["rows"] for part in parts),
+                "files": parts,
+            }
+            await storage.upload(
+                self.gcs_bucket_name,
+                self.manifest_path,
+                json.dumps(manifest, indent=2),
+                content_type="application/json",
+            )
+        return manifest
+
+    async def run(self) -> AsyncIterator[TriggerEvent]:
+        stage_metrics = StageMetrics("extract", tags=self.metric_tags)
+        try:
+            with stage_metrics.timer("execute"):
+                manifest = await self._upload_report(stage_metrics)
+        except Exception as error:
+            self.log.exception("Extraction of property %s failed", self.property_id)
+            yield TriggerEvent(
+                {"status": "error", "message": f"{type(error).__name__}: {error}"}
+            )
+            return
+        yield TriggerEvent(
+            {
+                "status": "success",
+                "manifest_path": self.manifest_path,
+                "rows": manifest["rows"],
+                "files": len(manifest["files"]),
+                "metrics": stage_metrics.summary(),
+            }
+        )
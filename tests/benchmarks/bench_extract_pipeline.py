@@ -0,0 +1,210 @@
+"""
+Benchmark the extraction hot path, run_report -> get_report_df -> upload, fully offline.
+
+Reports come from FakeAnalyticsDataServer over a local gRPC channel and are
+uploaded by GAToGCSOperator to the in-memory FakeGCSHook. Every row count runs
+in a fresh process, so its peak RSS is its own. Per stage, the benchmark
+reports the total seconds and the per-page latency:
+
+    fetch   RunReport calls, including the fake server building each page
+    decode  RunReportResponse to DataFrame
+    upload  writing the output and uploading it, what is left of the total
+
+Results can be saved and later compared, failing when throughput or peak RSS
+regressed by more than the tolerance. Fetch times include the fake server, so
+only compare results of the same machine and harness.
+
+Run from the repository root:
+    python tests/benchmarks/bench_extract_pipeline.py --rows 10000 1000000 10000000
+    python tests/benchmarks/bench_extract_pipeline.py --save baseline.json
+    python tests/benchmarks/bench_extract_pipeline.py --compare baseline.json
+"""
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import argparse
+import json
+import multiprocessing
+import resource
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import mock
+
+from include.hooks.google.analytics.analytics_data import GoogleAnalyticsDataHook
+from include.operators.google.analytics.gatogcsoperator import GAToGCSOperator
+from tests.fakes.fake_analytics_data_server import FakeAnalyticsDataServer
+from tests.fakes.fake_gcs import FakeGCSHook
+
+PROPERTY_ID = "123456789"
+BUCKET = "bench"
+
+
+def percentile(values, fraction):
+    """
+    Nearest-rank percentile, 0 for no values.
+    """
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+def summarize(seconds):
+    return {
+        "seconds": sum(seconds),
+        "p50_ms": percentile(seconds, 0.5) * 1000,
+        "p95_ms": percentile(seconds, 0.95) * 1000,
+    }
+
+
+def run_case(rows, dimensions, metrics, page_size, output_format, compression, stream):
+    """
+    Extract one synthetic report of ``rows`` rows, in the calling process.
+    :return: Stage timings, throughput and peak RSS
+    """
+    dimension_names = ["date"] + [f"dimension{i}" for i in range(dimensions - 1)]
+    metric_names = [f"metric{i}" for i in range(metrics)]
+    fetch, decode = [], []
+    with FakeAnalyticsDataServer(row_count=rows) as server, mock.patch.object(
+        GoogleAnalyticsDataHook, "get_conn", return_value=server.sync_client()
+    ), mock.patch.object(GoogleAnalyticsDataHook, "get_connection"):
+        ga_data_hook = GoogleAnalyticsDataHook()
+        gcs_hook = FakeGCSHook(keep_data=False)
+        operator = GAToGCSOperator(
+            task_id="bench",
+            property_id=PROPERTY_ID,
+            gcs_bucket_name=BUCKET,
+            page_size=page_size,
+            output_format=output_format,
+            compression=compression,
+            stream_upload=stream,
+        )
+
+        def timed_dfs():
+            pages = ga_data_hook.iter_report_pages(
+                PROPERTY_ID,
+                dimension_names,
+                metric_names,
+                "2022-01-01",
+                "2022-12-31",
+                page_size,
+            )
+            while True:
+                start = time.perf_counter()
+                response = next(pages, None)
+                fetch.append(time.perf_counter() - start)
+                if response is None:
+                    return
+                start = time.perf_counter()
+                df = ga_data_hook.get_response_df(response)
+                decode.append(time.perf_counter() - start)
+                yield df
+
+        start = time.perf_counter()
+        operator._upload_dfs_to_gcs(gcs_hook, timed_dfs(), "bench/report")
+        total = time.perf_counter() - start
+    # ru_maxrss is in KiB on Linux.
+    peak_rss_mib = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+    return {
+        "rows": rows,
+        "pages": len(decode),
+        "seconds": total,
+        "rows_per_second": rows / total,
+        "peak_rss_mib": peak_rss_mib,
+        "output_mib": sum(gcs_hook.sizes.values()) / 2**20,
+        "fetch": summarize(fetch),
+        "decode": summarize(decode),
+        "upload": {"seconds": total - sum(fetch) - sum(decode)},
+    }
+
+
+def compare(results, baseline, tolerance):
+    """
+    :return: Regressions of throughput or peak RSS beyond the tolerance
+    """
+    baseline = {result["rows"]: result for result in baseline}
+    regressions = []
+    for result in results:
+        before = baseline.get(result["rows"])
+        if before is None:
+            continue
+        if result["rows_per_second"] < before["rows_per_second"] * (1 - tolerance):
+            regressions.append(
+                f"rows={result['rows']} throughput {result['rows_per_second']:.0f} "
+                f"< {before['rows_per_second']:.0f} rows/s"
+            )
+        if result["peak_rss_mib"] > before["peak_rss_mib"] * (1 + tolerance):
+            regressions.append(
+                f"rows={result['rows']} peak RSS {result['peak_rss_mib']:.0f} "
+                f"> {before['peak_rss_mib']:.0f} MiB"
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter
+    )
+    parser.add_argument(
+        "--rows", type=int, nargs="+", default=[10000, 1000000, 10000000]
+    )
+    parser.add_argument("--dimensions", type=int, default=5)
+    parser.add_argument("--metrics", type=int, default=6)
+    parser.add_argument("--page-size", type=int, default=100000)
+    parser.add_argument("--output-format", default="csv", choices=("csv", "parquet"))
+    parser.add_argument("--compression", default=None)
+    parser.add_argument("--stream-upload", action="store_true")
+    parser.add_argument("--save", help="Write the results to this JSON file")
+    parser.add_argument("--compare", help="Compare with the results of this JSON file")
+    parser.add_argument("--tolerance", type=float, default=0.2)
+    args = parser.parse_args()
+
+    results = []
+    for rows in args.rows:
+        # A fresh process per row count, so peak RSS is not carried over.
+        with ProcessPoolExecutor(
+            max_workers=1, mp_context=multiprocessing.get_context("spawn")
+        ) as executor:
+            result = executor.submit(
+                run_case,
+                rows,
+                args.dimensions,
+                args.metrics,
+                args.page_size,
+                args.output_format,
+                args.compression,
+                args.stream_upload,
+            ).result()
+        results.append(result)
+        print(
+            f"rows={rows} pages={result['pages']} "
+            f"total={result['seconds']:.2f}s "
+            f"throughput={result['rows_per_second']:.0f} rows/s "
+            f"peak_rss={result['peak_rss_mib']:.0f}MiB "
+            f"output={result['output_mib']:.1f}MiB"
+        )
+        for stage in ("fetch", "decode"):
+            timing = result[stage]
+            print(
+                f"  {stage:<6} {timing['seconds']:.2f}s "
+                f"p50={timing['p50_ms']:.1f}ms p95={timing['p95_ms']:.1f}ms"
+            )
+        print(f"  upload {result['upload']['seconds']:.2f}s")
+
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(results, f, indent=2)
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(results, json.load(f), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""
+Benchmark the columnar report decoder against the row-major loop it replaced.
+
+Run from the repository root:
+    python tests/benchmarks/bench_report_decoder.py --rows 100000
+"""
+
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import argparse
+import time
+
+import pandas as pd
+
+from include.hooks.google.analytics.report_decoder import report_to_df
+from google.analytics.data_v1beta.types import RunReportResponse
+
+
+def build_response(n_rows, n_dimensions, n_metrics):
+    """
+    Build a synthetic RunReportResponse with the given shape.
+    """
+    raw = RunReportResponse.pb()()
+    for i in range(n_dimensions):
+        raw.dimension_headers.add().name = f"dimension{i}"
+    for i in range(n_metrics):
+        raw.metric_headers.add().name = f"metric{i}"
+    for n in range(n_rows):
+        row = raw.rows.add()
+        for i in range(n_dimensions):
+            row.dimension_values.add().value = f"value{n % 1000}_{i}"
+        for i in range(n_metrics):
+            row.metric_values.add().value = str(n * (i + 1))
+    raw.row_count = n_rows
+    return RunReportResponse.wrap(raw)
+
+
+def row_loop_to_df(response):
+    """
+    The original get_report_df decoding loop.
+    """
+    columns = []
+    for dimension in response.dimension_headers:
+        columns.append(dimension.name)
+    for metric in response.metric_headers:
+        columns.append(metric.name)
+
+    rows = []
+    for row in response.rows:
+        row_values = []
+        for value in row.dimension_values:
+            row_values.append(value.value)
+        for value in row.metric_values:
+            row_values.append(value.value)
+        rows.append(row_values)
+    return pd.DataFrame(rows, columns=columns)
+
+
+def timed(func, response):
+    start = time.perf_counter()
+    df = func(response)
+    return time.perf_counter() - start, df
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--dimensions", type=int, default=5)
+    parser.add_argument("--metrics", type=int, default=6)
+    args = parser.parse_args()
+
+    response = build_response(args.rows, args.dimensions, args.metrics)
+    loop_seconds, loop_df = timed(row_loop_to_df, response)
+    columnar_seconds, columnar_df = timed(report_to_df, response)
+    assert loop_df.equals(columnar_df)
+
+    print(f"rows={args.rows} columns={args.dimensions + args.metrics}")
+    print(f"row loop: {loop_seconds:.3f}s")
+    print(f"columnar: {columnar_seconds:.3f}s")
+    print(f"speedup:  {loop_seconds / columnar_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
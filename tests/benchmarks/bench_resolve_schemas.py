@@ -0,0 +1,130 @@
+"""
+Benchmark the planned resolve_schemas projection against the per-column
+implementation it replaced, on wide frames.
+
+Run from the repository root:
+    python tests/benchmarks/bench_resolve_schemas.py --rows 2000000 --columns 40
+"""
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import argparse
+import time
+import tracemalloc
+
+import numpy as np
+import pandas as pd
+
+from include.libs.schema_reg.base_schema_transforms import resolve_schemas
+from include.libs.schema_reg.schema_registry import get_table_schema
+
+
+def build_schema(n_columns, n_missing):
+    """
+    Build table properties with every other column typed as a string, the
+    first n_missing columns are not in the report.
+    """
+    props = {}
+    for i in range(n_columns):
+        props[f"COL{i}"] = {
+            "type": "varchar(64)" if i % 2 else "float",
+            "description": f"source_order={n_columns - i}",
+        }
+    props["insert_timestamp"] = {"type": "timestamp_ntz", "description": None}
+    missing = [f"col{i}" for i in range(n_missing)]
+    return props, missing
+
+
+def build_df(n_rows, props, missing):
+    """
+    Build a report DataFrame with the source columns of props, minus missing,
+    plus a column the schema does not know.
+    """
+    data = {}
+    for name, prop in props.items():
+        if prop["description"] is None or name.lower() in missing:
+            continue
+        if "varchar" in prop["type"]:
+            data[name.lower()] = np.full(n_rows, "value", dtype=object)
+        else:
+            data[name.lower()] = np.arange(n_rows, dtype="float64")
+    data["unknown"] = np.zeros(n_rows)
+    return pd.DataFrame(data)
+
+
+def get_schema_order(prop):
+    if prop.get("description", None):
+        return int(prop.get("description").split("=")[1])
+    else:
+        return -1
+
+
+def column_loop_resolve_schemas(df, table_props):
+    """
+    The original resolve_schemas.
+    """
+    df.columns = map(str.lower, df.columns)
+    col_mapping = {k: k.lower() for k, v in table_props.items()}
+    df.rename(columns=col_mapping, inplace=True)
+    current_cols = df.columns.tolist()
+    schema_orders = {
+        k.lower(): get_schema_order(v)
+        for k, v in table_props.items()
+        if get_schema_order(v) != -1
+    }
+    schema_cols = list(schema_orders.keys())
+    schema_inters_cols = list(set(current_cols).intersection(schema_cols))
+    schema_inters_cols.sort(key=schema_orders.__getitem__)
+    df = df.loc[:, schema_inters_cols]
+    remaining = list(set(schema_cols) - set(schema_inters_cols))
+    for col in remaining:
+        dtype = table_props.get(col.upper()).get("type").lower()
+        if "varchar" in dtype:
+            df.loc[:, col] = None
+        else:
+            df.loc[:, col] = np.nan
+    schema_cols.sort(key=schema_orders.__getitem__)
+    return df.loc[:, schema_cols]
+
+
+def measure(func, df, table_props):
+    """
+    :return: Seconds and peak bytes allocated while resolving
+    """
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = func(df, table_props)
+    seconds = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return seconds, peak, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=2000000)
+    parser.add_argument("--columns", type=int, default=40)
+    parser.add_argument("--missing", type=int, default=4)
+    args = parser.parse_args()
+
+    props, missing = build_schema(args.columns, args.missing)
+    table_schema = get_table_schema(props)
+    df = build_df(args.rows, props, missing)
+    frame_mib = df.memory_usage(deep=False).sum() / 2**20
+
+    loop_seconds, loop_peak, loop_df = measure(
+        column_loop_resolve_schemas, df.copy(), props
+    )
+    plan_seconds, plan_peak, plan_df = measure(resolve_schemas, df, table_schema)
+    pd.testing.assert_frame_equal(loop_df, plan_df, check_dtype=False)
+
+    print(f"rows={args.rows} columns={args.columns} frame={frame_mib:.0f}MiB")
+    print(f"column loop: {loop_seconds:.3f}s peak={loop_peak / 2**20:.0f}MiB")
+    print(f"planned:     {plan_seconds:.3f}s peak={plan_peak / 2**20:.0f}MiB")
+    print(f"speedup:     {loop_seconds / plan_seconds:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
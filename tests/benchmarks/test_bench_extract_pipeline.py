@@ -0,0 +1,29 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from tests.benchmarks.bench_extract_pipeline import compare, run_case
+
+
+def test_run_case_extracts_every_page():
+    result = run_case(
+        rows=1000,
+        dimensions=3,
+        metrics=2,
+        page_size=300,
+        output_format="csv",
+        compression=None,
+        stream=True,
+    )
+    assert result["pages"] == 4
+    assert result["output_mib"] > 0
+    assert result["fetch"]["seconds"] > 0
+    assert result["decode"]["p95_ms"] >= result["decode"]["p50_ms"]
+
+
+def test_compare_reports_regressions():
+    baseline = [{"rows": 10, "rows_per_second": 100.0, "peak_rss_mib": 100.0}]
+    assert compare(baseline, baseline, 0.2) == []
+    slower = [{"rows": 10, "rows_per_second": 70.0, "peak_rss_mib": 130.0}]
+    assert len(compare(slower, baseline, 0.2)) == 2
@@ -0,0 +1,20 @@
+"""
+A clock the tests move by hand.
+
+Limiters, pools and caches take a clock callable, so a test can set the time
+instead of sleeping through windows, idle timeouts and TTLs.
+"""
+
+
+class FakeClock:
+    """
+    Callable returning ``now``, in seconds, until the test changes it.
+
+    :param now: Initial time.
+    """
+
+    def __init__(self, now=0.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
@@ -0,0 +1,122 @@
+"""
+A local, in-memory stand-in for the parts of GCSHook the operators use.
+
+Objects are kept as bytes in a dict keyed by (bucket, object name), so
+uploads, streamed uploads and existence checks run without a network or
+credentials, and what was uploaded can be read back. Benchmarks can keep
+only the object sizes, so the stand-in does not hold the whole output.
+"""
+import io
+import os
+import threading
+
+
+class FakeBlobWriter(io.RawIOBase):
+    """
+    Writer of a streamed upload, the object only exists once it is closed.
+    """
+
+    def __init__(self, gcs, bucket_name, object_name):
+        self._gcs = gcs
+        self._key = (bucket_name, object_name)
+        self._buffer = io.BytesIO() if gcs.keep_data else None
+        self._size = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        size = len(memoryview(data).cast("B"))
+        if self._buffer is not None:
+            self._buffer.write(data)
+        self._size += size
+        return size
+
+    def tell(self):
+        return self._size
+
+    def close(self):
+        if not self.closed:
+            data = self._buffer.getvalue() if self._buffer is not None else None
+            self._gcs._put(self._key, data, self._size)
+        super().close()
+
+
+class FakeBlob:
+    def __init__(self, gcs, bucket_name, object_name):
+        self._gcs = gcs
+        self.bucket_name = bucket_name
+        self.name = object_name
+
+    def open(self, mode="wb", **kwargs):
+        if mode != "wb":
+            raise ValueError(f"Only wb is supported, got {mode}")
+        return FakeBlobWriter(self._gcs, self.bucket_name, self.name)
+
+
+class FakeBucket:
+    def __init__(self, gcs, name):
+        self._gcs = gcs
+        self.name = name
+
+    def blob(self, object_name):
+        return FakeBlob(self._gcs, self.name, object_name)
+
+
+class FakeGCSHook:
+    """
+    In-memory GCSHook.
+
+    :param objects: Objects by (bucket, object name), shared with the caller if given.
+    :param keep_data: Keep the content of the objects, or only their sizes.
+    """
+
+    def __init__(self, objects=None, keep_data=True):
+        self.objects = {} if objects is None else objects
+        self.sizes = {}
+        self.keep_data = keep_data
+        self._lock = threading.Lock()
+
+    def _put(self, key, data, size):
+        with self._lock:
+            self.objects[key] = data if self.keep_data else None
+            self.sizes[key] = size
+
+    def get_conn(self):
+        return self
+
+    def bucket(self, bucket_name):
+        return FakeBucket(self, bucket_name)
+
+    def upload(
+        self,
+        bucket_name,
+        object_name,
+        filename=None,
+        data=None,
+        mime_type=None,
+        **kwargs,
+    ):
+        if filename is not None and not self.keep_data:
+            self._put((bucket_name, object_name), None, os.path.getsize(filename))
+            return
+        if filename is not None:
+            with open(filename, "rb") as f:
+                data = f.read()
+        elif isinstance(data, str):
+            data = data.encode("utf-8")
+        self._put((bucket_name, object_name), data, len(data))
+
+    def exists(self, bucket_name, object_name):
+        return (bucket_name, object_name) in self.objects
+
+    def download(self, bucket_name, object_name, filename=None):
+        data = self.objects[(bucket_name, object_name)]
+        if filename is not None:
+            with open(filename, "wb") as f:
+                f.write(data)
+            return filename
+        return data
+
+    def get_size(self, bucket_name, object_name):
+        return self.sizes[(bucket_name, object_name)]
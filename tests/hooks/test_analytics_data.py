@@ -3,13 +3,30 @@ import os, sys
 myPath = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, myPath + "/../../")
 
+import asyncio
+import threading
+
 import mock
 import pytest
 
 import pandas as pd
 
 from include.hooks.google.analytics.analytics_data import GoogleAnalyticsDataHook
-from google.analytics.data_v1beta.types import Dimension, Metric, Row
+from include.hooks.google.analytics.client_pool import ClientPool
+from include.hooks.google.analytics.metadata_cache import MetadataCache
+from include.hooks.google.analytics.report_cache import LocalReportCache
+from include.libs.metrics.stage_metrics import StageMetrics
+from tests.fakes.fake_analytics_data_server import FakeAnalyticsDataServer
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse,
+    CheckCompatibilityResponse,
+    Compatibility,
+    Dimension,
+    Metadata,
+    Metric,
+    Row,
+    RunReportResponse,
+)
 
 GCP_CONN_ID = "gcp_conn_id"
 API_VERSION = "data_v1beta"
@@ -86,11 +103,14 @@ def mock_hook():
     ), mock.patch(
         "google.analytics.data_v1beta.BetaAnalyticsDataClient.run_report"
     ) as run_report:
-        hook = GoogleAnalyticsDataHook(gcp_conn_id=GCP_CONN_ID, api_version=API_VERSION)
+        hook = GoogleAnalyticsDataHook(
+            gcp_conn_id=GCP_CONN_ID, api_version=API_VERSION, client_pool=ClientPool()
+        )
         conn.return_value.extra_dejson = EXTRAS
         run_report.return_value.dimension_headers = dimensionsHeaders
         run_report.return_value.metric_headers = metricsHeaders
         run_report.return_value.rows = rows
+        run_report.return_value.row_count = len(rows)
         yield hook
 
 
@@ -133,3 +153,275 @@ class TestGoogleAnalyticsDataHook:
     def test_get_metrics_headers(self, mock_hook):
         metrics_headers = mock_hook._get_metrics_headers(METRICS)
         assert metrics_headers == metricsHeaders
+
+    def test_get_run_report_request_with_paging(self, mock_hook):
+        request = mock_hook._get_run_report_request(
+            PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, limit=2, offset=4
+        )
+        assert request.property == f"properties/{PROPERTY_ID}"
+        assert request.limit == 2
+        assert request.offset == 4
+
+    def test_iter_report_pages(self, mock_hook):
+        mock_hook.get_conn()
+        pages = [
+            RunReportResponse(
+                dimension_headers=[{"name": "country"}, {"name": "date"}],
+                metric_headers=[
+                    {"name": "activeUsers"},
+                    {"name": "newUsers"},
+                    {"name": "sessions"},
+                ],
+                rows=[row],
+                row_count=len(rows),
+            )
+            for row in rows
+        ]
+        mock_hook._client.run_report.side_effect = pages
+        report_pages = list(
+            mock_hook.iter_report_pages(
+                PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=1
+            )
+        )
+        assert report_pages == pages
+        offsets = [
+            call.args[0].offset for call in mock_hook._client.run_report.call_args_list
+        ]
+        assert offsets == [0, 1]
+
+    def test_iter_report_pages_invalid_page_size(self, mock_hook):
+        with pytest.raises(ValueError):
+            next(
+                mock_hook.iter_report_pages(
+                    PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=0
+                )
+            )
+
+    def test_get_report_df_paged(self, mock_hook):
+        mock_hook.get_conn()
+        mock_hook._client.run_report.side_effect = [
+            RunReportResponse(
+                dimension_headers=[{"name": "country"}, {"name": "date"}],
+                metric_headers=[
+                    {"name": "activeUsers"},
+                    {"name": "newUsers"},
+                    {"name": "sessions"},
+                ],
+                rows=[row],
+                row_count=len(rows),
+            )
+            for row in rows
+        ]
+        report_df = mock_hook.get_report_df(
+            PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=1
+        )
+        assert report_df.equals(REPORT_DF)
+        assert mock_hook._client.run_report.call_count == 2
+
+    def test_batch_run_reports(self, mock_hook):
+        mock_hook.get_conn()
+        mock_hook._client.batch_run_reports = mock.Mock(
+            side_effect=lambda request: BatchRunReportsResponse(
+                reports=[RunReportResponse() for _ in request.requests]
+            )
+        )
+        reports = [{"dimensions": DIMENSIONS, "metrics": METRICS}] * 7
+        responses = list(
+            mock_hook.batch_run_reports(PROPERTY_ID, reports, START_DS, END_DS)
+        )
+        assert len(responses) == 7
+        batch_sizes = [
+            len(call.args[0].requests)
+            for call in mock_hook._client.batch_run_reports.call_args_list
+        ]
+        assert batch_sizes == [5, 2]
+
+    def test_iter_batch_report_df_completes_truncated_reports(self, mock_hook):
+        mock_hook.get_conn()
+        headers = {
+            "dimension_headers": [{"name": "country"}, {"name": "date"}],
+            "metric_headers": [
+                {"name": "activeUsers"},
+                {"name": "newUsers"},
+                {"name": "sessions"},
+            ],
+        }
+        mock_hook._client.batch_run_reports = mock.Mock(
+            return_value=BatchRunReportsResponse(
+                reports=[RunReportResponse(rows=rows[:1], row_count=2, **headers)]
+            )
+        )
+        mock_hook._client.run_report.side_effect = [
+            RunReportResponse(rows=rows[1:], row_count=2, **headers)
+        ]
+        dfs = list(
+            mock_hook.iter_batch_report_df(
+                PROPERTY_ID,
+                [{"dimensions": DIMENSIONS, "metrics": METRICS}],
+                START_DS,
+                END_DS,
+                page_size=1,
+            )
+        )
+        assert len(dfs) == 1
+        assert dfs[0].equals(REPORT_DF)
+        assert mock_hook._client.run_report.call_args.args[0].offset == 1
+
+    def test_run_report_requests_property_quota(self, mock_hook):
+        mock_hook.run_report(PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS)
+        request = mock_hook._client.run_report.call_args.args[0]
+        assert request.return_property_quota
+
+    def test_get_report_df_single_request_warns_when_truncated(self, mock_hook):
+        mock_hook.get_conn().run_report.return_value.row_count = 25000
+        with mock.patch.object(mock_hook.log, "warning") as warning:
+            report_df = mock_hook.get_report_df(
+                PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=None
+            )
+        assert len(report_df) == 2
+        warning.assert_called_once()
+        assert warning.call_args.args[1:] == (2, 25000)
+
+    def test_run_report_counts_pages_rows_and_quota(self, mock_hook):
+        mock_hook.stage_metrics = StageMetrics("extract")
+        mock_hook.get_conn().run_report.return_value = RunReportResponse(
+            rows=rows,
+            row_count=2,
+            property_quota={"tokens_per_hour": {"consumed": 12, "remaining": 10000}},
+        )
+        mock_hook.run_report(PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS)
+        summary = mock_hook.stage_metrics.summary()
+        assert summary["counts"] == {"pages": 1, "rows": 2, "quota_tokens": 12}
+        assert list(summary["seconds"]) == ["run_report"]
+
+    def test_validate_report(self, mock_hook):
+        mock_hook.metadata_cache = MetadataCache(directory=None)
+        client = mock_hook.get_conn()
+        with mock.patch.object(
+            client, "get_metadata"
+        ) as get_metadata, mock.patch.object(
+            client, "check_compatibility"
+        ) as check_compatibility:
+            get_metadata.return_value = Metadata(
+                dimensions=[{"api_name": name} for name in DIMENSIONS],
+                metrics=[{"api_name": name} for name in METRICS],
+            )
+            check_compatibility.return_value = CheckCompatibilityResponse()
+            mock_hook.validate_report(PROPERTY_ID, DIMENSIONS, METRICS)
+            with pytest.raises(ValueError, match="city"):
+                mock_hook.validate_report(PROPERTY_ID, ["city"], METRICS)
+            check_compatibility.return_value = CheckCompatibilityResponse(
+                metric_compatibilities=[
+                    {
+                        "metric_metadata": {"api_name": "newUsers"},
+                        "compatibility": Compatibility.INCOMPATIBLE,
+                    }
+                ]
+            )
+            with pytest.raises(ValueError, match="newUsers"):
+                mock_hook.validate_report(PROPERTY_ID, DIMENSIONS, METRICS)
+        get_metadata.assert_called_once()
+        assert get_metadata.call_args.args[0].name == (
+            f"properties/{PROPERTY_ID}/metadata"
+        )
+        request = check_compatibility.call_args.args[0]
+        assert request.property == f"properties/{PROPERTY_ID}"
+        assert request.compatibility_filter == Compatibility.INCOMPATIBLE
+        assert check_compatibility.call_count == 2
+
+
+@pytest.fixture()
+def mock_connection():
+    with mock.patch(
+        "airflow.providers.google.common.hooks.base_google.GoogleBaseHook.get_connection"
+    ) as conn:
+        conn.return_value.extra_dejson = EXTRAS
+        yield conn
+
+
+@pytest.mark.usefixtures("mock_connection")
+class TestGoogleAnalyticsDataHookFakeServer:
+    def test_get_report_df_async_against_fake_server(self):
+        with FakeAnalyticsDataServer(row_count=5) as server:
+            hook = GoogleAnalyticsDataHook(gcp_conn_id=GCP_CONN_ID)
+
+            async def fetch():
+                hook._async_client = server.async_client()
+                return await hook.get_report_df_async(
+                    PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=2
+                )
+
+            report_df = asyncio.run(fetch())
+        assert len(report_df) == 5
+        assert report_df.columns.tolist() == DIMENSIONS + METRICS
+        assert report_df["sessions"].tolist() == [0, 3, 6, 9, 12]
+        assert [request.offset for request in server.requests] == [0, 2, 4]
+
+    def test_get_report_df_against_fake_server(self):
+        with FakeAnalyticsDataServer(row_count=3) as server:
+            hook = GoogleAnalyticsDataHook(gcp_conn_id=GCP_CONN_ID)
+            hook._client = server.sync_client()
+            report_df = hook.get_report_df(
+                PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS
+            )
+        assert len(report_df) == 3
+        assert report_df["date"].tolist() == ["2022-01-01", "2022-02-02", "2022-03-03"]
+
+    def test_run_report_served_from_cache(self, tmp_path):
+        cache = LocalReportCache(str(tmp_path))
+        with FakeAnalyticsDataServer(row_count=3) as server:
+            hook = GoogleAnalyticsDataHook(gcp_conn_id=GCP_CONN_ID, cache=cache)
+            hook._client = server.sync_client()
+            first = hook.get_report_df(
+                PROPERTY_ID, DIMENSIONS, METRICS, "2022-01-01", "2022-01-31"
+            )
+            second = hook.get_report_df(
+                PROPERTY_ID, DIMENSIONS, METRICS, "2022-01-01", "2022-01-31"
+            )
+            hook.get_report_df(PROPERTY_ID, DIMENSIONS, METRICS, START_DS, "today")
+            hook.get_report_df(PROPERTY_ID, DIMENSIONS, METRICS, START_DS, "today")
+        assert second.equals(first)
+        # The settled range is fetched once, the range ending today every time.
+        assert len(server.requests) == 3
+
+    def test_run_report_async_uses_cache_off_the_event_loop(self, tmp_path):
+        cache = LocalReportCache(str(tmp_path))
+        threads = []
+        for name in ("_read", "_write"):
+            method = getattr(cache, name)
+
+            def record(*args, method=method):
+                threads.append(threading.get_ident())
+                return method(*args)
+
+            setattr(cache, name, record)
+        with FakeAnalyticsDataServer(row_count=3) as server:
+            hook = GoogleAnalyticsDataHook(gcp_conn_id=GCP_CONN_ID, cache=cache)
+
+            async def fetch():
+                hook._async_client = server.async_client()
+                for _ in range(2):
+                    await hook.run_report_async(
+                        PROPERTY_ID, DIMENSIONS, METRICS, "2022-01-01", "2022-01-31"
+                    )
+                return threading.get_ident()
+
+            loop_thread = asyncio.run(fetch())
+        assert len(server.requests) == 1
+        assert len(threads) == 3
+        assert loop_thread not in threads
+
+    def test_get_report_df_timed_against_fake_server(self):
+        stage_metrics = StageMetrics("extract", tags={"property_id": PROPERTY_ID})
+        with FakeAnalyticsDataServer(row_count=5) as server:
+            hook = GoogleAnalyticsDataHook(
+                gcp_conn_id=GCP_CONN_ID, stage_metrics=stage_metrics
+            )
+            hook._client = server.sync_client()
+            hook.get_report_df(
+                PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, page_size=2
+            )
+        summary = stage_metrics.summary()
+        assert summary["counts"] == {"pages": 3, "rows": 5}
+        assert set(summary["seconds"]) == {"run_report", "build_df", "get_report_df"}
+        assert summary["seconds"]["get_report_df"] >= summary["seconds"]["build_df"]
@@ -0,0 +1,189 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import asyncio
+import threading
+import time
+
+import grpc
+import mock
+import pytest
+from google.api_core.exceptions import ServiceUnavailable
+from google.auth.credentials import AnonymousCredentials
+
+from include.hooks.google.analytics.analytics_data import GoogleAnalyticsDataHook
+from include.hooks.google.analytics.client_pool import ClientPool, PooledGrpcClient
+from tests.fakes.fake_analytics_data_server import FakeAnalyticsDataServer
+from tests.fakes.fake_clock import FakeClock
+
+PROPERTY_ID = "GA_Property_Id"
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+@pytest.fixture()
+def mock_credentials():
+    with mock.patch(
+        "airflow.providers.google.common.hooks.base_google.GoogleBaseHook._get_credentials_and_project_id",
+        return_value=(AnonymousCredentials(), None),
+    ) as get_credentials, mock.patch(
+        "airflow.providers.google.common.hooks.base_google.GoogleBaseHook.get_connection"
+    ):
+        yield get_credentials
+
+
+class TestClientPool:
+    def test_get_creates_once(self, clock):
+        pool = ClientPool(clock=clock)
+        create = mock.Mock(side_effect=object)
+        first = pool.get("key", create)
+        assert pool.get("key", create) is first
+        assert pool.get("other", create) is not first
+        assert create.call_count == 2
+
+    def test_concurrent_gets_wait_for_one_creation(self):
+        pool = ClientPool()
+        created = []
+
+        def create():
+            time.sleep(0.05)
+            created.append(object())
+            return created[-1]
+
+        results = []
+        threads = [
+            threading.Thread(target=lambda: results.append(pool.get("key", create)))
+            for _ in range(8)
+        ]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        assert len(created) == 1
+        assert all(result is created[0] for result in results)
+
+    def test_evicts_idle_entries(self, clock):
+        pool = ClientPool(idle_timeout=10, clock=clock)
+        first = pool.get("key", object)
+        clock.now = 9
+        assert pool.get("key", object) is first
+        clock.now = 12
+        pool.get("other", object)
+        clock.now = 19
+        pool.evict_idle()
+        assert len(pool) == 1
+        assert pool.get("key", object) is not first
+
+    def test_recreates_old_entries(self, clock):
+        pool = ClientPool(max_age=60, clock=clock)
+        first = pool.get("key", object)
+        clock.now = 30
+        assert pool.get("key", object) is first
+        clock.now = 60
+        assert pool.get("key", object) is not first
+
+    def test_recreates_unhealthy_entries(self, clock):
+        pool = ClientPool(clock=clock)
+        first = pool.get("key", object)
+        assert pool.get("key", object, check=lambda value: False) is not first
+
+    def test_discard(self, clock):
+        pool = ClientPool(clock=clock)
+        first = pool.get("key", object)
+        pool.discard("key")
+        assert pool.get("key", object) is not first
+
+    def test_releases_dropped_entries(self, clock):
+        pool = ClientPool(idle_timeout=10, clock=clock)
+        released = []
+        release = released.append
+        discarded = pool.get("discarded", object, release=release)
+        pool.discard("discarded")
+        unhealthy = pool.get("unhealthy", object, release=release)
+        replacement = pool.get(
+            "unhealthy", object, check=lambda value: False, release=release
+        )
+        matching = pool.get(("matching",), object, release=release)
+        pool.discard_if(lambda key: key == ("matching",))
+        clock.now = 10
+        pool.get("other", object)
+        last = pool.get("last", object, release=release)
+        pool.clear()
+        assert released == [discarded, unhealthy, matching, replacement, last]
+        assert len(pool) == 0
+
+
+class TestPooledGrpcClient:
+    def test_client_without_channel_is_healthy(self):
+        assert PooledGrpcClient(mock.Mock(spec=[])).is_healthy()
+
+    def test_sync_channel_state(self):
+        with FakeAnalyticsDataServer() as server:
+            pooled = PooledGrpcClient(server.sync_client())
+            assert pooled.is_healthy()
+            pooled._set_state(grpc.ChannelConnectivity.TRANSIENT_FAILURE)
+            assert not pooled.is_healthy()
+
+    def test_release_unsubscribes_sync_channel(self):
+        client = mock.Mock()
+        pooled = PooledGrpcClient(client)
+        pooled.release()
+        pooled.release()
+        client.transport.grpc_channel.unsubscribe.assert_called_once_with(
+            pooled._set_state
+        )
+
+    def test_async_channel_state(self):
+        async def check():
+            with FakeAnalyticsDataServer() as server:
+                pooled = PooledGrpcClient(server.async_client())
+                healthy = pooled.is_healthy()
+                await pooled.client.transport.close()
+                return healthy, pooled.is_healthy()
+
+        assert asyncio.run(check()) == (True, False)
+
+
+@pytest.mark.usefixtures("mock_credentials")
+class TestGoogleAnalyticsDataHookPooling:
+    def test_hooks_of_a_connection_share_client_and_credentials(self, mock_credentials):
+        pool = ClientPool()
+        first = GoogleAnalyticsDataHook(gcp_conn_id="ga", client_pool=pool)
+        second = GoogleAnalyticsDataHook(gcp_conn_id="ga", client_pool=pool)
+        other = GoogleAnalyticsDataHook(gcp_conn_id="other", client_pool=pool)
+        assert first.get_conn() is second.get_conn()
+        assert other.get_conn() is not first.get_conn()
+        assert mock_credentials.call_count == 2
+
+    def test_async_clients_are_pooled_per_loop(self):
+        pool = ClientPool()
+
+        async def get_clients():
+            first = GoogleAnalyticsDataHook(gcp_conn_id="ga", client_pool=pool)
+            second = GoogleAnalyticsDataHook(gcp_conn_id="ga", client_pool=pool)
+            return first.get_async_conn(), second.get_async_conn()
+
+        first, second = asyncio.run(get_clients())
+        assert first is second
+        assert asyncio.run(get_clients())[0] is not first
+        # The client of the first, closed loop was dropped.
+        assert len(pool) == 2
+
+    def test_unavailable_api_discards_client(self):
+        pool = ClientPool()
+        hook = GoogleAnalyticsDataHook(gcp_conn_id="ga", client_pool=pool)
+        client = hook.get_conn()
+        with mock.patch.object(
+            type(client), "run_report", side_effect=ServiceUnavailable("down")
+        ):
+            with pytest.raises(ServiceUnavailable):
+                hook.run_report(
+                    PROPERTY_ID, ["country"], ["sessions"], "today", "today"
+                )
+        assert hook._client is None
+        assert hook.get_conn() is not client
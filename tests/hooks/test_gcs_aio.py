@@ -0,0 +1,44 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import json
+
+import mock
+import pytest
+
+from include.hooks.google.cloud.gcs_aio import GCSAioHook
+
+KEYFILE_DICT = {"type": "service_account", "client_email": "loader@project.iam"}
+
+
+@pytest.fixture()
+def mock_fields():
+    fields = {}
+    with mock.patch(
+        "airflow.providers.google.common.hooks.base_google.GoogleBaseHook.get_connection"
+    ), mock.patch.object(
+        GCSAioHook,
+        "_get_field",
+        side_effect=lambda name, default=None: fields.get(name, default),
+    ):
+        yield fields
+
+
+@pytest.mark.parametrize(
+    "keyfile_dict", [KEYFILE_DICT, json.dumps(KEYFILE_DICT)], ids=["dict", "str"]
+)
+def test_get_service_file_from_keyfile_dict(mock_fields, keyfile_dict):
+    mock_fields["keyfile_dict"] = keyfile_dict
+    service_file = GCSAioHook(gcp_conn_id="gcs").get_service_file()
+    assert json.load(service_file) == KEYFILE_DICT
+
+
+def test_get_service_file_from_key_path(mock_fields):
+    mock_fields["key_path"] = "/keys/loader.json"
+    assert GCSAioHook(gcp_conn_id="gcs").get_service_file() == "/keys/loader.json"
+
+
+def test_get_service_file_defaults_to_application_credentials(mock_fields):
+    assert GCSAioHook(gcp_conn_id="gcs").get_service_file() is None
@@ -0,0 +1,65 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from google.analytics.data_v1beta.types import Metadata
+
+from include.hooks.google.analytics.metadata_cache import (
+    MetadataCache,
+    find_unknown_fields,
+)
+from tests.fakes.fake_clock import FakeClock
+
+NOW = 1647302400.0  # 2022-03-15T00:00:00Z
+METADATA = Metadata(
+    name="properties/123/metadata",
+    dimensions=[
+        {"api_name": "date"},
+        {"api_name": "country"},
+        {"api_name": "customEvent:plan", "custom_definition": True},
+    ],
+    metrics=[
+        {"api_name": "sessions"},
+        {"api_name": "activeUsers", "deprecated_api_names": ["active1DayUsers"]},
+    ],
+)
+
+
+def test_cache_expires_after_ttl(tmp_path):
+    clock = FakeClock(NOW)
+    cache = MetadataCache(str(tmp_path), ttl=60, clock=clock)
+    assert cache.get("123") is None
+    cache.set("123", METADATA)
+    assert cache.get(123) == METADATA
+    assert cache.get("456") is None
+    clock.now += 60
+    assert cache.get("123") is None
+
+
+def test_cache_is_shared_through_the_directory(tmp_path):
+    clock = FakeClock(NOW)
+    MetadataCache(str(tmp_path / "metadata"), clock=clock).set("123", METADATA)
+    cache = MetadataCache(str(tmp_path / "metadata"), clock=clock)
+    assert cache.get("123") == METADATA
+    clock.now += 24 * 3600
+    assert MetadataCache(str(tmp_path / "metadata"), clock=clock).get("123") is None
+
+
+def test_cache_in_memory_only():
+    cache = MetadataCache(directory=None, clock=FakeClock(NOW))
+    cache.set("123", METADATA)
+    assert cache.get("123") == METADATA
+    assert MetadataCache(directory=None).get("123") is None
+
+
+def test_find_unknown_fields():
+    assert find_unknown_fields(
+        METADATA,
+        ["date", "customEvent:plan"],
+        ["sessions", "active1DayUsers"],
+    ) == ([], [])
+    assert find_unknown_fields(METADATA, ["date", "city"], ["sessions", "sesions"]) == (
+        ["city"],
+        ["sesions"],
+    )
@@ -0,0 +1,126 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import asyncio
+
+import mock
+import pytest
+
+from include.hooks.google.analytics.quota import (
+    PropertyQuotaLimiter,
+    call_with_quota,
+    call_with_quota_async,
+    get_property_limiter,
+    get_property_quota,
+    get_retry_delay,
+)
+from google.analytics.data_v1beta.types import (
+    BatchRunReportsResponse,
+    PropertyQuota,
+    RunReportResponse,
+)
+from google.api_core.exceptions import ResourceExhausted
+from tests.fakes.fake_clock import FakeClock
+
+PROPERTY_QUOTA = PropertyQuota(
+    tokens_per_hour={"consumed": 20, "remaining": 100},
+    tokens_per_day={"consumed": 20, "remaining": 50},
+    concurrent_requests={"consumed": 1, "remaining": 2},
+)
+
+
+@pytest.fixture()
+def clock():
+    return FakeClock()
+
+
+class TestPropertyQuotaLimiter:
+    def test_acquire_takes_tokens_and_slot(self, clock):
+        limiter = PropertyQuotaLimiter(tokens_per_hour=3600, clock=clock)
+        limiter.acquire()
+        assert limiter.in_flight == 1
+        assert limiter.tokens == 3600 - limiter.request_cost
+        limiter.release()
+        assert limiter.in_flight == 0
+
+    def test_try_acquire_waits_for_refill(self, clock):
+        limiter = PropertyQuotaLimiter(tokens_per_hour=3600, clock=clock)
+        limiter.tokens = 0
+        assert limiter._try_acquire() == pytest.approx(limiter.request_cost)
+        clock.now += limiter.request_cost
+        assert limiter._try_acquire() == 0
+
+    def test_try_acquire_respects_concurrency(self, clock):
+        limiter = PropertyQuotaLimiter(concurrent_requests=1, clock=clock)
+        assert limiter._try_acquire() == 0
+        assert limiter._try_acquire() > 0
+        limiter.release()
+        assert limiter._try_acquire() == 0
+
+    def test_update_from_property_quota(self, clock):
+        limiter = PropertyQuotaLimiter(clock=clock)
+        limiter.acquire()
+        limiter.release(PROPERTY_QUOTA)
+        # The daily remainder is lower than the hourly one.
+        assert limiter.tokens == 50
+        assert limiter.request_cost == pytest.approx(0.8 * 10 + 0.2 * 20)
+        assert limiter.concurrency == 3
+
+    def test_penalize_empties_bucket(self, clock):
+        limiter = PropertyQuotaLimiter(clock=clock)
+        limiter.penalize()
+        assert limiter.tokens == 0
+        assert limiter._try_acquire() > 0
+
+
+class TestCallWithQuota:
+    def test_get_property_limiter_is_shared(self):
+        assert get_property_limiter("shared") is get_property_limiter("shared")
+        assert get_property_limiter("shared") is not get_property_limiter("other")
+
+    def test_get_property_quota(self):
+        response = RunReportResponse(property_quota=PROPERTY_QUOTA)
+        assert get_property_quota(response) == PROPERTY_QUOTA
+        assert get_property_quota(RunReportResponse()) is None
+        batch = BatchRunReportsResponse(reports=[RunReportResponse(), response])
+        assert get_property_quota(batch) == PROPERTY_QUOTA
+
+    def test_retry_delay_is_bounded(self):
+        for attempt in range(10):
+            assert 0 <= get_retry_delay(attempt, base_delay=1, max_delay=8) <= 8
+
+    def test_retries_resource_exhausted(self):
+        limiter = PropertyQuotaLimiter()
+        func = mock.Mock(side_effect=[ResourceExhausted("quota"), "response"])
+        sleep = mock.Mock()
+        assert call_with_quota(func, limiter, sleep=sleep) == "response"
+        assert func.call_count == 2
+        sleep.assert_called_once()
+        assert limiter.in_flight == 0
+
+    def test_raises_after_max_retries(self):
+        limiter = PropertyQuotaLimiter()
+        func = mock.Mock(side_effect=ResourceExhausted("quota"))
+        with mock.patch.object(limiter, "acquire"), pytest.raises(ResourceExhausted):
+            call_with_quota(func, limiter, max_retries=2, sleep=mock.Mock())
+        assert func.call_count == 3
+
+    def test_other_errors_are_not_retried(self):
+        limiter = PropertyQuotaLimiter()
+        func = mock.Mock(side_effect=ValueError("bad request"))
+        with pytest.raises(ValueError):
+            call_with_quota(func, limiter, sleep=mock.Mock())
+        assert func.call_count == 1
+        assert limiter.in_flight == 0
+
+    def test_async_learns_from_response(self):
+        limiter = PropertyQuotaLimiter()
+
+        async def func():
+            return RunReportResponse(property_quota=PROPERTY_QUOTA)
+
+        asyncio.run(call_with_quota_async(func, limiter))
+        assert limiter.tokens == 50
+        assert limiter.in_flight == 0
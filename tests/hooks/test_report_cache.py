@@ -0,0 +1,133 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from datetime import date
+
+import mock
+import pytest
+from google.analytics.data_v1beta.types import (
+    DateRange,
+    Dimension,
+    Metric,
+    RunReportRequest,
+    RunReportResponse,
+)
+from google.api_core.exceptions import NotFound
+
+from include.hooks.google.analytics.report_cache import (
+    GCSReportCache,
+    LocalReportCache,
+    ReportCache,
+    get_request_key,
+)
+from tests.fakes.fake_analytics_data_server import FakeAnalyticsDataServer
+from tests.fakes.fake_clock import FakeClock
+
+TODAY = date(2022, 3, 15)
+NOW = 1647302400.0  # 2022-03-15T00:00:00Z
+
+
+def make_request(start_date="2022-01-01", end_date="2022-01-31", offset=0):
+    return RunReportRequest(
+        property="properties/123",
+        dimensions=[Dimension(name="date"), Dimension(name="country")],
+        metrics=[Metric(name="sessions")],
+        date_ranges=[DateRange(start_date=start_date, end_date=end_date)],
+        offset=offset,
+    )
+
+
+def make_response(request):
+    return FakeAnalyticsDataServer(row_count=4).build_report(request)
+
+
+def test_get_request_key_resolves_relative_dates():
+    assert get_request_key(
+        make_request("2022-03-01", "yesterday"), today=TODAY
+    ) == get_request_key(make_request("2022-03-01", "2022-03-14"), today=TODAY)
+    assert get_request_key(make_request(), today=TODAY) != get_request_key(
+        make_request(offset=10), today=TODAY
+    )
+
+
+def test_get_ttl_of_settling_ranges():
+    cache = GCSReportCache(mock.Mock(), "bucket", ttl=100, settling_ttl=5)
+    assert cache.get_ttl(make_request(), today=TODAY) == 100
+    assert cache.get_ttl(make_request(end_date="2022-03-12"), today=TODAY) == 100
+    assert cache.get_ttl(make_request(end_date="2022-03-13"), today=TODAY) == 5
+    assert cache.get_ttl(make_request(end_date="today"), today=TODAY) == 5
+
+
+def test_local_report_cache_round_trip_and_expiry(tmp_path):
+    clock = FakeClock(NOW)
+    cache = LocalReportCache(str(tmp_path), ttl=60, clock=clock)
+    request = make_request()
+    assert cache.get(request) is None
+    cache.set(request, make_response(request))
+    cached = cache.get(request)
+    assert [row.dimension_values[0].value for row in cached.rows] == [
+        "20220101",
+        "20220202",
+        "20220303",
+        "20220404",
+    ]
+    clock.now += 61
+    assert cache.get(request) is None
+
+
+def test_local_report_cache_skips_settling_ranges(tmp_path):
+    cache = LocalReportCache(str(tmp_path), clock=FakeClock(NOW))
+    request = make_request(end_date="today")
+    cache.set(request, make_response(request))
+    assert os.listdir(tmp_path) == []
+
+
+def test_local_report_cache_evicts_least_recently_used(tmp_path):
+    clock = FakeClock(NOW)
+    requests = [make_request(offset=offset) for offset in range(3)]
+    entry_size = len(RunReportResponse.serialize(make_response(requests[0]))) + 8
+    cache = LocalReportCache(
+        str(tmp_path), max_bytes=entry_size * 2 + 8, ttl=60, clock=clock
+    )
+    cache.set(requests[0], make_response(requests[0]))
+    cache.set(requests[1], make_response(requests[1]))
+    os.utime(os.path.join(tmp_path, f"{get_request_key(requests[0])}.pb"), (1, 1))
+    os.utime(os.path.join(tmp_path, f"{get_request_key(requests[1])}.pb"), (2, 2))
+    # Reading the oldest entry makes it the most recently used.
+    assert cache.get(requests[0]) is not None
+    cache.set(requests[2], make_response(requests[2]))
+    assert cache.get(requests[0]) is not None
+    assert cache.get(requests[1]) is None
+    assert cache.get(requests[2]) is not None
+
+
+def test_incomplete_report_cache_fails_on_creation():
+    class ReadOnlyReportCache(ReportCache):
+        def _read(self, key):
+            return None
+
+    with pytest.raises(TypeError):
+        ReadOnlyReportCache()
+
+
+def test_gcs_report_cache():
+    gcs_hook = mock.Mock()
+    stored = {}
+    gcs_hook.upload.side_effect = lambda bucket_name, object_name, data, **kwargs: (
+        stored.__setitem__(object_name, data)
+    )
+
+    def download(bucket_name, object_name):
+        if object_name not in stored:
+            raise NotFound(object_name)
+        return stored[object_name]
+
+    gcs_hook.download.side_effect = download
+    cache = GCSReportCache(gcs_hook, "bucket", prefix="cache", clock=FakeClock(NOW))
+    request = make_request()
+    assert cache.get(request) is None
+    cache.set(request, make_response(request))
+    assert list(stored) == [f"cache/{get_request_key(request)}.pb"]
+    assert len(cache.get(request).rows) == 4
@@ -0,0 +1,109 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import pytest
+
+import numpy as np
+import pandas as pd
+
+from include.hooks.google.analytics.report_decoder import (
+    cast_metric_values,
+    decode_report_bytes,
+    get_schema_type_dtype,
+    get_report_columns,
+    report_to_arrow,
+    report_to_df,
+)
+from google.analytics.data_v1beta.types import MetricType, RunReportResponse
+
+RESPONSE = RunReportResponse(
+    dimension_headers=[{"name": "country"}, {"name": "date"}],
+    metric_headers=[{"name": "activeUsers"}, {"name": "sessions"}],
+    rows=[
+        {
+            "dimension_values": [{"value": "United States"}, {"value": "20211206"}],
+            "metric_values": [{"value": "133"}, {"value": "79"}],
+        },
+        {
+            "dimension_values": [{"value": "Canada"}, {"value": "20211207"}],
+            "metric_values": [{"value": "153"}, {"value": "88"}],
+        },
+    ],
+    row_count=2,
+)
+REPORT_DF = pd.DataFrame(
+    {
+        "country": ["United States", "Canada"],
+        "date": ["20211206", "20211207"],
+        "activeUsers": ["133", "153"],
+        "sessions": ["79", "88"],
+    }
+)
+
+
+class TestReportDecoder:
+    def test_get_report_columns(self):
+        columns, buffers = get_report_columns(RESPONSE)
+        assert columns == ["country", "date", "activeUsers", "sessions"]
+        assert buffers["country"] == ["United States", "Canada"]
+        assert buffers["sessions"] == ["79", "88"]
+
+    def test_report_to_df(self):
+        assert report_to_df(RESPONSE).equals(REPORT_DF)
+
+    def test_report_to_df_empty(self):
+        response = RunReportResponse(
+            dimension_headers=[{"name": "country"}],
+            metric_headers=[{"name": "sessions"}],
+        )
+        df = report_to_df(response)
+        assert df.empty
+        assert df.columns.tolist() == ["country", "sessions"]
+
+    def test_decode_report_bytes(self):
+        data = RunReportResponse.serialize(RESPONSE)
+        assert report_to_df(decode_report_bytes(data)).equals(REPORT_DF)
+
+    def test_report_to_arrow(self):
+        pytest.importorskip("pyarrow")
+        table = report_to_arrow(RESPONSE)
+        assert table.column_names == ["country", "date", "activeUsers", "sessions"]
+        assert table.column("country").to_pylist() == ["United States", "Canada"]
+
+    def test_report_to_df_casts_typed_metrics(self):
+        response = RunReportResponse(RESPONSE)
+        response.metric_headers[0].type_ = MetricType.TYPE_INTEGER
+        response.metric_headers[1].type_ = MetricType.TYPE_FLOAT
+        df = report_to_df(response)
+        assert df["activeUsers"].dtype == np.int64
+        assert df["sessions"].dtype == np.float64
+        assert df["activeUsers"].tolist() == [133, 153]
+        assert df["country"].tolist() == ["United States", "Canada"]
+
+    def test_report_to_df_falls_back_to_schema_types(self):
+        df = report_to_df(
+            RESPONSE, schema_types={"ACTIVEUSERS": "int", "SESSIONS": "float"}
+        )
+        assert df["activeUsers"].dtype == np.int64
+        assert df["sessions"].dtype == np.float64
+
+    def test_cast_metric_values_coerces_blanks(self):
+        values = cast_metric_values(["1", ""], np.int64)
+        assert values.dtype == np.float64
+        assert values[0] == 1
+        assert np.isnan(values[1])
+
+    @pytest.mark.parametrize(
+        "schema_type, dtype",
+        [
+            ("int", np.int64),
+            ("float", np.float64),
+            ("number(38,2)", np.float64),
+            ("varchar(64)", None),
+            (None, None),
+        ],
+    )
+    def test_get_schema_type_dtype(self, schema_type, dtype):
+        assert get_schema_type_dtype(schema_type) is dtype
@@ -0,0 +1,117 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import pandas as pd
+
+from include.hooks.google.analytics.report_planner import (
+    MAX_METRICS,
+    derive_report,
+    get_source_metrics,
+    is_derivable,
+    plan_reports,
+)
+from include.libs.schema_reg.schema_registry import schema_registry
+
+SCHEMA_PATH = os.path.join(
+    myPath, "../../include/table_schemas/snowflake/database/ga_schemas.json"
+)
+FINE_DF = pd.DataFrame(
+    {
+        "country": ["France", "France", "Spain", "Spain"],
+        "browser": ["Chrome", "Firefox", "Chrome", "Safari"],
+        "sessions": [4, 2, 0, 1],
+        "eventCount": [20, 6, 0, 3],
+    }
+)
+
+
+def test_user_metrics_are_not_derivable():
+    assert is_derivable("eventCount")
+    assert not is_derivable("activeUsers")
+    assert not is_derivable("sessionsPerUser")
+    assert not is_derivable("eventsPerSession")
+    assert is_derivable("eventsPerSession", {"eventCount", "sessions"})
+
+
+def test_get_source_metrics_replaces_ratios():
+    assert get_source_metrics(["eventCount", "eventsPerSession"]) == [
+        "eventCount",
+        "sessions",
+    ]
+
+
+def test_plan_coalesces_subset_reports():
+    plans = plan_reports(
+        {
+            "by_country": {"dimensions": ["country"], "metrics": ["eventCount"]},
+            "by_browser": {
+                "dimensions": ["country", "browser"],
+                "metrics": ["activeUsers"],
+            },
+            "by_city": {"dimensions": ["city"], "metrics": ["eventCount"]},
+        }
+    )
+    assert [(plan.reports, plan.metrics) for plan in plans] == [
+        (["by_browser", "by_country"], ["activeUsers", "eventCount"]),
+        (["by_city"], ["eventCount"]),
+    ]
+
+
+def test_plan_respects_metric_limit():
+    fine_metrics = [f"metric{n}" for n in range(MAX_METRICS)]
+    plans = plan_reports(
+        {
+            "fine": {"dimensions": ["country", "browser"], "metrics": fine_metrics},
+            "coarse": {"dimensions": ["country"], "metrics": ["eventCount"]},
+        }
+    )
+    assert [plan.reports for plan in plans] == [["fine"], ["coarse"]]
+
+
+def test_schema_tables_are_not_coalesced():
+    # The session summary only has user metrics and ratios of them.
+    definitions = schema_registry.get_definitions(SCHEMA_PATH)
+    plans = plan_reports(definitions)
+    assert sorted(plan.reports for plan in plans) == [
+        ["ga_user_browser_summary"],
+        ["ga_user_session_summary"],
+    ]
+
+
+def test_derive_report_sums_and_recomputes_ratios():
+    plans = plan_reports(
+        {
+            "fine": {"dimensions": ["country", "browser"], "metrics": ["sessions"]},
+            "coarse": {
+                "dimensions": ["country"],
+                "metrics": ["eventsPerSession", "eventCount"],
+            },
+        },
+        additive_metrics={"sessions", "eventCount"},
+    )
+    assert len(plans) == 1
+    df = derive_report(
+        FINE_DF, plans[0], ["country"], ["eventsPerSession", "eventCount"]
+    )
+    assert df.to_dict("list") == {
+        "country": ["France", "Spain"],
+        "eventsPerSession": [26 / 6, 3.0],
+        "eventCount": [26, 3],
+    }
+
+
+def test_derive_report_keeps_finest_report():
+    plans = plan_reports(
+        {
+            "fine": {"dimensions": ["country", "browser"], "metrics": ["sessions"]},
+            "coarse": {"dimensions": ["country"], "metrics": ["eventCount"]},
+        }
+    )
+    df = derive_report(FINE_DF, plans[0], ["country", "browser"], ["sessions"])
+    assert df.to_dict("list") == {
+        "country": ["France", "France", "Spain"],
+        "browser": ["Chrome", "Firefox", "Safari"],
+        "sessions": [4, 2, 1],
+    }
@@ -0,0 +1,125 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import hashlib
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from include.libs.schema_reg.base_schema_transforms import (
+    get_hash_diff,
+    get_resolve_plan,
+    resolve_schemas,
+    snowflake_load_column_string,
+)
+from include.libs.schema_reg.schema_registry import get_table_schema
+
+TABLE_PROPS = {
+    "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+    "CITY": {
+        "type": "varchar(64)",
+        "description": "source_order=2",
+        "default": "unknown",
+    },
+    "DATE": {"type": "date", "description": "source_order=3"},
+    "SESSIONS": {"type": "int", "description": "source_order=4"},
+    "insert_timestamp": {"type": "timestamp_ntz", "description": None},
+    "hash_diff": {
+        "type": "varchar(128)",
+        "columns": ["COUNTRY", "CITY", "DATE"],
+        "algorithm": "MD5",
+        "description": None,
+    },
+}
+
+
+def md5(value):
+    return hashlib.md5(value.encode("utf-8")).hexdigest()
+
+
+def test_get_hash_diff_matches_snowflake_coalesce():
+    df = pd.DataFrame(
+        {
+            "country": ["United States", None],
+            "city": [None, "Paris"],
+            "date": ["2022-01-01", "2022-01-02"],
+            "sessions": [1, 2],
+        }
+    )
+    assert get_hash_diff(df, TABLE_PROPS).tolist() == [
+        md5("United Statesunknown2022-01-01"),
+        md5("missing_valueParis2022-01-02"),
+    ]
+
+
+def test_get_hash_diff_of_missing_column():
+    df = pd.DataFrame({"country": ["France"], "date": ["2022-01-01"]})
+    assert get_hash_diff(df, TABLE_PROPS).tolist() == [md5("Franceunknown2022-01-01")]
+
+
+def test_get_hash_diff_rejects_unknown_algorithm():
+    props = dict(TABLE_PROPS, hash_diff=dict(TABLE_PROPS["hash_diff"], algorithm="X"))
+    with pytest.raises(ValueError):
+        get_hash_diff(pd.DataFrame({"country": ["France"]}), props)
+
+
+def test_snowflake_load_column_string_with_hash_diff():
+    assert snowflake_load_column_string(TABLE_PROPS) == "$1,$2,$3,$4"
+    assert (
+        snowflake_load_column_string(TABLE_PROPS, include_hash_diff=True)
+        == "$1,$2,$3,$4,$5"
+    )
+
+
+def test_resolve_schemas_orders_renames_and_fills_columns():
+    props = {
+        "SESSIONS": {"type": "int", "description": "source_order=3"},
+        "COUNTRY": {
+            "type": "varchar(64)",
+            "description": "source_order=1",
+            "default_source": "source=countryId",
+        },
+        "CITY": {"type": "varchar(64)", "description": "source_order=2"},
+        "IS_NEW": {"type": "boolean", "description": "source_order=4"},
+        "LANGUAGE": {
+            "type": "varchar(64)",
+            "description": "source_order=5",
+            "default": "en",
+        },
+        "insert_timestamp": {"type": "timestamp_ntz", "description": None},
+    }
+    df = pd.DataFrame({"SESSIONS": [1, 2], "countryId": ["US", "FR"], "x": [0, 0]})
+    resolved = resolve_schemas(df, props)
+    assert resolved.columns.tolist() == [
+        "country",
+        "city",
+        "sessions",
+        "is_new",
+        "language",
+    ]
+    assert resolved["country"].tolist() == ["US", "FR"]
+    assert resolved["city"].tolist() == [None, None]
+    assert resolved["is_new"].tolist() == [False, False]
+    assert resolved["language"].tolist() == ["en", "en"]
+    assert df.columns.tolist() == ["SESSIONS", "countryId", "x"]
+
+
+def test_resolve_schemas_of_missing_numeric_column():
+    df = pd.DataFrame({"country": ["US"]})
+    resolved = resolve_schemas(df, TABLE_PROPS)
+    assert resolved.columns.tolist() == ["country", "city", "date", "sessions"]
+    assert np.isnan(resolved["sessions"][0])
+    assert resolved["city"][0] == "unknown"
+
+
+def test_resolve_schemas_without_schema_columns():
+    with pytest.raises(ValueError):
+        resolve_schemas(pd.DataFrame({"x": [1]}), TABLE_PROPS)
+
+
+def test_get_resolve_plan_is_cached_per_table_schema():
+    table_schema = get_table_schema(TABLE_PROPS)
+    assert get_resolve_plan(table_schema) is get_resolve_plan(table_schema)
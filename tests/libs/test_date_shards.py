@@ -0,0 +1,72 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from datetime import date
+
+import pytest
+
+from include.libs.date_ranges.date_shards import resolve_ga_date, split_date_range
+
+TODAY = date(2022, 3, 15)
+
+
+@pytest.mark.parametrize(
+    "value, expected",
+    [
+        ("2022-01-31", date(2022, 1, 31)),
+        ("today", TODAY),
+        ("yesterday", date(2022, 3, 14)),
+        ("30daysAgo", date(2022, 2, 13)),
+        (date(2021, 1, 1), date(2021, 1, 1)),
+    ],
+)
+def test_resolve_ga_date(value, expected):
+    assert resolve_ga_date(value, today=TODAY) == expected
+
+
+def test_resolve_ga_date_rejects_unknown_format():
+    with pytest.raises(ValueError):
+        resolve_ga_date("last week", today=TODAY)
+
+
+def test_split_by_day():
+    assert split_date_range("2022-01-30", "2022-02-01", "day") == [
+        (date(2022, 1, 30), date(2022, 1, 30)),
+        (date(2022, 1, 31), date(2022, 1, 31)),
+        (date(2022, 2, 1), date(2022, 2, 1)),
+    ]
+
+
+def test_split_by_week_aligns_on_monday():
+    # 2022-01-05 is a Wednesday
+    assert split_date_range("2022-01-05", "2022-01-20", "week") == [
+        (date(2022, 1, 5), date(2022, 1, 9)),
+        (date(2022, 1, 10), date(2022, 1, 16)),
+        (date(2022, 1, 17), date(2022, 1, 20)),
+    ]
+
+
+def test_split_by_month_across_year_end():
+    assert split_date_range("2021-11-15", "2022-01-10", "month") == [
+        (date(2021, 11, 15), date(2021, 11, 30)),
+        (date(2021, 12, 1), date(2021, 12, 31)),
+        (date(2022, 1, 1), date(2022, 1, 10)),
+    ]
+
+
+def test_split_relative_dates():
+    assert split_date_range("2daysAgo", "yesterday", "day", today=TODAY) == [
+        (date(2022, 3, 13), date(2022, 3, 13)),
+        (date(2022, 3, 14), date(2022, 3, 14)),
+    ]
+
+
+@pytest.mark.parametrize(
+    "start_ds, end_ds, shard_by",
+    [("2022-01-02", "2022-01-01", "day"), ("2022-01-01", "2022-01-02", "year")],
+)
+def test_split_invalid(start_ds, end_ds, shard_by):
+    with pytest.raises(ValueError):
+        split_date_range(start_ds, end_ds, shard_by)
@@ -0,0 +1,87 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import json
+
+import pytest
+
+from include.libs.schema_reg.schema_registry import (
+    SchemaRegistry,
+    TableSchema,
+    get_table_schema,
+)
+
+TABLE_DEF = {
+    "properties": {
+        "CITY": {"type": "varchar(64)", "description": "source_order=2"},
+        "COUNTRY": {
+            "type": "varchar(64)",
+            "description": "source_order=1",
+            "default_source": "source=countryId",
+        },
+        "insert_timestamp": {"type": "timestamp_ntz", "description": None},
+        "hash_diff": {
+            "type": "varchar(128)",
+            "columns": ["COUNTRY", "CITY"],
+            "algorithm": "SHA1",
+            "description": None,
+        },
+    },
+    "dimensions": ["countryId", "city"],
+    "metrics": [],
+    "cluster_keys": {"columns": ["COUNTRY"]},
+}
+
+
+def write_schema(path, definitions):
+    with open(path, "w") as f:
+        json.dump({"definitions": definitions}, f)
+
+
+def test_table_schema_from_def():
+    table_schema = TableSchema.from_def("table", TABLE_DEF)
+    assert [col.name for col in table_schema.source_columns] == ["COUNTRY", "CITY"]
+    assert table_schema.get_column("COUNTRY").source == "countryId"
+    assert table_schema.get_column("insert_timestamp").order == -1
+    assert table_schema.hash_columns == ("COUNTRY", "CITY")
+    assert table_schema.hash_algorithm == "SHA1"
+    assert table_schema.cluster_keys == ("COUNTRY",)
+    assert table_schema.schema_types["countryId"] == "varchar(64)"
+    assert table_schema.load_column_string() == "$2,$1"
+    assert table_schema.load_column_string(include_hash_diff=True) == "$2,$1,$3"
+    assert not hasattr(table_schema, "__dict__")
+
+
+def test_get_table_schema_passes_through_parsed_schemas():
+    table_schema = get_table_schema(TABLE_DEF["properties"])
+    assert get_table_schema(table_schema) is table_schema
+
+
+def test_load_column_string_without_source_order():
+    props = {"CITY": {"type": "varchar(64)"}}
+    with pytest.raises(ValueError):
+        get_table_schema(props).load_column_string()
+
+
+def test_schema_registry_parses_files_once(tmpdir):
+    path = str(tmpdir.join("schema.json"))
+    write_schema(path, {"table": TABLE_DEF})
+    registry = SchemaRegistry()
+    tables = registry.get_tables(path)
+    assert registry.get_tables(path) is tables
+    assert registry.get_table(path, "table") is tables["table"]
+    assert registry.get_definitions(path)["table"] == TABLE_DEF
+
+
+def test_schema_registry_reloads_changed_files(tmpdir):
+    path = str(tmpdir.join("schema.json"))
+    write_schema(path, {"table": TABLE_DEF})
+    registry = SchemaRegistry()
+    tables = registry.get_tables(path)
+    write_schema(path, {"table": TABLE_DEF, "other_table": TABLE_DEF})
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10**9))
+    assert sorted(registry.get_tables(path)) == ["other_table", "table"]
+    assert registry.get_tables(path) is not tables
@@ -0,0 +1,66 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import time
+from datetime import timedelta
+
+import mock
+
+from include.libs.metrics.stage_metrics import StageMetrics, incr, timer
+
+MODULE = "include.libs.metrics.stage_metrics"
+
+
+def test_emits_tagged_timings_and_counts():
+    metrics = StageMetrics("extract", tags={"property_id": 123, "table": None})
+    with mock.patch(f"{MODULE}.Stats") as stats:
+        metrics.add_timing("upload", 1.5)
+        metrics.incr("rows", 10)
+    stats.timing.assert_called_once_with(
+        "google_analytics.extract.upload",
+        timedelta(seconds=1.5),
+        tags={"property_id": "123"},
+    )
+    stats.incr.assert_called_once_with(
+        "google_analytics.extract.rows", 10, tags={"property_id": "123"}
+    )
+    assert metrics.summary() == {
+        "tags": {"property_id": "123"},
+        "seconds": {"upload": 1.5},
+        "counts": {"rows": 10},
+    }
+
+
+def test_timer_excludes_nested_stage():
+    metrics = StageMetrics("extract")
+
+    def slow_pages():
+        for page in range(2):
+            time.sleep(0.05)
+            yield page
+
+    with metrics.timer("serialize", exclude="read_pages"):
+        for _ in metrics.timed_iter("read_pages", slow_pages()):
+            pass
+    seconds = metrics.summary()["seconds"]
+    assert seconds["read_pages"] >= 0.1
+    assert seconds["serialize"] < 0.05
+
+
+def test_merge_adds_without_emitting():
+    metrics = StageMetrics("extract")
+    metrics.incr("files")
+    with mock.patch(f"{MODULE}.Stats") as stats:
+        metrics.merge({"seconds": {"upload": 2.0}, "counts": {"files": 2}})
+    stats.timing.assert_not_called()
+    stats.incr.assert_not_called()
+    summary = metrics.summary()
+    assert summary["seconds"] == {"upload": 2.0}
+    assert summary["counts"] == {"files": 3}
+
+
+def test_helpers_without_metrics():
+    with timer(None, "upload"):
+        incr(None, "rows", 10)
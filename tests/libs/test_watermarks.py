@@ -0,0 +1,70 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from datetime import date
+
+import mock
+import pytest
+
+from include.libs.date_ranges.watermarks import (
+    JsonWatermarkStore,
+    VariableWatermarkStore,
+    WatermarkStore,
+    get_incremental_range,
+)
+
+TODAY = date(2022, 3, 15)
+
+
+@pytest.mark.parametrize(
+    "watermark, lookback_days, expected",
+    [
+        (None, 0, (date(2022, 3, 1), date(2022, 3, 14))),
+        (date(2022, 3, 10), 0, (date(2022, 3, 11), date(2022, 3, 14))),
+        (date(2022, 3, 10), 3, (date(2022, 3, 8), date(2022, 3, 14))),
+        (date(2022, 3, 2), 30, (date(2022, 3, 1), date(2022, 3, 14))),
+        (date(2022, 3, 14), 3, None),
+        (date(2022, 3, 20), 0, None),
+    ],
+)
+def test_get_incremental_range(watermark, lookback_days, expected):
+    assert (
+        get_incremental_range(
+            watermark, "2022-03-01", "yesterday", lookback_days, today=TODAY
+        )
+        == expected
+    )
+
+
+def test_json_watermark_store(tmp_path):
+    path = tmp_path / "watermarks.json"
+    store = JsonWatermarkStore(str(path))
+    assert store.get("123", "table_a") is None
+    store.set("123", "table_a", date(2022, 3, 14))
+    store.set("123", "table_b", date(2022, 3, 1))
+    reopened = JsonWatermarkStore(str(path))
+    assert reopened.get("123", "table_a") == date(2022, 3, 14)
+    assert reopened.get("123", "table_b") == date(2022, 3, 1)
+    assert reopened.get("456", "table_a") is None
+    assert os.listdir(tmp_path) == ["watermarks.json"]
+
+
+@mock.patch("include.libs.date_ranges.watermarks.Variable")
+def test_variable_watermark_store(variable):
+    variable.get.return_value = "2022-03-14"
+    store = VariableWatermarkStore(prefix="wm")
+    assert store.get("123", "table_a") == date(2022, 3, 14)
+    variable.get.assert_called_once_with("wm__123__table_a", default_var=None)
+    store.set("123", "table_a", date(2022, 3, 15))
+    variable.set.assert_called_once_with("wm__123__table_a", "2022-03-15")
+
+
+def test_incomplete_watermark_store_fails_on_creation():
+    class GetOnlyWatermarkStore(WatermarkStore):
+        def get(self, property_id, table):
+            return None
+
+    with pytest.raises(TypeError):
+        GetOnlyWatermarkStore()
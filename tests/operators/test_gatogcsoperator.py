@@ -1,3 +1,6 @@
+import gzip
+import io
+import json
 import os, sys
 
 myPath = os.path.dirname(os.path.abspath(__file__))
@@ -6,8 +9,24 @@ sys.path.insert(0, myPath + "/../../")
 import mock
 import pytest
 import pandas as pd
+from datetime import date
 
-from include.operators.google.analytics.gatogcsoperator import GAToGCSOperator
+from airflow.exceptions import (
+    AirflowException,
+    AirflowFailException,
+    AirflowSkipException,
+    TaskDeferred,
+)
+from include.hooks.google.analytics.analytics_data import DEFAULT_PAGE_SIZE
+from include.operators.google.analytics.gatogcsoperator import (
+    GAToGCSBatchOperator,
+    GAToGCSMultiPropertyOperator,
+    GAToGCSOperator,
+)
+from include.libs.date_ranges.watermarks import JsonWatermarkStore
+from include.libs.schema_reg.schema_registry import get_table_schema
+from tests.fakes.fake_analytics_data_server import FakeAnalyticsDataServer
+from tests.fakes.fake_gcs import FakeGCSHook
 from google.analytics.data_v1beta.types import Dimension
 from google.analytics.data_v1beta.types import Metric
 from google.analytics.data_v1beta.types import Row
@@ -44,6 +63,26 @@ REPORT_DF = pd.DataFrame(
 )
 
 
+class FakeBlobWriter(io.BytesIO):
+    """
+    Keeps what a streamed upload wrote once the writer is closed.
+    """
+
+    def close(self):
+        if not self.closed:
+            self.uploaded = self.getvalue()
+        super().close()
+
+
+def decompress(data, compression):
+    if compression == "gzip":
+        return gzip.decompress(data)
+    if compression == "zstd":
+        zstandard = pytest.importorskip("zstandard")
+        return zstandard.ZstdDecompressor().stream_reader(io.BytesIO(data)).read()
+    return data
+
+
 @pytest.fixture()
 def mock_operator():
     with mock.patch(
@@ -67,6 +106,14 @@ def mock_operator():
         yield ga_to_gcs
 
 
+@pytest.fixture()
+def mock_connection():
+    with mock.patch(
+        "airflow.providers.google.common.hooks.base_google.GoogleBaseHook.get_connection"
+    ) as conn:
+        yield conn
+
+
 @pytest.fixture()
 def mock_ga_data_hook():
     with mock.patch(
@@ -91,6 +138,9 @@ class TestGAToGCSOperator:
         assert mock_operator.ga_conn_id == GA_CONN_ID
         assert mock_operator.gcs_bucket_name == GCS_BUCKET
 
+    def test_init_pages_by_default(self, mock_operator):
+        assert mock_operator.page_size == DEFAULT_PAGE_SIZE
+
     def test_get_report_to_df(self, mock_ga_data_hook, mock_operator):
         mock_operator._get_report_df(
             mock_ga_data_hook, PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS
@@ -106,6 +156,7 @@ class TestGAToGCSOperator:
         mock_gcs_hook.upload.assert_called_once()
 
     def test__upload_to_gcs(self, mock_gcs_hook, mock_ga_data_hook, mock_operator):
+        mock_operator.page_size = None
         mock_operator._upload_to_gcs(
             gcs_hook=mock_gcs_hook,
             ga_data_hook=mock_ga_data_hook,
@@ -125,3 +176,721 @@ class TestGAToGCSOperator:
     def test_execute(self, ga_to_gcs_upload_to_gcs, mock_operator):
         mock_operator.execute(None)
         mock_operator._upload_to_gcs.assert_called_once()
+
+    def test_execute_returns_metrics(self, mock_connection, mock_operator):
+        mock_operator.page_size = 2
+        fake_gcs = FakeGCSHook()
+        with FakeAnalyticsDataServer(row_count=5) as server, mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GCSHook",
+            return_value=fake_gcs,
+        ), mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GoogleAnalyticsDataHook.get_conn",
+            side_effect=server.sync_client,
+        ):
+            summary = mock_operator.execute(None)
+        assert summary["tags"] == {
+            "property_id": PROPERTY_ID,
+            "table": TASK_ID,
+            "task_id": TASK_ID,
+        }
+        assert summary["counts"] == {
+            "pages": 3,
+            "rows": 5,
+            "files": 1,
+            "bytes": fake_gcs.sizes[(GCS_BUCKET, GCS_FILE_PATH)],
+        }
+        seconds = summary["seconds"]
+        assert {"run_report", "build_df", "read_pages", "serialize", "upload"} <= set(
+            seconds
+        )
+        # Pages are fetched while serializing, but only counted in read_pages.
+        assert (
+            seconds["read_pages"] + seconds["serialize"] + seconds["upload"]
+            <= seconds["execute"]
+        )
+
+    def test__upload_to_gcs_paged(
+        self, mock_gcs_hook, mock_ga_data_hook, mock_operator
+    ):
+        mock_operator.page_size = 1
+        mock_ga_data_hook.iter_report_df.return_value = iter(
+            [REPORT_DF.iloc[:1], REPORT_DF.iloc[1:]]
+        )
+        mock_operator._upload_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            ga_data_hook=mock_ga_data_hook,
+            property_id=PROPERTY_ID,
+            gcs_dest_path=GCS_FILE_PATH,
+            dimensions=DIMENSIONS,
+            metrics=METRICS,
+            start_ds=START_DS,
+            end_ds=END_DS,
+        )
+        mock_ga_data_hook.iter_report_df.assert_called_once_with(
+            PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS, 1
+        )
+        mock_ga_data_hook.get_report_df.assert_not_called()
+        mock_gcs_hook.upload.assert_called_once()
+
+    def test__upload_dfs_to_gcs_as_csv(self, mock_gcs_hook, mock_operator):
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            uploaded["df"] = pd.read_csv(filename, dtype=str)
+
+        mock_gcs_hook.upload.side_effect = read_upload
+        mock_operator._upload_dfs_to_gcs_as_csv(
+            gcs_hook=mock_gcs_hook,
+            dfs=[REPORT_DF.iloc[:1], REPORT_DF.iloc[1:]],
+            gcs_dest_path=GCS_FILE_PATH,
+        )
+        assert uploaded["df"].equals(REPORT_DF)
+
+    def test_get_report_to_df_with_table_schema(self, mock_ga_data_hook, mock_operator):
+        mock_operator.table_schema = {
+            "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+            "SESSIONS": {"type": "int", "description": "source_order=2"},
+        }
+        mock_operator._get_report_df(
+            mock_ga_data_hook, PROPERTY_ID, DIMENSIONS, METRICS, START_DS, END_DS
+        )
+        mock_ga_data_hook.get_report_df.assert_called_once_with(
+            PROPERTY_ID,
+            DIMENSIONS,
+            METRICS,
+            START_DS,
+            END_DS,
+            schema_types={"COUNTRY": "varchar(64)", "SESSIONS": "int"},
+        )
+
+    def test__upload_shards_to_gcs(
+        self, mock_gcs_hook, mock_ga_data_hook, mock_operator
+    ):
+        mock_operator.shard_by = "day"
+        mock_operator.page_size = None
+        mock_gcs_hook.exists.side_effect = lambda bucket, path: path.endswith(
+            "_20220102_20220102.csv"
+        )
+        mock_ga_data_hook.get_report_df.return_value = REPORT_DF
+        mock_operator._upload_shards_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            ga_data_hook=mock_ga_data_hook,
+            property_id=PROPERTY_ID,
+            gcs_dest_path="table/table_20220104T000000.csv",
+            dimensions=DIMENSIONS,
+            metrics=METRICS,
+            start_ds="2022-01-01",
+            end_ds="2022-01-03",
+        )
+        uploaded = sorted(
+            call.kwargs["object_name"] for call in mock_gcs_hook.upload.call_args_list
+        )
+        assert uploaded == [
+            "table/table_20220104T000000_20220101_20220101.csv",
+            "table/table_20220104T000000_20220103_20220103.csv",
+        ]
+        requested = sorted(
+            call.args[3:5] for call in mock_ga_data_hook.get_report_df.call_args_list
+        )
+        assert requested == [
+            ("2022-01-01", "2022-01-01"),
+            ("2022-01-03", "2022-01-03"),
+        ]
+
+    def test__upload_shards_to_gcs_reports_failed_shards(
+        self, mock_gcs_hook, mock_ga_data_hook, mock_operator
+    ):
+        mock_operator.shard_by = "month"
+        mock_operator.page_size = None
+        mock_gcs_hook.exists.return_value = False
+        mock_ga_data_hook.get_report_df.side_effect = [REPORT_DF, ValueError("API")]
+        with pytest.raises(AirflowException, match="1 of 2 shards failed"):
+            mock_operator._upload_shards_to_gcs(
+                gcs_hook=mock_gcs_hook,
+                ga_data_hook=mock_ga_data_hook,
+                property_id=PROPERTY_ID,
+                gcs_dest_path=GCS_FILE_PATH,
+                dimensions=DIMENSIONS,
+                metrics=METRICS,
+                start_ds="2022-01-15",
+                end_ds="2022-02-15",
+            )
+
+    def test_get_dest_path_with_suffix(self, mock_operator):
+        assert (
+            mock_operator._get_dest_path_with_suffix("a/b/table_ts.csv.gz", "part1")
+            == "a/b/table_ts_part1.csv.gz"
+        )
+        assert mock_operator._get_dest_path_with_suffix("out", "x") == "out_x"
+
+    def test_init_rejects_unknown_shard_by(self):
+        with pytest.raises(ValueError):
+            GAToGCSOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                gcs_bucket_name=GCS_BUCKET,
+                shard_by="year",
+            )
+
+    def test__upload_dfs_to_gcs_as_parquet(self, mock_gcs_hook, mock_operator):
+        pq = pytest.importorskip("pyarrow.parquet")
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            uploaded["table"] = pq.read_table(filename)
+            uploaded["compression"] = (
+                pq.ParquetFile(filename).metadata.row_group(0).column(0).compression
+            )
+
+        mock_operator.output_format = "parquet"
+        mock_operator.compression = "zstd"
+        mock_gcs_hook.upload.side_effect = read_upload
+        typed_df = REPORT_DF.astype({"activeUsers": "int64", "sessions": "float64"})
+        mock_operator._upload_dfs_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            dfs=[typed_df.iloc[:1], typed_df.iloc[1:]],
+            gcs_dest_path=GCS_FILE_PATH,
+        )
+        table = uploaded["table"]
+        assert table.num_rows == 2
+        assert str(table.schema.field("date").type) == "date32[day]"
+        assert str(table.schema.field("activeUsers").type) == "int64"
+        assert str(table.schema.field("sessions").type) == "double"
+        assert uploaded["compression"] == "ZSTD"
+
+    @pytest.mark.parametrize(
+        "output_format, compression",
+        [("xml", None), ("csv", "snappy"), ("parquet", "lz4")],
+    )
+    def test_init_rejects_unknown_output(self, output_format, compression):
+        with pytest.raises(ValueError):
+            GAToGCSOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                gcs_bucket_name=GCS_BUCKET,
+                output_format=output_format,
+                compression=compression,
+            )
+
+    @pytest.mark.parametrize("compression", [None, "gzip", "zstd"])
+    def test__stream_dfs_to_gcs_as_csv(self, mock_gcs_hook, mock_operator, compression):
+        writer = FakeBlobWriter()
+        blob = mock_gcs_hook.get_conn.return_value.bucket.return_value.blob
+        blob.return_value.open.return_value = writer
+        mock_operator.stream_upload = True
+        mock_operator.compression = compression
+        mock_operator._upload_dfs_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            dfs=iter([REPORT_DF.iloc[:1], REPORT_DF.iloc[1:]]),
+            gcs_dest_path=GCS_FILE_PATH,
+        )
+        blob.assert_called_once_with(GCS_FILE_PATH)
+        assert blob.return_value.open.call_args.kwargs["ignore_flush"] is True
+        mock_gcs_hook.upload.assert_not_called()
+        uploaded = pd.read_csv(
+            io.BytesIO(decompress(writer.uploaded, compression)), dtype=str
+        )
+        assert uploaded.equals(REPORT_DF)
+
+    def test__stream_dfs_to_gcs_as_parquet(self, mock_gcs_hook, mock_operator):
+        pq = pytest.importorskip("pyarrow.parquet")
+        writer = FakeBlobWriter()
+        blob = mock_gcs_hook.get_conn.return_value.bucket.return_value.blob
+        blob.return_value.open.return_value = writer
+        mock_operator.stream_upload = True
+        mock_operator.output_format = "parquet"
+        mock_operator._upload_df_to_gcs(
+            gcs_hook=mock_gcs_hook, df=REPORT_DF, gcs_dest_path=GCS_FILE_PATH
+        )
+        table = pq.read_table(io.BytesIO(writer.uploaded))
+        assert table.num_rows == 2
+        assert str(table.schema.field("date").type) == "date32[day]"
+
+    def test__upload_df_to_gcs_as_csv_compressed(self, mock_gcs_hook, mock_operator):
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            with open(filename, "rb") as f:
+                uploaded["data"] = f.read()
+
+        mock_operator.compression = "gzip"
+        mock_gcs_hook.upload.side_effect = read_upload
+        mock_operator._upload_df_to_gcs(
+            gcs_hook=mock_gcs_hook, df=REPORT_DF, gcs_dest_path=GCS_FILE_PATH
+        )
+        uploaded_df = pd.read_csv(
+            io.BytesIO(gzip.decompress(uploaded["data"])), dtype=str
+        )
+        assert uploaded_df.equals(REPORT_DF)
+
+    def _read_parts(self, mock_gcs_hook):
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename=None, data=None, **kwargs):
+            if data is not None:
+                uploaded[object_name] = json.loads(data)
+            else:
+                uploaded[object_name] = pd.read_csv(filename, dtype=str)
+
+        mock_gcs_hook.upload.side_effect = read_upload
+        return uploaded
+
+    def test__upload_parts_to_gcs_by_rows(self, mock_gcs_hook, mock_operator):
+        uploaded = self._read_parts(mock_gcs_hook)
+        df = pd.concat([REPORT_DF] * 4, ignore_index=True)
+        mock_operator.max_rows_per_file = 3
+        mock_operator._upload_dfs_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            dfs=iter([df.iloc[:2], df.iloc[2:4], df.iloc[4:7], df.iloc[7:]]),
+            gcs_dest_path="table/table_ts.csv",
+        )
+        manifest = uploaded.pop("table/table_ts_manifest.json")
+        assert [(part["path"], part["rows"]) for part in manifest["files"]] == [
+            ("table/table_ts_part00001.csv", 3),
+            ("table/table_ts_part00002.csv", 3),
+            ("table/table_ts_part00003.csv", 2),
+        ]
+        assert manifest["rows"] == 8
+        assert all(part["bytes"] > 0 for part in manifest["files"])
+        parts = pd.concat(
+            [uploaded[part["path"]] for part in manifest["files"]], ignore_index=True
+        )
+        assert parts.equals(df)
+        # The manifest is only uploaded once every part is.
+        assert (
+            mock_gcs_hook.upload.call_args.kwargs["object_name"]
+            == "table/table_ts_manifest.json"
+        )
+
+    @mock.patch("include.operators.google.analytics.gatogcsoperator.PART_SLICE_ROWS", 1)
+    def test__upload_parts_to_gcs_by_bytes(self, mock_gcs_hook, mock_operator):
+        uploaded = self._read_parts(mock_gcs_hook)
+        df = pd.concat([REPORT_DF] * 5, ignore_index=True)
+        mock_operator.max_bytes_per_file = 1
+        mock_operator._upload_df_to_gcs(
+            gcs_hook=mock_gcs_hook, df=df, gcs_dest_path="table_ts.csv"
+        )
+        manifest = uploaded.pop("table_ts_manifest.json")
+        assert len(manifest["files"]) == 10
+        assert all(len(part_df) == 1 for part_df in uploaded.values())
+
+    def test__upload_parts_to_gcs_reports_failed_parts(
+        self, mock_gcs_hook, mock_operator
+    ):
+        def fail_second_part(bucket_name, object_name, filename=None, **kwargs):
+            if object_name.endswith("part00002.csv"):
+                raise ValueError("GCS")
+
+        mock_gcs_hook.upload.side_effect = fail_second_part
+        mock_operator.max_rows_per_file = 1
+        with pytest.raises(AirflowException, match="1 of 2 parts failed"):
+            mock_operator._upload_df_to_gcs(
+                gcs_hook=mock_gcs_hook, df=REPORT_DF, gcs_dest_path="table_ts.csv"
+            )
+        uploaded = [
+            call.kwargs["object_name"] for call in mock_gcs_hook.upload.call_args_list
+        ]
+        assert "table_ts_manifest.json" not in uploaded
+
+    def test__upload_shards_to_gcs_skips_shards_with_manifest(
+        self, mock_gcs_hook, mock_ga_data_hook, mock_operator
+    ):
+        mock_operator.shard_by = "day"
+        mock_operator.max_rows_per_file = 100
+        mock_gcs_hook.exists.return_value = True
+        mock_operator._upload_shards_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            ga_data_hook=mock_ga_data_hook,
+            property_id=PROPERTY_ID,
+            gcs_dest_path="table_ts.csv",
+            dimensions=DIMENSIONS,
+            metrics=METRICS,
+            start_ds="2022-01-01",
+            end_ds="2022-01-01",
+        )
+        mock_gcs_hook.exists.assert_called_once_with(
+            GCS_BUCKET, "table_ts_20220101_20220101_manifest.json"
+        )
+        mock_ga_data_hook.get_report_df.assert_not_called()
+
+    @mock.patch(
+        "include.operators.google.analytics.gatogcsoperator.GAToGCSOperator._upload_to_gcs"
+    )
+    def test_execute_incremental(self, upload_to_gcs, mock_operator, tmp_path):
+        store = JsonWatermarkStore(str(tmp_path / "watermarks.json"))
+        store.set(PROPERTY_ID, "table", date(2022, 3, 10))
+        mock_operator.watermark_store = store
+        mock_operator.watermark_table = "table"
+        mock_operator.lookback_days = 2
+        mock_operator.start_ds = "2022-01-01"
+        mock_operator.end_ds = "2022-03-14"
+        mock_operator.execute(None)
+        assert upload_to_gcs.call_args.kwargs["start_ds"] == "2022-03-09"
+        assert upload_to_gcs.call_args.kwargs["end_ds"] == "2022-03-14"
+        assert store.get(PROPERTY_ID, "table") == date(2022, 3, 14)
+
+        with pytest.raises(AirflowSkipException):
+            mock_operator.execute(None)
+        upload_to_gcs.assert_called_once()
+
+    @mock.patch(
+        "include.operators.google.analytics.gatogcsoperator.GAToGCSOperator._upload_to_gcs"
+    )
+    def test_execute_incremental_without_advancing_watermark(
+        self, upload_to_gcs, mock_operator, tmp_path
+    ):
+        store = JsonWatermarkStore(str(tmp_path / "watermarks.json"))
+        store.set(PROPERTY_ID, TASK_ID, date(2022, 3, 10))
+        mock_operator.watermark_store = store
+        mock_operator.advance_watermark = False
+        mock_operator.end_ds = "2022-03-14"
+        summary = mock_operator.execute(None)
+        assert summary["end_ds"] == "2022-03-14"
+        assert store.get(PROPERTY_ID, TASK_ID) == date(2022, 3, 10)
+
+    def test_init_rejects_incremental_without_paging(self):
+        with pytest.raises(ValueError, match="page_size or shard_by"):
+            GAToGCSOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                gcs_bucket_name=GCS_BUCKET,
+                page_size=None,
+                watermark_store=mock.Mock(),
+            )
+
+    @mock.patch(
+        "include.operators.google.analytics.gatogcsoperator.GAToGCSOperator._upload_to_gcs",
+        side_effect=ValueError("API"),
+    )
+    def test_execute_incremental_keeps_watermark_on_failure(
+        self, upload_to_gcs, mock_operator, tmp_path
+    ):
+        store = JsonWatermarkStore(str(tmp_path / "watermarks.json"))
+        mock_operator.watermark_store = store
+        mock_operator.end_ds = "2022-03-14"
+        with pytest.raises(ValueError):
+            mock_operator.execute(None)
+        assert store.get(PROPERTY_ID, TASK_ID) is None
+
+    def test__upload_df_to_gcs_with_hash_diff(self, mock_gcs_hook, mock_operator):
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            uploaded["df"] = pd.read_csv(filename, dtype=str)
+
+        mock_gcs_hook.upload.side_effect = read_upload
+        mock_operator.compute_hash_diff = True
+        mock_operator.table_schema = {
+            "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+            "DATE": {"type": "date", "description": "source_order=2"},
+            "hash_diff": {"columns": ["COUNTRY", "DATE"], "algorithm": "MD5"},
+        }
+        mock_operator._upload_df_to_gcs(
+            gcs_hook=mock_gcs_hook, df=REPORT_DF, gcs_dest_path=GCS_FILE_PATH
+        )
+        df = uploaded["df"]
+        assert df.columns.tolist()[-1] == "hash_diff"
+        assert df["hash_diff"].tolist() == [
+            "f6d97f83ef6891b06194a59e5a31069b",
+            "d996107e36de4fd4254fd1aa8cf908cd",
+        ]
+
+    def test_table_schema_is_parsed_once(self, mock_operator):
+        mock_operator.compute_hash_diff = True
+        mock_operator.table_schema = {
+            "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+            "DATE": {"type": "date", "description": "source_order=2"},
+            "hash_diff": {"columns": ["COUNTRY", "DATE"], "algorithm": "MD5"},
+        }
+        with mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.get_table_schema",
+            wraps=get_table_schema,
+        ) as parse_table_schema:
+            for _ in range(3):
+                mock_operator._get_report_kwargs()
+                mock_operator._add_hash_diff(REPORT_DF, mock_operator.table_schema)
+        parse_table_schema.assert_called_once_with(mock_operator.table_schema)
+
+    def test_execute_deferrable(self, mock_operator, tmp_path):
+        mock_operator.deferrable = True
+        mock_operator.page_size = 1000
+        mock_operator.gcs_dest_path = "table/table_ts.csv"
+        mock_operator.watermark_store = JsonWatermarkStore(
+            str(tmp_path / "watermarks.json")
+        )
+        mock_operator.end_ds = "2022-03-14"
+        with pytest.raises(TaskDeferred) as deferred:
+            mock_operator.execute(None)
+        trigger = deferred.value.trigger
+        assert deferred.value.method_name == "execute_complete"
+        assert trigger.part_path_format.format(part=1) == "table/table_ts_part00001.csv"
+        assert trigger.manifest_path == "table/table_ts_manifest.json"
+        assert trigger.page_size == 1000
+        assert trigger.end_ds == "2022-03-14"
+        assert mock_operator.watermark_store.get(PROPERTY_ID, TASK_ID) is None
+
+        summary = mock_operator.execute_complete(
+            None,
+            {
+                "status": "success",
+                "manifest_path": trigger.manifest_path,
+                "rows": 2,
+                "files": 1,
+                "metrics": {"seconds": {"upload": 0.5}, "counts": {"files": 1}},
+            },
+            **deferred.value.kwargs,
+        )
+        assert summary["seconds"] == {"upload": 0.5}
+        assert summary["counts"] == {"files": 1}
+        assert summary["tags"]["property_id"] == PROPERTY_ID
+        assert mock_operator.watermark_store.get(PROPERTY_ID, TASK_ID) == date(
+            2022, 3, 14
+        )
+
+    @mock.patch(
+        "include.operators.google.analytics.gatogcsoperator.GoogleAnalyticsDataHook"
+    )
+    def test_execute_validates_report_before_deferring(
+        self, ga_data_hook, mock_operator
+    ):
+        mock_operator.deferrable = True
+        mock_operator.validate_report = True
+        ga_data_hook.return_value.validate_report.side_effect = ValueError(
+            "Property GA_Property_Id has no dimensions ['country']"
+        )
+        with pytest.raises(AirflowFailException, match="country"):
+            mock_operator.execute(None)
+        ga_data_hook.return_value.validate_report.assert_called_once_with(
+            PROPERTY_ID, DIMENSIONS, METRICS
+        )
+
+        ga_data_hook.return_value.validate_report.side_effect = None
+        with pytest.raises(TaskDeferred):
+            mock_operator.execute(None)
+
+    def test_execute_complete_raises_trigger_errors(self, mock_operator):
+        with pytest.raises(AirflowException, match="API"):
+            mock_operator.execute_complete(
+                None, {"status": "error", "message": "ValueError: API"}
+            )
+
+    def test_init_rejects_unsupported_deferrable_output(self):
+        with pytest.raises(ValueError):
+            GAToGCSOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                gcs_bucket_name=GCS_BUCKET,
+                output_format="parquet",
+                deferrable=True,
+            )
+
+    @pytest.mark.parametrize(
+        "kwargs",
+        [{"report_cache": mock.Mock()}, {"stream_upload": True}],
+        ids=["report_cache", "stream_upload"],
+    )
+    def test_init_rejects_options_ignored_when_deferrable(self, kwargs):
+        with pytest.raises(ValueError, match="deferrable does not support"):
+            GAToGCSOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                gcs_bucket_name=GCS_BUCKET,
+                deferrable=True,
+                **kwargs,
+            )
+
+
+@pytest.mark.parametrize(
+    "operator_class, kwargs",
+    [
+        (GAToGCSBatchOperator, {"property_id": PROPERTY_ID, "reports": {}}),
+        (GAToGCSMultiPropertyOperator, {"property_ids": [PROPERTY_ID]}),
+    ],
+)
+@pytest.mark.parametrize(
+    "option",
+    [
+        {"deferrable": True},
+        {"shard_by": "day"},
+        {"watermark_store": mock.Mock()},
+    ],
+    ids=["deferrable", "shard_by", "watermark_store"],
+)
+def test_init_rejects_unsupported_options(operator_class, kwargs, option):
+    with pytest.raises(ValueError, match=f"does not support {next(iter(option))}"):
+        operator_class(task_id=TASK_ID, gcs_bucket_name=GCS_BUCKET, **kwargs, **option)
+
+
+class TestGAToGCSBatchOperator:
+    def test__upload_reports_to_gcs(self, mock_gcs_hook, mock_ga_data_hook):
+        reports = {
+            "table_a": {
+                "dimensions": DIMENSIONS,
+                "metrics": METRICS,
+                "gcs_dest_path": "table_a.csv",
+            },
+            "table_b": {
+                "dimensions": DIMENSIONS,
+                "metrics": METRICS,
+                "gcs_dest_path": "table_b.csv",
+                "table_schema": {"SESSIONS": {"type": "int"}},
+            },
+        }
+        operator = GAToGCSBatchOperator(
+            task_id=TASK_ID,
+            property_id=PROPERTY_ID,
+            gcs_bucket_name=GCS_BUCKET,
+            reports=reports,
+        )
+        mock_ga_data_hook.iter_batch_report_df.return_value = iter(
+            [REPORT_DF, REPORT_DF]
+        )
+        operator._upload_reports_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            ga_data_hook=mock_ga_data_hook,
+            property_id=PROPERTY_ID,
+            reports=reports,
+            start_ds=START_DS,
+            end_ds=END_DS,
+        )
+        definitions = mock_ga_data_hook.iter_batch_report_df.call_args.args[1]
+        assert definitions[1]["schema_types"] == {"SESSIONS": "int"}
+        uploaded = [
+            call.kwargs["object_name"] for call in mock_gcs_hook.upload.call_args_list
+        ]
+        assert uploaded == ["table_a.csv", "table_b.csv"]
+
+    def test__upload_reports_to_gcs_coalesced(self, mock_gcs_hook, mock_ga_data_hook):
+        reports = {
+            "by_country": {
+                "dimensions": ["country"],
+                "metrics": ["eventCount"],
+                "gcs_dest_path": "by_country.csv",
+            },
+            "by_browser": {
+                "dimensions": ["country", "browser"],
+                "metrics": ["activeUsers"],
+                "gcs_dest_path": "by_browser.csv",
+            },
+        }
+        operator = GAToGCSBatchOperator(
+            task_id=TASK_ID,
+            property_id=PROPERTY_ID,
+            gcs_bucket_name=GCS_BUCKET,
+            reports=reports,
+            coalesce_reports=True,
+        )
+        mock_ga_data_hook.iter_batch_report_df.return_value = iter(
+            [
+                pd.DataFrame(
+                    {
+                        "country": ["France", "France", "Spain"],
+                        "browser": ["Chrome", "Firefox", "Chrome"],
+                        "activeUsers": [2, 1, 0],
+                        "eventCount": [10, 5, 7],
+                    }
+                )
+            ]
+        )
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            uploaded[object_name] = pd.read_csv(filename)
+
+        mock_gcs_hook.upload.side_effect = read_upload
+        operator._upload_reports_to_gcs(
+            gcs_hook=mock_gcs_hook,
+            ga_data_hook=mock_ga_data_hook,
+            property_id=PROPERTY_ID,
+            reports=reports,
+            start_ds=START_DS,
+            end_ds=END_DS,
+        )
+        definitions = mock_ga_data_hook.iter_batch_report_df.call_args.args[1]
+        assert [
+            (definition["dimensions"], definition["metrics"])
+            for definition in definitions
+        ] == [(["country", "browser"], ["activeUsers", "eventCount"])]
+        assert uploaded["by_country.csv"].to_dict("list") == {
+            "country": ["France", "Spain"],
+            "eventCount": [15, 7],
+        }
+        # Rows without any of the report's metrics are left out, as the API would.
+        assert uploaded["by_browser.csv"].to_dict("list") == {
+            "country": ["France", "France"],
+            "browser": ["Chrome", "Firefox"],
+            "activeUsers": [2, 1],
+        }
+
+
+@pytest.mark.usefixtures("mock_connection")
+class TestGAToGCSMultiPropertyOperator:
+    def test_execute_against_fake_server(self):
+        property_ids = [f"property_{n}" for n in range(6)]
+        uploaded = {}
+
+        def read_upload(bucket_name, object_name, filename):
+            uploaded[object_name] = pd.read_csv(filename)
+
+        operator = GAToGCSMultiPropertyOperator(
+            task_id=TASK_ID,
+            property_ids=property_ids,
+            dimensions=DIMENSIONS,
+            metrics=METRICS,
+            start_ds=START_DS,
+            end_ds=END_DS,
+            page_size=2,
+            gcs_bucket_name=GCS_BUCKET,
+            gcs_dest_path="{property_id}/report.csv",
+            max_concurrency=2,
+        )
+        with FakeAnalyticsDataServer(row_count=3, latency=0.05) as server, mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GCSHook"
+        ) as gcs_hook, mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GoogleAnalyticsDataHook.get_async_conn"
+        ) as get_async_conn:
+            clients = {}
+
+            def create_async_client():
+                # One client per event loop, created inside the loop.
+                if "client" not in clients:
+                    clients["client"] = server.async_client()
+                return clients["client"]
+
+            get_async_conn.side_effect = create_async_client
+            gcs_hook.return_value.upload.side_effect = read_upload
+            summary = operator.execute(None)
+
+        assert summary["counts"]["pages"] == 12
+        assert summary["counts"]["rows"] == 18
+        assert summary["counts"]["files"] == 6
+        assert summary["tags"] == {"table": TASK_ID, "task_id": TASK_ID}
+        assert sorted(uploaded) == sorted(
+            f"{property_id}/report.csv" for property_id in property_ids
+        )
+        assert all(len(df) == 3 for df in uploaded.values())
+        assert server.max_in_flight == 2
+        assert {request.property for request in server.requests} == {
+            f"properties/{property_id}" for property_id in property_ids
+        }
+
+    def test_execute_reports_failed_properties(self):
+        operator = GAToGCSMultiPropertyOperator(
+            task_id=TASK_ID,
+            property_ids=["ok", "broken"],
+            gcs_bucket_name=GCS_BUCKET,
+        )
+
+        async def get_report_df_async(property_id, *args, **kwargs):
+            if property_id == "broken":
+                raise ValueError(property_id)
+            return REPORT_DF
+
+        with mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GCSHook"
+        ), mock.patch(
+            "include.operators.google.analytics.gatogcsoperator.GoogleAnalyticsDataHook.get_report_df_async",
+            side_effect=get_report_df_async,
+        ):
+            with pytest.raises(AirflowException, match="broken"):
+                operator.execute(None)
@@ -0,0 +1,178 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+from datetime import date
+
+import mock
+import pytest
+import pandas as pd
+from airflow.exceptions import AirflowSkipException
+
+from include.libs.date_ranges.watermarks import JsonWatermarkStore
+from include.libs.schema_reg.schema_registry import get_table_schema
+from include.operators.google.analytics.gatosnowflakeoperator import (
+    GAToSnowflakeOperator,
+)
+
+TASK_ID = "test-ga-to-snowflake-operator"
+PROPERTY_ID = "GA_Property_Id"
+DIMENSIONS = ["country", "date"]
+METRICS = ["sessions"]
+TABLE_SCHEMA = {
+    "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+    "DATE": {"type": "date", "description": "source_order=2"},
+    "SESSIONS": {"type": "int", "description": "source_order=3"},
+    "insert_timestamp": {"type": "timestamp_ntz", "description": None},
+    "hash_diff": {"columns": ["COUNTRY", "DATE"], "algorithm": "MD5"},
+}
+REPORT_DF = pd.DataFrame(
+    {
+        "country": ["United States", "France"],
+        "date": ["2021-12-06", "2021-12-07"],
+        "sessions": [79, 88],
+    }
+)
+MODULE = "include.operators.google.analytics.gatosnowflakeoperator"
+
+
+@pytest.fixture()
+def operator():
+    return GAToSnowflakeOperator(
+        task_id=TASK_ID,
+        property_id=PROPERTY_ID,
+        table_schema=TABLE_SCHEMA,
+        staging_table="table_20220101T000000",
+        create_staging_sql="CREATE STAGING",
+        merge_sql="MERGE",
+        cleanup_sql="DROP STAGING",
+        loading_db="loading",
+        loading_schema="google_analytics",
+        dimensions=DIMENSIONS,
+        metrics=METRICS,
+        page_size=1,
+        compute_hash_diff=True,
+    )
+
+
+@pytest.fixture()
+def mock_hooks():
+    with mock.patch(f"{MODULE}.GoogleAnalyticsDataHook") as ga_data_hook, mock.patch(
+        f"{MODULE}.SnowflakeHook"
+    ) as snowflake_hook, mock.patch(f"{MODULE}.write_pandas") as write_pandas:
+        ga_data_hook.return_value.iter_report_df.return_value = iter(
+            [REPORT_DF.iloc[:1], REPORT_DF.iloc[1:]]
+        )
+        write_pandas.side_effect = lambda conn, df, *args, **kwargs: (
+            True,
+            1,
+            len(df),
+            [],
+        )
+        yield ga_data_hook, snowflake_hook, write_pandas
+
+
+class TestGAToSnowflakeOperator:
+    def test_execute_in_one_session(self, operator, mock_hooks):
+        ga_data_hook, snowflake_hook, write_pandas = mock_hooks
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.return_value = []
+
+        summary = operator.execute(None)
+
+        assert summary["counts"] == {"chunks": 2, "rows_loaded": 2}
+        assert summary["tags"]["property_id"] == PROPERTY_ID
+        assert {"connect", "create_staging", "write_pandas", "merge", "cleanup"} <= set(
+            summary["seconds"]
+        )
+
+        snowflake_hook.return_value.get_conn.assert_called_once()
+        assert [call.args[0] for call in conn.execute_string.call_args_list] == [
+            "CREATE STAGING",
+            "MERGE",
+            "DROP STAGING",
+        ]
+        assert write_pandas.call_count == 2
+        df = write_pandas.call_args_list[0].args[1]
+        assert df.columns.tolist() == ["COUNTRY", "DATE", "SESSIONS", "hash_diff"]
+        assert write_pandas.call_args_list[0].args[2] == "table_20220101T000000"
+        assert write_pandas.call_args.kwargs["quote_identifiers"] is False
+        assert write_pandas.call_args.kwargs["compression"] == "snappy"
+        schema_types = ga_data_hook.return_value.iter_report_df.call_args.kwargs[
+            "schema_types"
+        ]
+        assert schema_types["SESSIONS"] == "int"
+        conn.close.assert_called_once()
+
+    def test_execute_parses_table_schema_once(self, operator, mock_hooks):
+        _, snowflake_hook, write_pandas = mock_hooks
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.return_value = []
+        with mock.patch(
+            f"{MODULE}.get_table_schema", wraps=get_table_schema
+        ) as parse_table_schema:
+            operator.execute(None)
+        assert write_pandas.call_count == 2
+        parse_table_schema.assert_called_once_with(TABLE_SCHEMA)
+
+    def test_execute_incremental(self, operator, mock_hooks, tmp_path):
+        ga_data_hook, snowflake_hook, _ = mock_hooks
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.return_value = []
+        store = JsonWatermarkStore(str(tmp_path / "watermarks.json"))
+        store.set(PROPERTY_ID, "table", date(2022, 3, 10))
+        operator.watermark_store = store
+        operator.watermark_table = "table"
+        operator.lookback_days = 2
+        operator.start_ds = "2022-01-01"
+        operator.end_ds = "2022-03-14"
+        operator.execute(None)
+        args = ga_data_hook.return_value.iter_report_df.call_args.args
+        assert args[3:5] == ("2022-03-09", "2022-03-14")
+        assert store.get(PROPERTY_ID, "table") == date(2022, 3, 14)
+
+        with pytest.raises(AirflowSkipException):
+            operator.execute(None)
+        ga_data_hook.return_value.iter_report_df.assert_called_once()
+
+    def test_execute_incremental_keeps_watermark_on_failure(
+        self, operator, mock_hooks, tmp_path
+    ):
+        _, snowflake_hook, _ = mock_hooks
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.side_effect = ValueError("MERGE")
+        store = JsonWatermarkStore(str(tmp_path / "watermarks.json"))
+        operator.watermark_store = store
+        operator.end_ds = "2022-03-14"
+        with pytest.raises(ValueError):
+            operator.execute(None)
+        assert store.get(PROPERTY_ID, TASK_ID) is None
+
+    def test_execute_stops_before_merge_on_failure(self, operator, mock_hooks):
+        _, snowflake_hook, write_pandas = mock_hooks
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.return_value = []
+        write_pandas.side_effect = lambda *args, **kwargs: (False, 1, 0, [])
+
+        with pytest.raises(ValueError):
+            operator.execute(None)
+
+        assert [call.args[0] for call in conn.execute_string.call_args_list] == [
+            "CREATE STAGING"
+        ]
+        conn.close.assert_called_once()
+
+    def test_init_rejects_unknown_compression(self):
+        with pytest.raises(ValueError):
+            GAToSnowflakeOperator(
+                task_id=TASK_ID,
+                property_id=PROPERTY_ID,
+                table_schema=TABLE_SCHEMA,
+                staging_table="table",
+                create_staging_sql="",
+                merge_sql="",
+                loading_db="loading",
+                loading_schema="google_analytics",
+                compression="zstd",
+            )
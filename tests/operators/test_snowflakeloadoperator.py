@@ -0,0 +1,90 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import mock
+import pytest
+
+from include.operators.snowflake.snowflakeloadoperator import (
+    SnowflakeStagingLoadOperator,
+)
+
+TASK_ID = "test-snowflake-staging-load-operator"
+MODULE = "include.operators.snowflake.snowflakeloadoperator"
+
+
+@pytest.fixture()
+def operator():
+    return SnowflakeStagingLoadOperator(
+        task_id=TASK_ID,
+        create_staging_sql="CREATE TEMPORARY STAGING",
+        copy_sql="COPY",
+        merge_sql="MERGE",
+        cleanup_sql="DROP STAGING",
+        warehouse="loading",
+        role="loader",
+    )
+
+
+@pytest.fixture()
+def mock_conn():
+    with mock.patch(f"{MODULE}.SnowflakeHook") as snowflake_hook:
+        conn = snowflake_hook.return_value.get_conn.return_value
+        conn.execute_string.return_value = []
+        yield conn
+
+
+def get_statements(conn):
+    return [call.args[0] for call in conn.execute_string.call_args_list]
+
+
+class TestSnowflakeStagingLoadOperator:
+    def test_execute_in_one_transaction(self, operator, mock_conn):
+        operator.execute(None)
+        assert get_statements(mock_conn) == [
+            "CREATE TEMPORARY STAGING",
+            "BEGIN",
+            "COPY",
+            "MERGE",
+            "COMMIT",
+            "DROP STAGING",
+        ]
+        mock_conn.close.assert_called_once()
+
+    def test_execute_rolls_back_failed_merge(self, operator, mock_conn):
+        def execute_string(sql):
+            if sql == "MERGE":
+                raise ValueError("MERGE failed")
+            return []
+
+        mock_conn.execute_string.side_effect = execute_string
+        with pytest.raises(ValueError):
+            operator.execute(None)
+        assert get_statements(mock_conn) == [
+            "CREATE TEMPORARY STAGING",
+            "BEGIN",
+            "COPY",
+            "MERGE",
+            "ROLLBACK",
+        ]
+        mock_conn.close.assert_called_once()
+
+    def test_execute_returns_metrics(self, operator, mock_conn):
+        def execute_string(sql):
+            rowcount = {"COPY": 5, "MERGE": 3}.get(sql)
+            return [mock.Mock(sfqid="query", rowcount=rowcount)]
+
+        mock_conn.execute_string.side_effect = execute_string
+        operator.params = {"table": "sessions"}
+        summary = operator.execute(None)
+        assert summary["tags"] == {"table": "sessions", "task_id": TASK_ID}
+        assert summary["counts"] == {"rows_copied": 5, "rows_merged": 3}
+        assert set(summary["seconds"]) == {
+            "connect",
+            "create_staging",
+            "copy",
+            "merge",
+            "commit",
+            "cleanup",
+        }
@@ -0,0 +1,55 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import mock
+from airflow.models.param import ParamsDict
+
+from include.operators.snowflake.snowflaketableoperator import SnowflakeTableOperator
+
+TASK_ID = "test-snowflake-table-operator"
+SQL = "CREATE TABLE {{ params.transform_db }}.{{ params.table }}"
+
+
+def render(operator):
+    context = {"params": ParamsDict(operator.params)}
+    operator.render_template_fields(context)
+    return context
+
+
+def test_table_params_are_merged_over_params():
+    operator = SnowflakeTableOperator(
+        task_id=TASK_ID,
+        sql=SQL,
+        params={"transform_db": "transforming", "table": "default"},
+        table_params={"table": "sessions"},
+    )
+    context = render(operator)
+    assert operator.sql == "CREATE TABLE transforming.sessions"
+    assert context["params"]["table"] == "sessions"
+    assert operator.params["table"] == "sessions"
+
+
+def test_table_params_are_resolved_when_rendering():
+    table_params = mock.Mock(spec=["resolve"])
+    table_params.resolve.return_value = {"table": "sessions"}
+    operator = SnowflakeTableOperator(
+        task_id=TASK_ID,
+        sql=SQL,
+        params={"transform_db": "transforming"},
+        table_params=table_params,
+    )
+    context = render(operator)
+    table_params.resolve.assert_called_once_with(context)
+    assert operator.sql == "CREATE TABLE transforming.sessions"
+
+
+def test_without_table_params():
+    operator = SnowflakeTableOperator(
+        task_id=TASK_ID,
+        sql=SQL,
+        params={"transform_db": "transforming", "table": "default"},
+    )
+    render(operator)
+    assert operator.sql == "CREATE TABLE transforming.default"
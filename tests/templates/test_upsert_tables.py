@@ -0,0 +1,72 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import sqlite3
+
+import jinja2
+import pytest
+
+from include.libs.schema_reg.schema_registry import schema_registry
+
+TEMPLATE_DIR = os.path.join(myPath, "../../include/templates")
+SCHEMA_PATH = os.path.join(
+    myPath, "../../include/table_schemas/snowflake/database/ga_schemas.json"
+)
+TABLE = "ga_user_session_summary"
+
+
+def render(merge_date_column=None):
+    env = jinja2.Environment(loader=jinja2.FileSystemLoader(TEMPLATE_DIR))
+    return env.get_template("transform/upsert_tables.sql").render(
+        params={
+            "table": TABLE,
+            "table_schema": schema_registry.get_definitions(SCHEMA_PATH)[TABLE][
+                "properties"
+            ],
+            "merge_date_column": merge_date_column,
+            "loading_db": "loading",
+            "loading_schema": "google_analytics",
+            "transform_db": "transforming",
+            "transform_schema": "ga_schemas",
+        },
+        ts_nodash="20220101T000000",
+    )
+
+
+def get_on_clause(sql):
+    return sql.split("\nON ", 1)[1].split("WHEN MATCHED", 1)[0]
+
+
+def test_merge_without_date_bound():
+    sql = render()
+    assert "merge_min_date" not in sql
+    assert get_on_clause(sql).strip() == "dest.hash_diff = stg.hash_diff"
+
+
+@pytest.mark.parametrize(
+    "dest_date, matched",
+    [
+        ("2022-01-02", True),
+        ("2021-12-31", False),
+        (None, True),
+    ],
+    ids=["in_range", "out_of_range", "null"],
+)
+def test_date_bound_matches_null_dates(dest_date, matched):
+    sql = render("DATE")
+    assert "SET (merge_min_date, merge_max_date)" in sql
+    # The staged dates span 2022-01-01 to 2022-01-03, MIN and MAX skip NULLs.
+    condition = (
+        get_on_clause(sql)
+        .replace("$merge_min_date", "'2022-01-01'")
+        .replace("$merge_max_date", "'2022-01-03'")
+    )
+    conn = sqlite3.connect(":memory:")
+    conn.execute("CREATE TABLE dest (hash_diff TEXT, DATE TEXT)")
+    conn.execute("CREATE TABLE stg (hash_diff TEXT, DATE TEXT)")
+    conn.execute("INSERT INTO dest VALUES ('hash', ?)", (dest_date,))
+    conn.execute("INSERT INTO stg VALUES ('hash', ?)", (dest_date,))
+    rows = conn.execute(f"SELECT 1 FROM dest, stg WHERE {condition}").fetchall()
+    assert bool(rows) is matched
@@ -0,0 +1,176 @@
+import os, sys
+
+myPath = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, myPath + "/../../")
+
+import asyncio
+import gzip
+import io
+import json
+import threading
+
+import mock
+import pandas as pd
+import pytest
+
+from include.libs.schema_reg.schema_registry import get_table_schema
+from include.triggers.google.analytics.gatogcstrigger import GAToGCSTrigger
+
+MODULE = "include.triggers.google.analytics.gatogcstrigger"
+PAGES = [
+    pd.DataFrame({"country": ["France", "Spain"], "sessions": [1, 2]}),
+    pd.DataFrame({"country": ["Italy"], "sessions": [3]}),
+]
+
+
+class FakeStorage:
+    """
+    Records the objects uploaded through the asyncio storage client.
+    """
+
+    uploaded = {}
+    fail_paths = ()
+
+    def __init__(self, service_file=None):
+        self.service_file = service_file
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return None
+
+    async def upload(self, bucket, object_name, file_data, content_type=None):
+        await asyncio.sleep(0)
+        if object_name in self.fail_paths:
+            raise ValueError("GCS")
+        self.uploaded[object_name] = file_data
+
+
+@pytest.fixture()
+def fake_storage():
+    FakeStorage.uploaded = {}
+    FakeStorage.fail_paths = ()
+    with mock.patch(f"{MODULE}.Storage", FakeStorage), mock.patch(
+        f"{MODULE}.GCSAioHook"
+    ) as gcs_hook:
+        gcs_hook.return_value.get_service_file.return_value = None
+        yield FakeStorage
+
+
+@pytest.fixture()
+def mock_ga_data_hook():
+    with mock.patch(f"{MODULE}.GoogleAnalyticsDataHook") as ga_data_hook:
+
+        async def iter_report_pages_async(*args):
+            for page in PAGES:
+                yield page
+
+        hook = ga_data_hook.return_value
+        hook.iter_report_pages_async.side_effect = iter_report_pages_async
+        hook.get_response_df.side_effect = lambda page, schema_types: page
+        yield hook
+
+
+def get_trigger(**kwargs):
+    return GAToGCSTrigger(
+        property_id="123",
+        dimensions=["country"],
+        metrics=["sessions"],
+        start_ds="2022-01-01",
+        end_ds="2022-01-02",
+        gcs_bucket_name="bucket",
+        part_path_format="table/table_ts_part{part:05d}.csv",
+        manifest_path="table/table_ts_manifest.json",
+        **kwargs,
+    )
+
+
+def run_trigger(trigger):
+    async def first_event():
+        async for event in trigger.run():
+            return event.payload
+
+    return asyncio.run(first_event())
+
+
+def test_serialize_round_trip():
+    trigger = get_trigger(compression="gzip", page_size=10)
+    classpath, kwargs = trigger.serialize()
+    assert classpath == f"{MODULE}.GAToGCSTrigger"
+    assert GAToGCSTrigger(**kwargs).serialize() == (classpath, kwargs)
+
+
+def test_run_uploads_pages_as_parts(fake_storage, mock_ga_data_hook):
+    event = run_trigger(get_trigger(compression="gzip", metric_tags={"table": "table"}))
+    metrics = event.pop("metrics")
+    assert event == {
+        "status": "success",
+        "manifest_path": "table/table_ts_manifest.json",
+        "rows": 3,
+        "files": 2,
+    }
+    manifest = json.loads(fake_storage.uploaded["table/table_ts_manifest.json"])
+    assert [(part["path"], part["rows"]) for part in manifest["files"]] == [
+        ("table/table_ts_part00001.csv", 2),
+        ("table/table_ts_part00002.csv", 1),
+    ]
+    assert manifest["compression"] == "gzip"
+    part = fake_storage.uploaded["table/table_ts_part00002.csv"]
+    assert len(part) == manifest["files"][1]["bytes"]
+    assert pd.read_csv(io.BytesIO(gzip.decompress(part))).equals(PAGES[1])
+    assert metrics["tags"] == {"table": "table"}
+    assert metrics["counts"] == {
+        "files": 2,
+        "bytes": sum(part["bytes"] for part in manifest["files"]),
+    }
+    assert {"serialize", "upload", "execute"} <= set(metrics["seconds"])
+
+
+def test_run_creates_hooks_off_the_loop(fake_storage, mock_ga_data_hook):
+    loop_thread = threading.get_ident()
+    created_in = []
+
+    def record_thread(hook):
+        def create(**kwargs):
+            created_in.append(threading.get_ident())
+            return hook
+
+        return create
+
+    with mock.patch(f"{MODULE}.GoogleAnalyticsDataHook") as ga_data_hook, mock.patch(
+        f"{MODULE}.GCSAioHook"
+    ) as gcs_hook:
+        ga_data_hook.side_effect = record_thread(mock_ga_data_hook)
+        gcs_hook.side_effect = record_thread(gcs_hook.return_value)
+        gcs_hook.return_value.get_service_file.return_value = None
+        event = run_trigger(get_trigger())
+    assert event["status"] == "success"
+    assert len(created_in) == 2
+    assert loop_thread not in created_in
+
+
+def test_run_parses_table_schema_once(fake_storage, mock_ga_data_hook):
+    table_schema = {
+        "COUNTRY": {"type": "varchar(64)", "description": "source_order=1"},
+        "hash_diff": {"columns": ["COUNTRY"], "algorithm": "MD5"},
+    }
+    with mock.patch(
+        f"{MODULE}.get_table_schema", wraps=get_table_schema
+    ) as parse_table_schema:
+        event = run_trigger(
+            get_trigger(table_schema=table_schema, compute_hash_diff=True)
+        )
+    assert event["status"] == "success"
+    parse_table_schema.assert_called_once_with(table_schema)
+    for path in ("table/table_ts_part00001.csv", "table/table_ts_part00002.csv"):
+        part = pd.read_csv(io.BytesIO(fake_storage.uploaded[path]))
+        assert part.columns.tolist()[-1] == "hash_diff"
+
+
+def test_run_reports_failed_parts(fake_storage, mock_ga_data_hook):
+    fake_storage.fail_paths = ("table/table_ts_part00001.csv",)
+    event = run_trigger(get_trigger())
+    assert event["status"] == "error"
+    assert "1 of 2 parts failed" in event["message"]
+    assert "table/table_ts_manifest.json" not in fake_storage.uploaded